@@ -0,0 +1,175 @@
+# async_database.py
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import aiomysql
+from pymysql import Error
+from db_config import DB_CONFIG
+
+# 连接池大小
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+
+class AsyncDatabase:
+    """asyncio counterpart of database.Database backed by an aiomysql pool.
+
+    execute_query/call_proc keep the same return conventions as the blocking
+    class, so services can switch between the two without changing how they
+    read results.
+    """
+    def __init__(self, minsize=POOL_MIN_SIZE, maxsize=POOL_MAX_SIZE):
+        self.pool = None
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self._pool_lock = None
+
+    async def connect(self):
+        # 连接池必须在事件循环内创建，所以延迟到第一次使用时
+        if self._pool_lock is None:
+            self._pool_lock = asyncio.Lock()
+        async with self._pool_lock:
+            if self.pool is not None:
+                return self.pool
+            try:
+                self.pool = await aiomysql.create_pool(
+                    host=DB_CONFIG['host'],
+                    port=DB_CONFIG['port'],
+                    user=DB_CONFIG['user'],
+                    password=DB_CONFIG['password'],
+                    db=DB_CONFIG['database'],
+                    charset='utf8mb4',
+                    minsize=self.minsize,
+                    maxsize=self.maxsize,
+                    autocommit=False
+                )
+                print("Successfully created async MySQL connection pool")
+            except Error as e:
+                print(f"Error creating async MySQL connection pool: {e}")
+                self.pool = None
+            return self.pool
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+            print("Async MySQL connection pool closed.")
+
+    async def execute_query(self, query, params=None, fetch_one=False, fetch_all=False):
+        pool = self.pool or await self.connect()
+        if pool is None:
+            print("Failed to establish database connection.")
+            return None
+
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                try:
+                    await cursor.execute(query, params)
+                    if fetch_one:
+                        result = await cursor.fetchone()
+                        await conn.commit() # 结束只读事务，避免连接池中的连接读到旧快照
+                        return result
+                    elif fetch_all:
+                        result = await cursor.fetchall()
+                        await conn.commit()
+                        return list(result)
+                    else:
+                        await conn.commit()
+                        return cursor.rowcount
+                except Error as e:
+                    await conn.rollback()
+                    print(f"Database query error: {e}")
+                    return None
+
+    async def call_proc(self, proc_name, args=()):
+        """调用存储过程
+
+        Args:
+            proc_name (str): 存储过程名称
+            args (tuple): 存储过程参数
+
+        Returns:
+            list: 存储过程的结果集，如果出错则返回None
+        """
+        pool = self.pool or await self.connect()
+        if pool is None:
+            print("Failed to establish database connection.")
+            return None
+
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                try:
+                    await cursor.callproc(proc_name, args)
+
+                    # 获取所有结果集
+                    results = list(await cursor.fetchall())
+                    while await cursor.nextset():
+                        rows = await cursor.fetchall()
+                        if rows:
+                            results.extend(rows)
+
+                    await conn.commit()
+                    return results
+                except Error as e:
+                    await conn.rollback()
+                    print(f"Error calling procedure {proc_name}: {e}")
+                    return None
+
+    async def stream(self, query, params=None, batch_size=500):
+        """以服务端游标逐批读取结果，适合大结果集
+
+        Args:
+            query (str): SELECT语句
+            params (tuple, optional): 查询参数
+            batch_size (int): 每批读取的行数
+
+        Yields:
+            dict: 结果行
+        """
+        pool = self.pool or await self.connect()
+        if pool is None:
+            print("Failed to establish database connection.")
+            return
+
+        async with pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSDictCursor) as cursor:
+                try:
+                    await cursor.execute(query, params)
+                    while True:
+                        rows = await cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for row in rows:
+                            yield row
+                    await conn.commit()
+                except Error as e:
+                    await conn.rollback()
+                    print(f"Database stream error: {e}")
+
+    @asynccontextmanager
+    async def transaction(self):
+        """在同一连接上执行多条语句，正常退出时提交，异常时回滚
+
+        Usage:
+            async with async_db.transaction() as cursor:
+                await cursor.execute(...)
+        """
+        pool = self.pool or await self.connect()
+        if pool is None:
+            raise Error("Failed to establish database connection.")
+
+        async with pool.acquire() as conn:
+            await conn.begin()
+            cursor = await conn.cursor(aiomysql.DictCursor)
+            try:
+                yield cursor
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+            finally:
+                await cursor.close()
+
+# Global async database instance (the pool is created on first use)
+async_db = AsyncDatabase()
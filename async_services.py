@@ -0,0 +1,291 @@
+import asyncio
+
+from async_database import async_db
+from cache import cached_async
+from models import Station, Train
+import db_steps
+import fares
+import idempotency
+import inventory
+from services import (
+    TRAINS_THROUGH_STATION_QUERY, ROUTE_INFO_QUERY, PASSENGER_ORDERS_QUERY, passenger_orders_params,
+    CUSTOMER_QUERY, CREDENTIALS_QUERY,
+    MAX_TRANSITION_RETRIES, ORDER_CONFLICT_MESSAGE, OrderConflict,
+    TrainService, StationService, OrderService, SalespersonService,
+    get_static_route_async, overlay_sold_tickets,
+    format_train_row, format_station_row, format_ticket_row, format_order_row, format_sales_report_row
+)
+
+# 以下服务与services.py中的同名服务返回值一致: (data, error_message)
+
+class AsyncTrainService:
+    @staticmethod
+    async def get_train_route(train_number, departure_date=None):
+        """获取列车路线信息 (异步版本，返回格式同TrainService.get_train_route)"""
+        try:
+            route = await get_static_route_async(train_number, departure_date)
+
+            if not route:
+                error_msg = "No route information found"
+                if departure_date:
+                    error_msg += f" for date {departure_date}"
+                return [], error_msg
+
+            # 与同步版本共用静态路线缓存，只有实时售票数每次查询
+            train, seat_counts = await asyncio.gather(
+                async_db.execute_query(
+                    "SELECT total_seats FROM Trains WHERE train_number = %s", (train_number,), fetch_one=True
+                ),
+                inventory.get_seat_counts_async(train_number, departure_date)
+            )
+            total_seats = train['total_seats'] if train else None
+            return overlay_sold_tickets(route, total_seats, seat_counts or {}), None
+
+        except Exception as e:
+            return [], f"Error getting train route: {str(e)}"
+
+    @staticmethod
+    async def list_all_trains():
+        """列车列表 (异步版本)，与TrainService.list_all_trains共用reference_cache中的结果"""
+        return await cached_async(TrainService.list_all_trains, AsyncTrainService._load_all_trains)
+
+    @staticmethod
+    async def _load_all_trains():
+        trains = await Train.find_all_async()
+
+        if not trains:
+            return [], "No trains found."
+
+        train_data = []
+        for t in trains:
+            dep_station, arr_station = await asyncio.gather(
+                Station.find_one_async({'station_id': t.get('departure_station_id')}),
+                Station.find_one_async({'station_id': t.get('arrival_station_id')})
+            )
+            train_data.append(format_train_row(
+                t,
+                dep_station.get('station_name') if dep_station else None,
+                arr_station.get('station_name') if arr_station else None
+            ))
+        return train_data, None
+
+class AsyncStationService:
+    @staticmethod
+    async def list_all_stations():
+        """车站列表 (异步版本)，与StationService.list_all_stations共用reference_cache中的结果"""
+        return await cached_async(StationService.list_all_stations, AsyncStationService._load_all_stations)
+
+    @staticmethod
+    async def _load_all_stations():
+        stations = await Station.find_all_async()
+
+        if not stations:
+            return [], "No stations found."
+
+        return [format_station_row(s) for s in stations], None
+
+class AsyncTicketService:
+    @staticmethod
+    async def search_available_tickets(dep_station_name, arr_station_name, departure_date=None):
+        """查询余票 (异步版本)
+
+        与TicketService.search_available_tickets逻辑相同，但各车次的区间查询并发执行。
+        """
+        dep_station, arr_station = await asyncio.gather(
+            Station.find_one_async({'station_name': dep_station_name}),
+            Station.find_one_async({'station_name': arr_station_name})
+        )
+        if not dep_station or not arr_station:
+            return [], "Departure or arrival station not found."
+
+        date_filter = ""
+        params = [dep_station['station_id']]
+        if departure_date:
+            date_filter = "AND DATE(departure_time) = %s"
+            params.append(departure_date)
+
+        trains_through_dep = await async_db.execute_query(
+            TRAINS_THROUGH_STATION_QUERY + date_filter, tuple(params), fetch_all=True
+        )
+        if not trains_through_dep:
+            return [], "No trains found passing through the departure station."
+
+        async def check_run(run):
+            route_info, fare_table = await asyncio.gather(
+                async_db.execute_query(
+                    ROUTE_INFO_QUERY,
+                    (run['train_number'], run['start_date'],
+                     dep_station['station_id'], arr_station['station_id']),
+                    fetch_one=True
+                ),
+                fares.get_fare_table_async(run['train_number'])
+            )
+            if not route_info or not fare_table:
+                return None
+            price = fare_table.fare(dep_station['station_id'], arr_station['station_id'])
+            if price is None:
+                return None
+            return format_ticket_row(
+                run['train_number'], run['start_date'], dep_station_name, arr_station_name,
+                route_info, price
+            )
+
+        rows = await asyncio.gather(*(check_run(run) for run in trains_through_dep))
+        train_data = [row for row in rows if row is not None]
+
+        if not train_data:
+            return [], "No trains found passing through both stations in the correct order."
+
+        train_data.sort(key=lambda x: x[3])
+        return train_data, None
+
+class AsyncOrderService:
+    @staticmethod
+    async def create_order(train_number, train_type, start_date, departure_station, arrival_station,
+                           price, customer_name, customer_id_card, idempotency_key=None):
+        """创建订单 (异步版本)，事务步骤与OrderService.create_order相同"""
+        try:
+            customer, dep_station, arr_station = await asyncio.gather(
+                async_db.execute_query(CUSTOMER_QUERY, (customer_name, customer_id_card), fetch_one=True),
+                Station.find_one_async({'station_name': departure_station}),
+                Station.find_one_async({'station_name': arrival_station})
+            )
+
+            if not customer:
+                return False, "Customer information not found or incorrect."
+            if not dep_station or not arr_station:
+                return False, "Station not found"
+            fare = await fares.get_fare_async(train_number, dep_station['station_id'], arr_station['station_id'])
+            if fare is not None:
+                price = fare
+
+            async with async_db.transaction() as cursor:
+                result = await db_steps.run_async(cursor, OrderService._create_order_steps(
+                    train_number, train_type, start_date, dep_station, arr_station,
+                    price, customer, idempotency_key
+                ))
+
+            if idempotency_key:
+                await idempotency.maybe_purge_expired_async()
+            return result
+
+        except Exception as e:
+            return False, f"Failed to create order: {str(e)}"
+
+    @staticmethod
+    async def cancel_order(order_id):
+        """取消订单 (异步版本)"""
+        try:
+            for _ in range(MAX_TRANSITION_RETRIES + 1):
+                try:
+                    async with async_db.transaction() as cursor:
+                        return await db_steps.run_async(cursor, OrderService._cancel_order_steps(order_id))
+                except OrderConflict:
+                    continue
+            return False, ORDER_CONFLICT_MESSAGE
+
+        except Exception as e:
+            return False, f"Failed to cancel order: {str(e)}"
+
+    @staticmethod
+    async def request_refund(order_id, idempotency_key=None):
+        """申请退款 (异步版本)"""
+        try:
+            for _ in range(MAX_TRANSITION_RETRIES + 1):
+                try:
+                    async with async_db.transaction() as cursor:
+                        result = await db_steps.run_async(
+                            cursor, OrderService._request_refund_steps(order_id, idempotency_key)
+                        )
+                    break
+                except OrderConflict:
+                    continue
+            else:
+                return False, ORDER_CONFLICT_MESSAGE
+
+            if idempotency_key:
+                await idempotency.maybe_purge_expired_async()
+            return result
+
+        except Exception as e:
+            return False, f"Failed to request refund: {str(e)}"
+
+    @staticmethod
+    async def get_orders_by_passenger(name, phone):
+        """根据乘客信息查询订单 (异步版本)"""
+        try:
+            orders = await async_db.execute_query(
+                PASSENGER_ORDERS_QUERY, passenger_orders_params(name, phone), fetch_all=True
+            )
+
+            if not orders:
+                return [], "No orders found for this passenger"
+
+            return [format_order_row(order) for order in orders], None
+
+        except Exception as e:
+            return [], f"Error querying orders: {str(e)}"
+
+    @staticmethod
+    async def get_pending_orders():
+        """获取待处理订单 (异步版本)"""
+        try:
+            orders = await async_db.execute_query("SELECT * FROM PendingOrdersView", fetch_all=True)
+
+            if not orders:
+                return [], "No pending orders found"
+
+            return [format_order_row(order) for order in orders], None
+
+        except Exception as e:
+            return [], f"Error querying orders: {str(e)}"
+
+    @staticmethod
+    async def process_order(order_id, approve=True, salesperson_id=None):
+        """处理订单（确认或拒绝）(异步版本)
+
+        与OrderService.process_orders执行同一组db_steps步骤（状态检查、余票检查、状态更新、
+        座位库存、保留释放、outbox和订单事件），订单行不加锁，状态被其他终端抢先修改时重新读取，
+        最多重试MAX_TRANSITION_RETRIES次。
+        """
+        try:
+            for _ in range(MAX_TRANSITION_RETRIES + 1):
+                async with async_db.transaction() as cursor:
+                    results, _ = await db_steps.run_async(
+                        cursor, OrderService._process_batch_steps([order_id], approve, salesperson_id)
+                    )
+                _, success, message = results[0]
+                if success or message != ORDER_CONFLICT_MESSAGE:
+                    return success, message
+            return False, ORDER_CONFLICT_MESSAGE
+
+        except Exception as e:
+            return False, f"Failed to process order: {str(e)}"
+
+class AsyncSalespersonService:
+    @staticmethod
+    async def verify_credentials(salesperson_id, password):
+        """验证乘务员凭据 (异步版本)"""
+        try:
+            result = await async_db.execute_query(CREDENTIALS_QUERY, (salesperson_id, password), fetch_one=True)
+
+            if result:
+                return True, result
+            return False, "Invalid credentials"
+
+        except Exception as e:
+            return False, f"Error verifying credentials: {str(e)}"
+
+    @staticmethod
+    async def get_daily_sales_report(report_date, staff_id=None):
+        """获取指定日期的销售报表 (异步版本)"""
+        try:
+            result = await async_db.call_proc(*SalespersonService._sales_report_proc(report_date, staff_id))
+
+            if result:
+                return [format_sales_report_row(row) for row in result], None
+
+            return [], "No data found"
+
+        except Exception as e:
+            return None, str(e)
@@ -0,0 +1,244 @@
+# auto_approval.py
+
+import collections
+import datetime
+import threading
+
+from mysql.connector import Error
+from database import db
+from services import OrderService
+import fares
+
+# 自动审批使用的系统乘务员，由迁移3创建
+SYSTEM_SALESPERSON_ID = 'SYSTEM'
+
+# 每批检查的订单数和两轮之间的间隔（秒）
+BATCH_SIZE = 200
+INTERVAL_SECONDS = 10
+# 重新扫描游标之前多少秒内的订单，覆盖晚提交的订单
+RESCAN_SECONDS = 60
+# 内存中保留的未自动审批订单记录数
+MAX_EXCEPTIONS = 1000
+# process_orders在余票不足时返回的消息，这类订单在之后的轮次中重试
+NO_SEATS_MESSAGE = "No available seats for this route"
+
+# 默认规则参数
+MIN_PRICE = 0
+MAX_PRICE = 1000
+# 订单价格与票价矩阵的允许误差
+FARE_TOLERANCE = 0.01
+
+CANDIDATE_COLUMNS = """
+SELECT o.order_id, o.operation_time, o.price, o.train_number, o.start_date,
+       o.departure_station_id, o.arrival_station_id,
+       c.id_card IS NOT NULL AS customer_verified
+FROM SalesOrders o
+LEFT JOIN Customers c ON c.id_card = o.customer_id_card
+WHERE o.status = 'Ready' AND o.operation_type = 'Booking'
+"""
+
+CANDIDATES_QUERY = CANDIDATE_COLUMNS + """
+AND (o.operation_time, o.order_id) > (%s, %s)
+ORDER BY o.operation_time, o.order_id
+LIMIT %s
+"""
+
+# 游标之前RESCAN_SECONDS秒内的订单，由调用方过滤已检查过的
+LATE_CANDIDATES_QUERY = CANDIDATE_COLUMNS + """
+AND o.operation_time >= %s
+AND (o.operation_time, o.order_id) <= (%s, %s)
+ORDER BY o.operation_time, o.order_id
+"""
+
+# --- Rules ---
+# 每条规则: (名称, check(order) -> bool)。余票由process_orders在同一事务中检查。
+
+def customer_verified(order):
+    """下单人与登记的乘客信息一致"""
+    return bool(order['customer_verified'])
+
+def price_within_bounds(order, min_price=MIN_PRICE, max_price=MAX_PRICE):
+    return min_price <= float(order['price']) <= max_price
+
+def price_matches_fare(order):
+    """订单价格与票价矩阵一致"""
+    if order['departure_station_id'] is None or order['arrival_station_id'] is None:
+        return False
+    fare = fares.get_fare(order['train_number'], order['departure_station_id'], order['arrival_station_id'])
+    return fare is not None and abs(float(order['price']) - fare) <= FARE_TOLERANCE
+
+def departs_in_future(order):
+    return order['start_date'] >= datetime.date.today()
+
+DEFAULT_RULES = [
+    ('customer_verified', customer_verified),
+    ('price_within_bounds', price_within_bounds),
+    ('price_matches_fare', price_matches_fare),
+    ('departs_in_future', departs_in_future),
+]
+
+def evaluate(order, rules=DEFAULT_RULES):
+    """返回订单未通过的规则名列表，为空表示可以自动审批"""
+    return [name for name, check in rules if not check(order)]
+
+# --- Engine ---
+
+class AutoApprover:
+    """按批检查Ready订单，通过全部规则的订单交给OrderService.process_orders批量审批
+
+    用(operation_time, order_id)作为游标向前推进；订单号在插入时生成而提交有先后，
+    所以每轮还重新扫描游标之前RESCAN_SECONDS秒内尚未检查过的Ready订单。
+    未通过规则的订单保留为Ready，由乘务员人工处理；因余票不足未能审批的订单每轮重试，
+    直到审批成功或订单离开Ready。exceptions最多保留MAX_EXCEPTIONS条最近的记录。
+    """
+    def __init__(self, rules=DEFAULT_RULES, batch_size=BATCH_SIZE):
+        self.rules = rules
+        self.batch_size = batch_size
+        self.cursor = (datetime.datetime.min, '')
+        self.exceptions = collections.OrderedDict()  # order_id -> 未通过的规则或审批失败原因
+        self._retry = set()   # 因余票不足未审批、需要重试的订单
+        self._seen = {}       # 游标附近已检查过的订单 -> operation_time
+        self._forward = 0     # 上一轮从游标之后读到的订单数
+
+    def _record_exception(self, order_id, reason):
+        self.exceptions.pop(order_id, None)
+        self.exceptions[order_id] = reason
+        while len(self.exceptions) > MAX_EXCEPTIONS:
+            evicted, _ = self.exceptions.popitem(last=False)
+            self._retry.discard(evicted)
+
+    def _resolve(self, order_id):
+        self.exceptions.pop(order_id, None)
+        self._retry.discard(order_id)
+
+    def _candidates(self):
+        """读取游标之后的一批订单和游标之前的晚到订单"""
+        # 在新事务中读取，长时间运行的进程也能看到其他终端新提交的订单
+        with db.transaction() as cursor:
+            cursor.execute(CANDIDATES_QUERY, (*self.cursor, self.batch_size))
+            orders = cursor.fetchall()
+            late = []
+            if self.cursor[0] != datetime.datetime.min:
+                cursor.execute(LATE_CANDIDATES_QUERY, (
+                    self.cursor[0] - datetime.timedelta(seconds=RESCAN_SECONDS), *self.cursor
+                ))
+                late = [order for order in cursor.fetchall() if order['order_id'] not in self._seen]
+        return orders, late
+
+    def run_once(self):
+        """检查一批订单
+
+        Returns:
+            dict: {'checked', 'approved', 'exceptions'}，查询失败时返回None
+        """
+        try:
+            orders, late = self._candidates()
+        except Error as e:
+            print(f"Error querying orders for auto approval: {e}")
+            return None
+        self._forward = len(orders)
+        if orders:
+            self.cursor = (orders[-1]['operation_time'], orders[-1]['order_id'])
+        horizon = self.cursor[0] - datetime.timedelta(seconds=RESCAN_SECONDS)
+        self._seen = {order_id: at for order_id, at in self._seen.items() if at >= horizon}
+
+        approvable = []
+        exceptions = 0
+        for order in late + orders:
+            self._seen[order['order_id']] = order['operation_time']
+            failed = evaluate(order, self.rules)
+            if failed:
+                self._record_exception(order['order_id'], ", ".join(failed))
+                exceptions += 1
+            else:
+                approvable.append(order['order_id'])
+        retried = [order_id for order_id in self._retry if order_id not in approvable]
+        approvable.extend(retried)
+
+        approved = 0
+        if approvable:
+            results, error = OrderService.process_orders(
+                approvable, True, SYSTEM_SALESPERSON_ID, remarks="Order approved automatically"
+            )
+            if error:
+                print(f"Auto approval batch failed: {error}")
+                exceptions += len(approvable)
+            for order_id, success, message in results:
+                if success:
+                    approved += 1
+                    self._resolve(order_id)
+                elif message == NO_SEATS_MESSAGE:
+                    if order_id not in self._retry:
+                        exceptions += 1
+                    self._record_exception(order_id, message)
+                    self._retry.add(order_id)
+                elif order_id in self._retry:
+                    # 订单已被乘务员处理或取消
+                    self._resolve(order_id)
+                else:
+                    self._record_exception(order_id, message)
+                    exceptions += 1
+
+        return {'checked': len(orders) + len(late), 'approved': approved, 'exceptions': exceptions}
+
+    def drain(self):
+        """连续处理直到没有新的Ready订单，返回累计结果"""
+        total = {'checked': 0, 'approved': 0, 'exceptions': 0}
+        while True:
+            summary = self.run_once()
+            if summary is None:
+                break
+            for key in total:
+                total[key] += summary[key]
+            if self._forward < self.batch_size:
+                break
+        return total
+
+class AutoApprovalScheduler:
+    """后台线程每隔interval秒运行一次自动审批
+
+    GUI终端不启动调度器：自动审批作为独立进程部署（python auto_approval.py），
+    整个系统只运行一个，避免多个终端重复检查同一批订单。
+    """
+    def __init__(self, approver=None, interval=INTERVAL_SECONDS):
+        self.approver = approver or AutoApprover()
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="auto-approval", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                summary = self.approver.drain()
+                if summary['checked']:
+                    print(f"Auto approval: checked {summary['checked']}, approved {summary['approved']}, "
+                          f"left for staff {summary['exceptions']}")
+            except Exception as e:
+                print(f"Error in auto approval: {e}")
+            self._stop.wait(self.interval)
+
+if __name__ == "__main__":
+    from outbox import outbox_processor
+    from seat_holds import hold_sweeper
+    scheduler = AutoApprovalScheduler()
+    scheduler.start()
+    outbox_processor.start()
+    hold_sweeper.start()
+    try:
+        while True:
+            threading.Event().wait(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+        outbox_processor.stop()
+        hold_sweeper.stop()
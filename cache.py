@@ -0,0 +1,137 @@
+# cache.py
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+# 表名(小写) -> 依赖该表的缓存
+_table_caches = {}
+_all_caches = []
+
+class LRUCache:
+    """带TTL的LRU缓存，按依赖的表名在写入时失效
+
+    Args:
+        name (str): 缓存名称，用于统计输出
+        maxsize (int): 最大条目数，超出时淘汰最久未使用的条目
+        ttl (float): 条目存活秒数，None表示不过期
+        tables (iterable): 缓存内容依赖的表，这些表被修改时清空缓存
+    """
+    def __init__(self, name, maxsize=256, ttl=300, tables=()):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        for table in tables:
+            _table_caches.setdefault(table.lower(), []).append(self)
+        _all_caches.append(self)
+
+    def get(self, key):
+        """返回 (是否命中, 值)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """删除指定条目，不指定key时清空整个缓存"""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+def invalidate_table(table_name):
+    """清空所有依赖指定表的缓存"""
+    for cache in _table_caches.get(table_name.lower(), ()):
+        cache.invalidate()
+
+def cache_stats():
+    """返回所有缓存的命中统计 {缓存名: 统计信息}"""
+    return {cache.name: cache.stats() for cache in _all_caches}
+
+def _should_cache(condition, value):
+    return condition(value) if condition else value is not None
+
+def cached(cache, condition=None):
+    """用指定缓存包装函数，以调用参数作为key
+
+    包装后的函数带有cache/cache_key/cache_condition属性，异步版本通过cached_async共用同一份缓存。
+
+    Args:
+        cache (LRUCache): 使用的缓存
+        condition (callable, optional): 返回True时才缓存结果，默认不缓存None
+    """
+    def decorator(func):
+        def cache_key(*args, **kwargs):
+            return (func.__qualname__, args, tuple(sorted(kwargs.items())))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = cache_key(*args, **kwargs)
+            hit, value = cache.get(key)
+            if hit:
+                return value
+            value = func(*args, **kwargs)
+            if _should_cache(condition, value):
+                cache.set(key, value)
+            return value
+
+        wrapper.cache = cache
+        wrapper.cache_key = cache_key
+        wrapper.cache_condition = condition
+        return wrapper
+    return decorator
+
+async def cached_async(cached_func, load, *args, **kwargs):
+    """在cached包装的同步函数的缓存中查找，未命中时await load(*args, **kwargs)并以同一个key写入
+
+    Args:
+        cached_func: 用cached装饰的同步函数，提供缓存、key和写入条件
+        load (coroutine function): 与cached_func返回相同结果的异步实现
+    """
+    key = cached_func.cache_key(*args, **kwargs)
+    hit, value = cached_func.cache.get(key)
+    if hit:
+        return value
+    value = await load(*args, **kwargs)
+    if _should_cache(cached_func.cache_condition, value):
+        cached_func.cache.set(key, value)
+    return value
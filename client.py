@@ -2,11 +2,12 @@ import tkinter as tk
 from tkinter import messagebox, simpledialog, Toplevel, Label, Entry, Button
 from tkinter import ttk
 import datetime
+import uuid
 from queue import Queue
 
 from services import TrainService, StationService, TicketService, OrderService
 from database import db 
-from gui_utils import clear_frame, create_modal_window, show_message, show_error, show_confirmation, validate_date, center_window
+from gui_utils import clear_frame, create_modal_window, show_message, show_error, show_confirmation, validate_date, center_window, run_in_background, VirtualTable, PagedSource
 
 def create_booking_window(train_info):
     """创建订票窗口"""
@@ -15,6 +16,8 @@ def create_booking_window(train_info):
         "Book Ticket",
         "400x300"
     )
+    # 同一个订票窗口内重复提交使用同一个幂等键，不会重复下单
+    idempotency_key = uuid.uuid4().hex
     
     # 显示选中的车次信息
     Label(booking_window, text=f"Train: {train_info[0]}", font=("Arial", 12)).pack(pady=5)
@@ -48,7 +51,8 @@ def create_booking_window(train_info):
             train_info[4],  # arrival_station
             train_info[6],  # price
             name,
-            id_card
+            id_card,
+            idempotency_key=idempotency_key
         )
         
         if success:
@@ -62,33 +66,21 @@ def create_booking_window(train_info):
     Button(booking_window, text="Cancel", 
            command=booking_window.destroy).pack(pady=5)
 
-def display_table(get_data_func, columns, enable_booking=False, is_order_view=False, is_staff_view=False, staff_info=None):
-    """显示数据表格窗口"""
+def display_table(get_data_func, columns, enable_booking=False, is_order_view=False, is_staff_view=False, staff_info=None, paged=False):
+    """显示数据表格窗口
+
+    paged为True时get_data_func为分页函数 get_data_func(offset, limit)，滚动时按页加载。
+    """
     data_window = create_modal_window(
         main_window,
         "Data View",
         "800x400"
     )
     
-    # 创建Treeview
-    tree = ttk.Treeview(data_window)
-    tree["columns"] = columns
-    tree["show"] = "headings"
-
-    # 配置列
-    for col in columns:
-        tree.heading(col, text=col)
-        tree.column(col, width=100)
-
-    # 添加滚动条
-    vsb = ttk.Scrollbar(data_window, orient="vertical", command=tree.yview)
-    hsb = ttk.Scrollbar(data_window, orient="horizontal", command=tree.xview)
-    tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-
-    # 放置组件
-    tree.grid(row=0, column=0, sticky="nsew")
-    vsb.grid(row=0, column=1, sticky="ns")
-    hsb.grid(row=1, column=0, sticky="ew")
+    # 虚拟表格只创建可见的行，通过tree读取选中行
+    table = VirtualTable(data_window, columns)
+    table.grid(row=0, column=0, sticky="nsew")
+    tree = table.tree
 
     # 配置网格权重
     data_window.grid_rowconfigure(0, weight=1)
@@ -136,18 +128,35 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
 
     tree.bind('<Double-1>', on_double_click)
 
-    try:
-        data, error = get_data_func()
-        
-        if error:
-            messagebox.showinfo("Information", error)
-        
-        if data:
-            for row in data:
-                tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-                
-    except Exception as e:
-        messagebox.showerror("Error", f"An error occurred: {str(e)}")
+    def load_data():
+        """在后台加载数据，加载期间窗口保持响应"""
+        if paged:
+            table.set_source(PagedSource(get_data_func))
+            return
+
+        def show_data(result):
+            data, error = result
+            if error:
+                messagebox.showinfo("Information", error)
+            table.set_rows(data or [])
+
+        run_in_background(data_window, get_data_func, show_data)
+
+    def refresh_order(order_id):
+        """操作成功后只更新表格中被操作的订单，不重新加载整个列表"""
+        if is_staff_view:
+            # 已处理的订单不再属于待处理列表
+            table.remove_row(order_id)
+            return
+
+        def show_order(result):
+            row, _ = result
+            if row:
+                table.update_row(order_id, row)
+
+        run_in_background(data_window, lambda: OrderService.get_order(order_id), show_order, message=None)
+
+    load_data()
 
     Button(data_window, text="Close", command=data_window.destroy).grid(row=3, column=0, pady=5)
 
@@ -204,17 +213,16 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
             order_id = tree.item(item)['values'][0]
             
             if show_confirmation("Confirm Cancel", "Are you sure you want to cancel this order?"):
-                success, message = OrderService.cancel_order(order_id)
-                if success:
-                    show_message("Success", message)
-                    # 刷新订单列表
-                    tree.delete(*tree.get_children())
-                    data, _ = get_data_func()
-                    if data:
-                        for row in data:
-                            tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-                else:
-                    show_error("Error", message)
+                def on_done(result):
+                    success, message = result
+                    if success:
+                        show_message("Success", message)
+                        refresh_order(order_id)
+                    else:
+                        show_error("Error", message)
+
+                run_in_background(data_window, lambda: OrderService.cancel_order(order_id), on_done,
+                                  message="Cancelling order...", cancellable=False)
 
         def request_refund():
             selected_items = tree.selection()
@@ -225,17 +233,16 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
             order_id = tree.item(item)['values'][0]
             
             if show_confirmation("Confirm Refund", "Are you sure you want to request a refund for this order?"):
-                success, message = OrderService.request_refund(order_id)
-                if success:
-                    show_message("Success", message)
-                    # 刷新订单列表
-                    tree.delete(*tree.get_children())
-                    data, _ = get_data_func()
-                    if data:
-                        for row in data:
-                            tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-                else:
-                    show_error("Error", message)
+                def on_done(result):
+                    success, message = result
+                    if success:
+                        show_message("Success", message)
+                        refresh_order(order_id)
+                    else:
+                        show_error("Error", message)
+
+                run_in_background(data_window, lambda: OrderService.request_refund(order_id), on_done,
+                                  message="Submitting refund request...", cancellable=False)
 
         tree.bind('<<TreeviewSelect>>', on_select)
         
@@ -294,6 +301,46 @@ def show_search_trains_frame():
     Button(main_window, text="Search", 
            command=search_trains).pack(pady=10)
 
+    def plan_journey():
+        dep_station = dep_station_entry.get()
+        arr_station = arr_station_entry.get()
+        departure_date = date_entry.get()
+
+        if not validate_date(departure_date):
+            show_error("Error", "Invalid date format. Please use YYYY-MM-DD format")
+            return
+
+        display_table(
+            lambda: TicketService.plan_journey(
+                dep_station, arr_station, departure_date or None
+            ),
+            ["Train No", "Start Date", "From", "Departure Time", "To", "Arrival Time", 
+             "Price", "Seats", "Type", "Option", "Transfers", "Total Price"],
+            enable_booking=True  # 每个区段可单独订票
+        )
+
+    Button(main_window, text="Plan Journey (with transfers)", 
+           command=plan_journey).pack(pady=5)
+
+    def search_flexible_dates():
+        dep_station = dep_station_entry.get()
+        arr_station = arr_station_entry.get()
+        departure_date = date_entry.get()
+
+        if not validate_date(departure_date):
+            show_error("Error", "Invalid date format. Please use YYYY-MM-DD format")
+            return
+
+        display_table(
+            lambda: TicketService.search_availability_calendar(
+                dep_station, arr_station, departure_date or None
+            ),
+            ["Date", "Trains", "Lowest Fare", "Cheapest Train", "Max Seats"]
+        )
+
+    Button(main_window, text="Flexible Dates (±3 days)", 
+           command=search_flexible_dates).pack(pady=5)
+
     Button(main_window, text="Back to Main Menu", 
            command=show_main_menu_frame).pack(pady=20)
 
@@ -397,11 +444,12 @@ def show_order_query_frame():
             return
             
         display_table(
-            lambda: OrderService.get_orders_by_passenger(name, id_card),
+            lambda offset, limit: OrderService.get_orders_by_passenger_page(name, id_card, offset, limit),
             ["order_id", "train_number", "train_type", "From", "To", 
              "Price", "customer_name", "customer_phone", "operation_type", 
              "operation_time", "status"],
-            is_order_view=True  # 标记为订单视图
+            is_order_view=True,  # 标记为订单视图
+            paged=True
         )
 
     Button(main_window, text="Query", 
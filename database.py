@@ -1,91 +1,267 @@
 # database.py
 
+import contextlib
+import functools
+import threading
+import time
+
 import mysql.connector
 from mysql.connector import Error
-from db_config import DB_CONFIG
+from db_config import DB_CONFIG, REPLICA_CONFIGS, REPLICA_MAX_LAG_SECONDS, READ_YOUR_WRITES_SECONDS
+
+# 只读存储过程，可以直接路由到只读副本
+READ_ONLY_PROCEDURES = {'sp_get_train_route', 'sp_daily_sales_report', 'sp_daily_staff_report'}
+
+# 副本延迟的检测间隔（秒）
+LAG_CHECK_INTERVAL = 2
+
+_routing = threading.local()
+
+def read_from_replica(func):
+    """标记方法为只读，方法内的读查询可以路由到只读副本"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_routing, 'replica_ok', False)
+        _routing.replica_ok = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _routing.replica_ok = previous
+    return wrapper
+
+def is_read_query(query):
+    """根据语句类型判断是否为只读查询"""
+    statement = query.lstrip().lower()
+    if not statement.startswith(('select', 'show', 'with')):
+        return False
+    return 'for update' not in statement and 'lock in share mode' not in statement
+
+class Replica:
+    """单个只读副本的连接和延迟状态"""
+    def __init__(self, config):
+        self.config = config
+        self.connection = None
+        self.lag = None
+        self.lag_checked_at = 0
+
+    @property
+    def name(self):
+        return f"{self.config['host']}:{self.config.get('port', 3306)}"
 
 class Database:
-    def __init__(self):
+    """数据库访问入口
+
+    Args:
+        lazy (bool): 为True时不在构造时连接，第一次查询或调用connect/connect_in_background时再连接
+    """
+    def __init__(self, config=DB_CONFIG, replica_configs=REPLICA_CONFIGS, lazy=False):
+        self.config = config
         self.connection = None
-        self.connect()
+        self.replicas = [Replica(c) for c in replica_configs]
+        self._next_replica = 0
+        self._last_write_at = 0
+        self._connect_lock = threading.Lock()
+        # 连接对象不是线程安全的，后台线程和界面线程的查询串行执行
+        self._lock = threading.RLock()
+        if not lazy:
+            self.connect()
 
     def connect(self):
-        try:
-            self.connection = mysql.connector.connect(**DB_CONFIG)
-            if self.connection.is_connected():
-                print("Successfully connected to MySQL database")
-        except Error as e:
-            print(f"Error connecting to MySQL database: {e}")
-            self.connection = None # Ensure connection is None if failed
+        # 后台连接和首次查询可能同时发生，加锁保证只建立一个连接
+        with self._connect_lock:
+            if self.connection and self.connection.is_connected():
+                return
+            try:
+                self.connection = mysql.connector.connect(**self.config)
+                if self.connection.is_connected():
+                    print("Successfully connected to MySQL database")
+            except Error as e:
+                print(f"Error connecting to MySQL database: {e}")
+                self.connection = None # Ensure connection is None if failed
+
+    def connect_in_background(self):
+        """在后台线程中建立主库连接，返回线程对象"""
+        thread = threading.Thread(target=self.connect, name="db-connect", daemon=True)
+        thread.start()
+        return thread
 
     def close(self):
         if self.connection and self.connection.is_connected():
             self.connection.close()
             print("MySQL connection closed.")
+        for replica in self.replicas:
+            if replica.connection and replica.connection.is_connected():
+                replica.connection.close()
 
-    def execute_query(self, query, params=None, fetch_one=False, fetch_all=False):
+    def _primary(self):
         if not self.connection or not self.connection.is_connected():
-            print("Database connection is not active. Reconnecting...")
+            if self.connection is not None:
+                print("Database connection is not active. Reconnecting...")
             self.connect()
             if not self.connection or not self.connection.is_connected():
                 print("Failed to establish database connection.")
                 return None
+        return self.connection
+
+    def _replica_connection(self, replica):
+        if replica.connection and replica.connection.is_connected():
+            return replica.connection
+        try:
+            # 副本只执行读查询，开启autocommit避免长事务读到旧快照
+            replica.connection = mysql.connector.connect(**dict(replica.config, autocommit=True))
+        except Error as e:
+            print(f"Error connecting to replica {replica.name}: {e}")
+            replica.connection = None
+        return replica.connection
+
+    def _replica_lag(self, replica, conn):
+        """返回副本延迟秒数，未在复制或无法获取时返回None"""
+        now = time.monotonic()
+        if now - replica.lag_checked_at < LAG_CHECK_INTERVAL:
+            return replica.lag
 
-        cursor = self.connection.cursor(dictionary=True) # Returns rows as dictionaries
+        cursor = conn.cursor(dictionary=True)
         try:
-            cursor.execute(query, params)
-            if fetch_one:
-                result = cursor.fetchone()
-                return result
-            elif fetch_all:
-                result = cursor.fetchall()
-                return result
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Error:
+                cursor.execute("SHOW SLAVE STATUS")
+            status = cursor.fetchone()
+            if status:
+                lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
             else:
-                self.connection.commit() # Commit changes for INSERT, UPDATE, DELETE
-                return cursor.rowcount # Return number of affected rows
+                lag = None
         except Error as e:
-            self.connection.rollback() # Rollback on error
-            print(f"Database query error: {e}")
-            return None
+            print(f"Error checking lag on replica {replica.name}: {e}")
+            lag = None
         finally:
             cursor.close()
 
+        replica.lag = lag
+        replica.lag_checked_at = now
+        return lag
+
+    def _read_connection(self):
+        """选择一个延迟在阈值内的副本，没有可用副本时返回None"""
+        if not self.replicas:
+            return None
+        # 写入后的一段时间内读主库，保证读到自己的写入
+        if time.monotonic() - self._last_write_at < READ_YOUR_WRITES_SECONDS:
+            return None
+
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next_replica]
+            self._next_replica = (self._next_replica + 1) % len(self.replicas)
+            conn = self._replica_connection(replica)
+            if conn is None:
+                continue
+            lag = self._replica_lag(replica, conn)
+            if lag is not None and lag <= REPLICA_MAX_LAG_SECONDS:
+                return conn
+        return None
+
+    def _route(self, read):
+        if read:
+            conn = self._read_connection()
+            if conn is not None:
+                return conn
+        return self._primary()
+
+    def use_primary(self, seconds=READ_YOUR_WRITES_SECONDS):
+        """强制接下来的读请求走主库（例如下单后立即查询订单）"""
+        self._last_write_at = time.monotonic() - READ_YOUR_WRITES_SECONDS + seconds
+
+    def execute_query(self, query, params=None, fetch_one=False, fetch_all=False, read_only=None):
+        with self._lock:
+            if read_only is None:
+                read_only = getattr(_routing, 'replica_ok', False) and (fetch_one or fetch_all) and is_read_query(query)
+            conn = self._route(read_only)
+            if conn is None:
+                return None
+
+            cursor = conn.cursor(dictionary=True) # Returns rows as dictionaries
+            try:
+                cursor.execute(query, params)
+                if fetch_one:
+                    result = cursor.fetchone()
+                    return result
+                elif fetch_all:
+                    result = cursor.fetchall()
+                    return result
+                else:
+                    conn.commit() # Commit changes for INSERT, UPDATE, DELETE
+                    self._last_write_at = time.monotonic()
+                    return cursor.rowcount # Return number of affected rows
+            except Error as e:
+                conn.rollback() # Rollback on error
+                print(f"Database query error: {e}")
+                return None
+            finally:
+                cursor.close()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """在主库上开启一个事务，产出字典游标
+
+        代码块正常结束时提交，抛出异常时回滚并继续抛出；事务期间其他线程的查询等待。
+
+        Raises:
+            Error: 无法连接数据库
+        """
+        with self._lock:
+            conn = self._primary()
+            if conn is None:
+                raise Error("Database connection is not active")
+            cursor = conn.cursor(dictionary=True)
+            try:
+                # autocommit关闭时之前的读查询留下了隐式事务，先结束它以获得新的快照
+                conn.commit()
+                yield cursor
+                conn.commit()
+                self._last_write_at = time.monotonic()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
     def call_proc(self, proc_name, args=()):
         """调用存储过程
-        
+
         Args:
             proc_name (str): 存储过程名称
             args (tuple): 存储过程参数
-            
+
         Returns:
             list: 存储过程的结果集，如果出错则返回None
         """
-        if not self.connection or not self.connection.is_connected():
-            print("Database connection is not active. Reconnecting...")
-            self.connect()
-            if not self.connection or not self.connection.is_connected():
-                print("Failed to establish database connection.")
+        with self._lock:
+            read_only = proc_name in READ_ONLY_PROCEDURES
+            conn = self._route(read_only)
+            if conn is None:
                 return None
 
-        cursor = self.connection.cursor(dictionary=True)
-        try:
-            # 调用存储过程
-            cursor.callproc(proc_name, args)
-            
-            # 获取所有结果集
-            results = []
-            for result in cursor.stored_results():
-                results.extend(result.fetchall())
-                
-            self.connection.commit()
-            return results
-            
-        except Error as e:
-            self.connection.rollback()
-            print(f"Error calling procedure {proc_name}: {e}")
-            return None
-        finally:
-            cursor.close()
+            cursor = conn.cursor(dictionary=True)
+            try:
+                # 调用存储过程
+                cursor.callproc(proc_name, args)
+
+                # 获取所有结果集
+                results = []
+                for result in cursor.stored_results():
+                    results.extend(result.fetchall())
+
+                conn.commit()
+                if not read_only:
+                    self._last_write_at = time.monotonic()
+                return results
+
+            except Error as e:
+                conn.rollback()
+                print(f"Error calling procedure {proc_name}: {e}")
+                return None
+            finally:
+                cursor.close()
 
-# Global database instance
-db = Database()
\ No newline at end of file
+# Global database instance (connects on first use)
+db = Database(lazy=True)
\ No newline at end of file
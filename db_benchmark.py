@@ -0,0 +1,196 @@
+# db_benchmark.py
+
+"""开发用基准：比较订单表上座位库存触发器对订单更新的开销
+
+依次在三种配置下测量，每轮的数据修改都会回滚：
+    legacy     原来的after_order_success/after_order_refund两个触发器（迁移1，migrations.BASELINE_TRIGGERS）
+    generated  由order_states转换表生成的单个触发器（迁移6，inventory_trigger_sql）
+    none       无库存触发器，座位库存由应用层inventory.apply_seat_changes调整（迁移7之后的结构）
+
+迁移2的after_order_status_change（写入OrderChanges）在三种配置下都保留，它在每次更新订单时都会执行，
+所以none配置下非状态列的更新也不是完全没有触发器，三种配置的差别只是库存触发器。
+
+测量项目：
+    single     逐条更新非状态列（price），每条一个语句
+    bulk       一个语句更新N个订单的非状态列
+    approve    把N个Ready订单批准为Success（none配置下包括应用层的库存更新）
+
+用法: python db_benchmark.py [订单数]
+"""
+
+import statistics
+import sys
+import time
+
+import mysql.connector
+from db_config import DB_CONFIG
+import inventory
+import migrations
+import order_states
+
+TRIGGERS = ('after_order_success', 'after_order_refund', 'after_order_status_inventory')
+# 所有配置下都保留的订单触发器（迁移2）
+CHANGE_FEED_TRIGGER = 'after_order_status_change'
+ROUNDS = 3
+
+def seat_delta_sql(old='OLD.status', new='NEW.status'):
+    """生成按状态变化计算区间座位变化的CASE表达式，供触发器使用"""
+    cases = "\n".join(
+        f"                    WHEN {old} = '{t.source}' AND {new} = '{t.target}' THEN {t.seat_delta}"
+        for t in order_states.TRANSITIONS.values() if t.seat_delta
+    )
+    return f"CASE\n{cases}\n                    ELSE 0\n                END"
+
+def inventory_trigger_sql(name='after_order_status_inventory'):
+    """由order_states转换表生成迁移6的座位库存触发器：只有状态变化且需要调整座位时才查找区间并更新库存"""
+    return f"""
+        CREATE TRIGGER {name}
+        AFTER UPDATE ON `SalesOrders`
+        FOR EACH ROW
+        BEGIN
+            DECLARE seat_delta INT DEFAULT 0;
+            DECLARE dep_order INT;
+            DECLARE arr_order INT;
+
+            IF NEW.status <> OLD.status THEN
+                SET seat_delta = {seat_delta_sql()};
+            END IF;
+
+            IF seat_delta <> 0 THEN
+                SELECT ts.stop_order INTO dep_order
+                FROM TimetableStops ts
+                JOIN Stations st ON st.station_id = ts.station_id
+                WHERE ts.train_number = NEW.train_number
+                AND st.station_name = NEW.departure_station;
+
+                SELECT ts.stop_order INTO arr_order
+                FROM TimetableStops ts
+                JOIN Stations st ON st.station_id = ts.station_id
+                WHERE ts.train_number = NEW.train_number
+                AND st.station_name = NEW.arrival_station;
+
+                UPDATE RunInventory r
+                SET r.seats = r.seats + seat_delta
+                WHERE r.train_number = NEW.train_number
+                AND r.start_date = NEW.start_date
+                AND r.seats + seat_delta >= 0
+                AND r.stop_order >= dep_order
+                AND r.stop_order < arr_order;
+            END IF;
+        END
+    """
+
+def _drop_triggers(cursor):
+    for name in TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+def _install(cursor, mode):
+    _drop_triggers(cursor)
+    if mode == 'legacy':
+        for statement in migrations.BASELINE_TRIGGERS:
+            cursor.execute(statement)
+    elif mode == 'generated':
+        cursor.execute(inventory_trigger_sql())
+
+def _has_trigger(cursor, name):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s",
+        (name,)
+    )
+    return cursor.fetchone() is not None
+
+def _sample_orders(cursor, limit):
+    cursor.execute("SELECT order_id FROM SalesOrders ORDER BY operation_time DESC LIMIT %s", (limit,))
+    all_ids = [row['order_id'] for row in cursor.fetchall()]
+    cursor.execute("""
+        SELECT o.order_id, o.train_number, o.start_date,
+               dep.stop_order AS dep_order, arr.stop_order AS arr_order
+        FROM SalesOrders o
+        JOIN TimetableStops dep ON dep.train_number = o.train_number AND dep.station_id = o.departure_station_id
+        JOIN TimetableStops arr ON arr.train_number = o.train_number AND arr.station_id = o.arrival_station_id
+        WHERE o.status = 'Ready'
+        LIMIT %s
+    """, (limit,))
+    return all_ids, cursor.fetchall()
+
+def _timed(conn, func):
+    """执行func并回滚，返回耗时（秒）"""
+    start = time.perf_counter()
+    try:
+        func()
+        return time.perf_counter() - start
+    finally:
+        conn.rollback()
+
+def run_benchmark(order_count=500):
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor(dictionary=True, buffered=True)
+    version_cursor = conn.cursor(buffered=True)
+    try:
+        if migrations.current_version(version_cursor) != migrations.latest_version():
+            print("Run migrations.py first: the benchmark restores the latest schema when it finishes")
+            return None
+        order_ids, ready_orders = _sample_orders(cursor, order_count)
+        conn.commit()
+        if not order_ids:
+            print("No orders to benchmark; load sample data first")
+            return None
+        print(f"Benchmarking with {len(order_ids)} orders ({len(ready_orders)} Ready), {ROUNDS} rounds each")
+        if _has_trigger(cursor, CHANGE_FEED_TRIGGER):
+            print(f"{CHANGE_FEED_TRIGGER} (OrderChanges) stays installed and is included in every mode")
+        else:
+            print(f"Warning: {CHANGE_FEED_TRIGGER} is missing; timings do not include the OrderChanges trigger")
+
+        placeholders = ", ".join(["%s"] * len(order_ids))
+        approve = order_states.transition('approve', 'Ready')
+        ready_ids = [order['order_id'] for order in ready_orders]
+
+        def single_updates():
+            for order_id in order_ids:
+                cursor.execute("UPDATE SalesOrders SET price = price + 0.01 WHERE order_id = %s", (order_id,))
+
+        def bulk_update():
+            cursor.execute(
+                f"UPDATE SalesOrders SET price = price + 0.01 WHERE order_id IN ({placeholders})",
+                tuple(order_ids)
+            )
+
+        def approve_orders(mode):
+            if not ready_ids:
+                return
+            cursor.execute(*approve.guarded_update(ready_ids))
+            if mode == 'none':
+                inventory.apply_seat_changes(cursor, [
+                    (order['train_number'], order['start_date'], order['dep_order'], order['arr_order'],
+                     approve.seat_delta)
+                    for order in ready_orders
+                ])
+
+        results = {}
+        for mode in ('legacy', 'generated', 'none'):
+            _install(cursor, mode)
+            timings = {'single': [], 'bulk': [], 'approve': []}
+            for _ in range(ROUNDS):
+                timings['single'].append(_timed(conn, single_updates) / len(order_ids))
+                timings['bulk'].append(_timed(conn, bulk_update))
+                try:
+                    timings['approve'].append(_timed(conn, lambda: approve_orders(mode)))
+                except mysql.connector.Error as e:
+                    print(f"  approve skipped in {mode}: {e}")
+            results[mode] = {name: statistics.median(values) for name, values in timings.items() if values}
+
+        print(f"{'mode':<10} {'single (ms/row)':>16} {'bulk (ms)':>10} {'approve (ms)':>13}")
+        for mode, result in results.items():
+            print(f"{mode:<10} {result['single'] * 1000:16.3f} {result['bulk'] * 1000:10.1f} "
+                  f"{result.get('approve', 0) * 1000:13.1f}")
+        return results
+
+    finally:
+        conn.rollback()
+        _drop_triggers(cursor)
+        cursor.close()
+        version_cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -6,4 +6,15 @@ DB_CONFIG = {
     'password': '123456', # <<< IMPORTANT: Change this
     'database': 'train_ticket_system', # <<< IMPORTANT: Change this if your DB name is different
     'port': 3306 # Default MySQL port
-}
\ No newline at end of file
+}
+
+# Read replicas: same keys as DB_CONFIG. Leave empty to send everything to the primary.
+REPLICA_CONFIGS = [
+    # {'host': 'replica1', 'user': 'root', 'password': '123456', 'database': 'train_ticket_system', 'port': 3306},
+]
+
+# Replicas lagging more than this (seconds) are skipped
+REPLICA_MAX_LAG_SECONDS = 5
+
+# After a write, reads stay on the primary for this many seconds (read-your-writes)
+READ_YOUR_WRITES_SECONDS = 10
\ No newline at end of file
@@ -4,6 +4,8 @@ import json
 import subprocess
 from subprocess import Popen, PIPE
 from db_config import DB_CONFIG
+from db_partitions import maintain_partitions
+from order_archiver import archive_orders, ARCHIVE_AFTER_DAYS
 from tqdm import tqdm
 import time
 import tkinter as tk
@@ -378,6 +380,10 @@ class DatabaseMaintenanceUI:
                   command=self.delete_selected_backup).pack(side=tk.LEFT, padx=5)
         ttk.Button(top_frame, text="Refresh", 
                   command=self.refresh_backup_list).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="Maintain Partitions", 
+                  command=self.run_partition_maintenance).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="Archive Old Orders", 
+                  command=self.run_order_archiver).pack(side=tk.LEFT, padx=5)
         ttk.Button(self.root, text="Exit", 
                   command=self.root.quit).pack(pady=10)
         
@@ -437,6 +443,40 @@ class DatabaseMaintenanceUI:
         ttk.Button(backup_info_window, text="Cancel", 
                   command=backup_info_window.destroy).pack(pady=5)
 
+    def run_partition_maintenance(self):
+        """为订单表补充未来分区并归档过期分区"""
+        if not self.show_confirmation("Confirm Maintenance",
+                                      "Add future partitions and archive partitions older than 24 months?"):
+            return
+
+        def maintenance_thread():
+            result = maintain_partitions()
+            if result is None:
+                self.show_error("Error", "Partition maintenance failed")
+                return
+            summary = "\n".join(
+                f"{table}: +{len(changes['added'])} / -{len(changes['dropped'])} partitions"
+                for table, changes in result.items()
+            )
+            self.show_message("Success", f"Partition maintenance completed:\n{summary}")
+
+        threading.Thread(target=maintenance_thread, daemon=True).start()
+
+    def run_order_archiver(self):
+        """把已完成的旧订单移入归档表"""
+        if not self.show_confirmation("Confirm Archive",
+                                      f"Move orders completed more than {ARCHIVE_AFTER_DAYS} days ago to the archive tables?"):
+            return
+
+        def archive_thread():
+            archived = archive_orders()
+            if archived is None:
+                self.show_error("Error", "Failed to archive orders")
+            else:
+                self.show_message("Success", f"Archived {archived} orders")
+
+        threading.Thread(target=archive_thread, daemon=True).start()
+
     def restore_selected_backup(self):
         """恢复选中的备份"""
         selected = self.backup_tree.selection()
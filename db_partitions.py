@@ -0,0 +1,221 @@
+# db_partitions.py
+
+import datetime
+
+import mysql.connector
+from mysql.connector import Error
+from db_config import DB_CONFIG
+from cache import invalidate_table
+from order_archiver import ORDER_COLUMNS, OPERATION_COLUMNS, FINAL_ORDER_CONDITION
+
+# 按operation_time月度分区的表
+PARTITIONED_TABLES = ("SalesOrders", "OrderOperations")
+
+# 分区数据归档到order_archiver使用的归档表，乘客查询和get_order照常能查到
+ARCHIVE_TABLES = {
+    "SalesOrders": ("SalesOrdersArchive", ORDER_COLUMNS),
+    "OrderOperations": ("OrderOperationsArchive", OPERATION_COLUMNS),
+}
+
+# 分区中仍有未完成的订单（或未完成订单的操作记录）时不删除该分区
+UNFINISHED_ROWS_QUERY = {
+    "SalesOrders": f"""
+        SELECT COUNT(*) FROM `SalesOrders` PARTITION ({{name}})
+        WHERE NOT ({FINAL_ORDER_CONDITION})
+    """,
+    "OrderOperations": f"""
+        SELECT COUNT(*) FROM `OrderOperations` PARTITION ({{name}}) op
+        JOIN `SalesOrders` ON SalesOrders.order_id = op.order_id
+        WHERE NOT ({FINAL_ORDER_CONDITION})
+    """,
+}
+
+# 兜底分区，接收尚未建立月度分区的未来数据
+MAX_PARTITION = "pmax"
+
+def month_start(day, offset=0):
+    """返回day所在月份向后偏移offset个月的月初日期"""
+    month = day.year * 12 + day.month - 1 + offset
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
+def partition_name(month):
+    """月度分区名，例如 2026-10 -> p202610"""
+    return f"p{month.year:04d}{month.month:02d}"
+
+def partition_definition(month):
+    """分区pYYYYMM保存operation_time早于下个月月初的数据"""
+    boundary = month_start(month, 1)
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{boundary.isoformat()}'))"
+
+def partition_clause(months_back=12, months_ahead=3, today=None):
+    """生成建表用的PARTITION BY子句
+
+    最早的分区同时保存更早的历史数据，pmax接收超出最后一个月度分区的数据。
+    """
+    today = today or datetime.date.today()
+    definitions = [
+        partition_definition(month_start(today, offset))
+        for offset in range(-months_back, months_ahead + 1)
+    ]
+    definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    return "PARTITION BY RANGE (TO_DAYS(`operation_time`)) (\n            " + \
+        ",\n            ".join(definitions) + "\n        )"
+
+def list_partitions(cursor, table):
+    """返回表的分区 [(partition_name, table_rows)]，按分区顺序排列"""
+    cursor.execute("""
+        SELECT PARTITION_NAME, TABLE_ROWS
+        FROM INFORMATION_SCHEMA.PARTITIONS
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (DB_CONFIG['database'], table))
+    return cursor.fetchall()
+
+def _month_of(name):
+    """pYYYYMM -> 月初日期，非月度分区返回None"""
+    if name == MAX_PARTITION or len(name) != 7 or not name[1:].isdigit():
+        return None
+    return datetime.date(int(name[1:5]), int(name[5:7]), 1)
+
+def add_future_partitions(cursor, table, months_ahead=3, today=None):
+    """从pmax中拆分出未来months_ahead个月的月度分区
+
+    pmax中通常没有数据，REORGANIZE只修改元数据。
+
+    Returns:
+        list: 新增的分区名
+    """
+    today = today or datetime.date.today()
+    existing = {_month_of(name) for name, _ in list_partitions(cursor, table)}
+    existing.discard(None)
+    last = max(existing) if existing else month_start(today, -1)
+
+    months = []
+    month = month_start(last, 1)
+    while month <= month_start(today, months_ahead):
+        months.append(month)
+        month = month_start(month, 1)
+    if not months:
+        return []
+
+    definitions = [partition_definition(month) for month in months]
+    definitions.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+    cursor.execute(
+        f"ALTER TABLE `{table}` REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(definitions)})"
+    )
+    return [partition_name(month) for month in months]
+
+def _table_exists(cursor, table):
+    cursor.execute("""
+        SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+    """, (DB_CONFIG['database'], table))
+    return cursor.fetchone()[0] > 0
+
+def _count_rows(cursor, sql):
+    cursor.execute(sql)
+    return cursor.fetchone()[0]
+
+def unfinished_rows(cursor, table, name):
+    """分区中未完成订单的行数（未完成: 不是已取消、已退款或已发车的成功订单）"""
+    return _count_rows(cursor, UNFINISHED_ROWS_QUERY[table].format(name=name))
+
+def archive_partition(cursor, table, name):
+    """把分区的数据移入归档表，分区本身变为空分区
+
+    先用EXCHANGE PARTITION把分区交换到临时表 <table>_<partition>（只交换表空间，不锁定热表的其他分区），
+    再从临时表复制到SalesOrdersArchive/OrderOperationsArchive并删除临时表。
+    中途失败后重新运行是安全的：临时表中已有数据时不再交换，复制使用INSERT IGNORE。
+
+    Returns:
+        int: 复制到归档表的行数
+    """
+    archive_table, columns = ARCHIVE_TABLES[table]
+    staging_table = f"{table}_{name}"
+    partition_rows = _count_rows(cursor, f"SELECT COUNT(*) FROM `{table}` PARTITION ({name})")
+
+    if not _table_exists(cursor, staging_table):
+        if not partition_rows:
+            return 0
+        cursor.execute(f"CREATE TABLE `{staging_table}` LIKE `{table}`")
+        cursor.execute(f"ALTER TABLE `{staging_table}` REMOVE PARTITIONING")
+    if partition_rows:
+        # 上次运行已交换过的临时表必须先复制完，否则再次交换会把归档数据换回分区
+        if _count_rows(cursor, f"SELECT COUNT(*) FROM `{staging_table}`"):
+            raise Error(msg=f"{staging_table} and partition {table}.{name} both hold rows; resolve manually")
+        cursor.execute(f"ALTER TABLE `{table}` EXCHANGE PARTITION {name} WITH TABLE `{staging_table}`")
+
+    cursor.execute(f"""
+        INSERT IGNORE INTO `{archive_table}` ({columns})
+        SELECT {columns} FROM `{staging_table}`
+    """)
+    copied = cursor.rowcount
+    cursor.execute(f"DROP TABLE `{staging_table}`")
+    return copied
+
+def drop_old_partitions(cursor, table, retain_months=24, archive=True, today=None):
+    """删除早于保留期的月度分区
+
+    Args:
+        retain_months (int): 保留的月数（含当月）
+        archive (bool): 删除前先把分区数据移入归档表
+
+    Returns:
+        list: 被删除的分区名；仍有未完成订单的分区保留，留待订单完成后的下一次维护
+    """
+    today = today or datetime.date.today()
+    cutoff = month_start(today, -(retain_months - 1))
+    partitions = [name for name, _ in list_partitions(cursor, table)]
+
+    # 至少保留一个月度分区和pmax
+    expired = []
+    for name in partitions[:-2]:
+        if (_month_of(name) or cutoff) >= cutoff:
+            continue
+        unfinished = unfinished_rows(cursor, table, name)
+        if unfinished:
+            print(f"Keeping {table}.{name}: {unfinished} rows belong to unfinished orders")
+            continue
+        expired.append(name)
+
+    for name in expired:
+        if archive:
+            copied = archive_partition(cursor, table, name)
+            print(f"Archived {copied} rows from {table}.{name} to {ARCHIVE_TABLES[table][0]}")
+    if expired:
+        cursor.execute(f"ALTER TABLE `{table}` DROP PARTITION {', '.join(expired)}")
+    return expired
+
+def maintain_partitions(months_ahead=3, retain_months=24, archive=True):
+    """为所有分区表补充未来分区并清理过期分区
+
+    Returns:
+        dict: {table: {'added': [...], 'dropped': [...]}}，失败时返回None
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor(buffered=True)
+        result = {}
+        for table in PARTITIONED_TABLES:
+            added = add_future_partitions(cursor, table, months_ahead)
+            dropped = drop_old_partitions(cursor, table, retain_months, archive)
+            result[table] = {'added': added, 'dropped': dropped}
+            if added or dropped:
+                print(f"{table}: added {added or 'none'}, dropped {dropped or 'none'}")
+            if dropped:
+                invalidate_table(table)
+                invalidate_table(ARCHIVE_TABLES[table][0])
+        return result
+    except Error as e:
+        print(f"Error maintaining partitions: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+if __name__ == "__main__":
+    maintain_partitions()
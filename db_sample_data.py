@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 import csv
 import json
 import os
+from service_calendar import materialize_runs, EVERY_DAY
 
 def insert_sample_data():
     """
@@ -21,7 +22,7 @@ def insert_sample_data():
         # Insert sample data in correct dependency order
         station_ids = insert_stations_from_csv(cursor)
         train_numbers = insert_trains_from_csv(cursor, station_ids)
-        insert_stopovers_from_csv(cursor, train_numbers, station_ids)
+        insert_timetables_from_csv(cursor, train_numbers, station_ids)
         price_data = insert_prices_from_config(cursor, train_numbers)
         insert_customers_from_csv(cursor)
         insert_salespersons_from_csv(cursor)  # Add this line
@@ -48,9 +49,26 @@ def clear_existing_data(cursor):
     cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
     
     tables = [
+        "OrderOperations",
         "SalesOrders",
-        "Salespersons", "Prices", "Stopovers", 
-        "Trains", "Stations", "Customers"  # Added Customers table
+        "OrderOperationsArchive",
+        "SalesOrdersArchive",
+        "OrderChanges",
+        "SeatHolds",
+        "IdempotencyKeys",
+        "OrderOutbox",
+        "OrderEvents",
+        "OrderSnapshots",
+        "OrderIds",
+        "Salespersons",
+        "Prices",
+        "RunInventory",
+        "ServiceExceptions",
+        "ServiceCalendars",
+        "TimetableStops",
+        "Trains",
+        "Stations",
+        "Customers",
     ]
     
     for table in tables:
@@ -103,35 +121,61 @@ def insert_trains_from_csv(cursor, station_ids):
     print(f"Inserted {len(trains_data)} trains")
     return train_seats
 
-def insert_stopovers_from_csv(cursor, train_seats, station_ids):
-    """Insert stopovers from CSV file"""
+def insert_timetables_from_csv(cursor, train_seats, station_ids):
+    """Insert timetable templates, service calendars and per-run seat inventory from stopovers CSV
+
+    stopovers.csv lists every stop of every run. The first run of each train becomes its
+    timetable template (times stored as minutes after midnight of the start date); the set
+    of start dates becomes a daily calendar with 'Removed' exceptions for the gaps.
+    """
     stopovers_data = read_csv_file('stopovers.csv')
-    
-    inserted_count = 0
+
+    runs = {}
     for row in stopovers_data:
         if row['train_number'] not in train_seats:
             continue
-            
-        station_id = station_ids.get(row['station_name'])
-        if not station_id:
+        if not station_ids.get(row['station_name']):
             continue
+        start_date = datetime.strptime(row['start_date'], '%Y-%m-%d').date()
+        runs.setdefault(row['train_number'], {}).setdefault(start_date, []).append(row)
 
-        arrival_time = None
-        if row['arrival_time'] != "-":
-            arrival_time = datetime.strptime(row['arrival_time'], '%Y-%m-%d %H:%M:%S')
+    def minutes_after(start_date, value):
+        if value == "-":
+            return None
+        moment = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+        return int((moment - datetime.combine(start_date, datetime.min.time())).total_seconds() // 60)
 
-        departure_time = None 
-        if row['departure_time'] != "-":
-            departure_time = datetime.strptime(row['departure_time'], '%Y-%m-%d %H:%M:%S')
+    template_count = 0
+    for train_number, dates in runs.items():
+        first_date = min(dates)
+        for row in sorted(dates[first_date], key=lambda r: int(r['stop_order'])):
+            cursor.execute(
+                "INSERT INTO `TimetableStops` (`train_number`, `stop_order`, `station_id`, `arrival_offset`, `departure_offset`, `distance`) VALUES (%s, %s, %s, %s, %s, %s)",
+                (train_number, int(row['stop_order']), station_ids[row['station_name']],
+                 minutes_after(first_date, row['arrival_time']),
+                 minutes_after(first_date, row['departure_time']),
+                 int(row['distance']) if row['distance'] else 0)
+            )
+            template_count += 1
 
+        last_date = max(dates)
         cursor.execute(
-            "INSERT INTO `Stopovers` (`train_number`, `station_id`,`arrival_time`, `departure_time`, `start_date`, `stop_order`, `seats`, `distance`) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-            (row['train_number'], station_id, arrival_time, departure_time, datetime.strptime(row['start_date'], '%Y-%m-%d').date(), 
-             int(row['stop_order']), train_seats[row['train_number']], int(row['distance']) if row['distance'] else 0)
+            "INSERT INTO `ServiceCalendars` (`train_number`, `valid_from`, `valid_to`, `days_of_week`) VALUES (%s, %s, %s, %s)",
+            (train_number, first_date, last_date, EVERY_DAY)
         )
-        inserted_count += 1
-    
-    print(f"Inserted {inserted_count} stopovers")
+        day = first_date
+        while day < last_date:
+            if day not in dates:
+                cursor.execute(
+                    "INSERT INTO `ServiceExceptions` (`train_number`, `service_date`, `exception_type`) VALUES (%s, %s, 'Removed')",
+                    (train_number, day)
+                )
+            day += timedelta(days=1)
+
+    all_dates = [day for dates in runs.values() for day in dates]
+    run_count = materialize_runs(cursor, min(all_dates), max(all_dates)) if all_dates else 0
+
+    print(f"Inserted {template_count} timetable stops for {len(runs)} trains, {run_count} runs")
 
 def insert_prices_from_config(cursor, train_numbers):
     """
@@ -317,7 +361,7 @@ def insert_sample_data():
         # Insert sample data in correct dependency order
         station_ids = insert_stations_from_csv(cursor)
         train_numbers = insert_trains_from_csv(cursor, station_ids)
-        insert_stopovers_from_csv(cursor, train_numbers, station_ids)
+        insert_timetables_from_csv(cursor, train_numbers, station_ids)
         insert_prices_from_config(cursor, train_numbers)
         insert_customers_from_csv(cursor)
         insert_salespersons_from_csv(cursor)  # Add this line
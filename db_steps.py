@@ -0,0 +1,53 @@
+# db_steps.py
+
+"""同步和异步服务共用的事务步骤
+
+事务中的逻辑写成生成器，逐条产出 (sql, params, mode) 并接收执行结果：
+    'all'    execute后fetchall，结果为行列表
+    'count'  execute，结果为影响的行数
+    'many'   executemany，params为参数行列表（为空时不执行），结果为影响的行数
+生成器的返回值就是步骤的结果。run在mysql.connector游标上执行，run_async在aiomysql游标上执行，
+同步和异步服务因此共用同一份SQL和判断逻辑，只有执行方式不同。
+"""
+
+def run(cursor, steps):
+    """在调用方事务的同步游标上执行步骤，返回生成器的返回值"""
+    result = None
+    try:
+        while True:
+            sql, params, mode = steps.send(result)
+            result = _execute(cursor, sql, params, mode)
+    except StopIteration as stop:
+        return stop.value
+
+def _execute(cursor, sql, params, mode):
+    if mode == 'many':
+        if not params:
+            return 0
+        cursor.executemany(sql, params)
+        return cursor.rowcount
+    cursor.execute(sql, params)
+    if mode == 'all':
+        return cursor.fetchall()
+    return cursor.rowcount
+
+async def run_async(cursor, steps):
+    """run的异步版本，在async_db.transaction()产出的游标上执行"""
+    result = None
+    try:
+        while True:
+            sql, params, mode = steps.send(result)
+            result = await _execute_async(cursor, sql, params, mode)
+    except StopIteration as stop:
+        return stop.value
+
+async def _execute_async(cursor, sql, params, mode):
+    if mode == 'many':
+        if not params:
+            return 0
+        await cursor.executemany(sql, params)
+        return cursor.rowcount
+    await cursor.execute(sql, params)
+    if mode == 'all':
+        return list(await cursor.fetchall())
+    return cursor.rowcount
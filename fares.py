@@ -0,0 +1,177 @@
+# fares.py
+
+from array import array
+
+from database import db
+from cache import LRUCache
+
+# 每趟列车一张票价矩阵，票价或时刻表修改时失效
+fare_cache = LRUCache("fares", maxsize=1024, ttl=3600, tables=("Prices", "TimetableStops", "Trains"))
+
+STOPS_QUERY = """
+SELECT train_number, station_id, stop_order, distance
+FROM TimetableStops
+WHERE train_number = %s
+ORDER BY stop_order
+"""
+
+PRICES_QUERY = """
+SELECT train_number, departure_station_id, arrival_station_id, price_per_ten_miles
+FROM Prices
+WHERE train_number = %s
+"""
+
+class FareTable:
+    """一趟列车所有起讫站组合的票价矩阵
+
+    fares按行优先存放在一维数组中，fares[i * n + j] 为第i站到第j站的票价，
+    不可达的组合(j <= i)为-1。
+    """
+    __slots__ = ('train_number', 'index', 'size', 'fares')
+
+    def __init__(self, train_number, station_ids, fares):
+        self.train_number = train_number
+        self.index = {station_id: i for i, station_id in enumerate(station_ids)}
+        self.size = len(station_ids)
+        self.fares = fares
+
+    def fare(self, dep_station_id, arr_station_id):
+        """返回区间票价，区间无效时返回None"""
+        i = self.index.get(dep_station_id)
+        j = self.index.get(arr_station_id)
+        if i is None or j is None:
+            return None
+        value = self.fares[i * self.size + j]
+        return value if value >= 0 else None
+
+def _segment_rate(prices, i, j):
+    """区间(i, j)适用的每十英里单价
+
+    优先使用起讫站完全匹配的价格；否则使用覆盖该区间的最短价格区段；
+    都没有时使用该车次的第一条价格。
+    """
+    exact = prices.get((i, j))
+    if exact is not None:
+        return exact
+    covering = [
+        (arr - dep, rate)
+        for (dep, arr), rate in prices.items()
+        if dep <= i and arr >= j
+    ]
+    if covering:
+        return min(covering)[1]
+    return next(iter(prices.values()))
+
+def build_fare_table(train_number, stops, price_rows):
+    """根据停站距离和Prices记录预先计算票价矩阵
+
+    Args:
+        stops (list): 按stop_order排序的 {'station_id', 'distance'} 行
+        price_rows (list): Prices表中该车次的行
+
+    Returns:
+        FareTable: 没有停站或价格信息时返回None
+    """
+    if not stops or not price_rows:
+        return None
+
+    station_ids = [stop['station_id'] for stop in stops]
+    distances = [stop['distance'] or 0 for stop in stops]
+    position = {station_id: i for i, station_id in enumerate(station_ids)}
+
+    # 价格区段转换为站序索引，起讫站不在停站列表中的记录忽略
+    prices = {}
+    for row in price_rows:
+        i = position.get(row['departure_station_id'])
+        j = position.get(row['arrival_station_id'])
+        if i is not None and j is not None and i < j:
+            prices[(i, j)] = float(row['price_per_ten_miles'])
+    if not prices:
+        prices[(0, len(station_ids) - 1)] = float(price_rows[0]['price_per_ten_miles'])
+
+    n = len(station_ids)
+    fares = array('d', [-1.0]) * (n * n)
+    for i in range(n):
+        for j in range(i + 1, n):
+            rate = _segment_rate(prices, i, j)
+            fares[i * n + j] = round(rate * (distances[j] - distances[i]) / 10, 1)
+
+    return FareTable(train_number, station_ids, fares)
+
+def get_fare_table(train_number):
+    """获取列车的票价矩阵（结果缓存）"""
+    hit, table = fare_cache.get(train_number)
+    if hit:
+        return table
+
+    stops = db.execute_query(STOPS_QUERY, (train_number,), fetch_all=True)
+    price_rows = db.execute_query(PRICES_QUERY, (train_number,), fetch_all=True)
+    if stops is None or price_rows is None:
+        return None
+
+    table = build_fare_table(train_number, stops, price_rows)
+    fare_cache.set(train_number, table)
+    return table
+
+async def get_fare_table_async(train_number):
+    """get_fare_table的异步版本，与同步版本共用缓存"""
+    from async_database import async_db
+
+    hit, table = fare_cache.get(train_number)
+    if hit:
+        return table
+
+    stops = await async_db.execute_query(STOPS_QUERY, (train_number,), fetch_all=True)
+    price_rows = await async_db.execute_query(PRICES_QUERY, (train_number,), fetch_all=True)
+    if stops is None or price_rows is None:
+        return None
+
+    table = build_fare_table(train_number, stops, price_rows)
+    fare_cache.set(train_number, table)
+    return table
+
+def load_all_fare_tables():
+    """一次读取所有列车的停站和价格，预先计算并缓存全部票价矩阵
+
+    Returns:
+        dict: {train_number: FareTable}，查询失败时返回None
+    """
+    stops = db.execute_query("""
+        SELECT train_number, station_id, stop_order, distance
+        FROM TimetableStops
+        ORDER BY train_number, stop_order
+    """, fetch_all=True)
+    price_rows = db.execute_query("""
+        SELECT train_number, departure_station_id, arrival_station_id, price_per_ten_miles
+        FROM Prices
+    """, fetch_all=True)
+    if stops is None or price_rows is None:
+        return None
+
+    stops_by_train = {}
+    for stop in stops:
+        stops_by_train.setdefault(stop['train_number'], []).append(stop)
+    prices_by_train = {}
+    for row in price_rows:
+        prices_by_train.setdefault(row['train_number'], []).append(row)
+
+    tables = {}
+    for train_number, train_stops in stops_by_train.items():
+        table = build_fare_table(train_number, train_stops, prices_by_train.get(train_number))
+        fare_cache.set(train_number, table)
+        tables[train_number] = table
+    return tables
+
+def get_fare(train_number, dep_station_id, arr_station_id):
+    """返回区间票价，没有价格信息或区间无效时返回None"""
+    table = get_fare_table(train_number)
+    if table is None:
+        return None
+    return table.fare(dep_station_id, arr_station_id)
+
+async def get_fare_async(train_number, dep_station_id, arr_station_id):
+    """get_fare的异步版本"""
+    table = await get_fare_table_async(train_number)
+    if table is None:
+        return None
+    return table.fare(dep_station_id, arr_station_id)
@@ -1,6 +1,10 @@
 from tkinter import Toplevel, Label, Button
 from tkinter import messagebox
+from tkinter import ttk
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import queue
+import time
 import tkinter as tk
 
 
@@ -111,3 +115,482 @@ def validate_date(date_str):
     except ValueError:
         return False
 
+# --- Background Loading ---
+# 服务调用在线程池中执行，结果通过队列交回Tk主线程，由after()轮询
+_worker_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="gui-worker")
+POLL_INTERVAL_MS = 50
+
+class BackgroundTask:
+    """一个在后台线程执行的服务调用及其进度提示
+
+    取消后结果被丢弃；已经开始执行的数据库查询会运行到结束，但不再更新界面。
+    """
+    def __init__(self, widget, on_result, on_error=None):
+        self.widget = widget
+        self.on_result = on_result
+        self.on_error = on_error
+        self.cancelled = False
+        self.future = None
+        self._results = queue.Queue(maxsize=1)
+        self._progress = None
+        self._status = None
+        self._bar = None
+        self._message = ""
+        self._started_at = time.monotonic()
+
+    def _run(self, func):
+        # 工作线程中执行，不能访问任何Tk对象
+        try:
+            self._results.put((True, func()))
+        except Exception as e:
+            self._results.put((False, e))
+
+    def show_progress(self, message, cancellable=True):
+        """在窗口中央显示进度条和取消按钮"""
+        self._message = message
+        self._progress = tk.Frame(self.widget, relief=tk.RIDGE, borderwidth=2)
+        self._status = Label(self._progress, text=message)
+        self._status.pack(padx=10, pady=(10, 5))
+        self._bar = ttk.Progressbar(self._progress, mode='indeterminate', length=200)
+        self._bar.pack(padx=10, pady=5)
+        self._bar.start(10)
+        if cancellable:
+            Button(self._progress, text="Cancel", command=self.cancel).pack(pady=(5, 10))
+        self._progress.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+
+    def _hide_progress(self):
+        if self._progress is not None:
+            self._bar.stop()
+            self._progress.destroy()
+            self._progress = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+        self._hide_progress()
+
+    def _poll(self):
+        if self.cancelled or not self.widget.winfo_exists():
+            return
+        try:
+            ok, value = self._results.get_nowait()
+        except queue.Empty:
+            if self._status is not None:
+                self._status['text'] = f"{self._message} ({time.monotonic() - self._started_at:.0f}s)"
+            self.widget.after(POLL_INTERVAL_MS, self._poll)
+            return
+
+        self._hide_progress()
+        if ok:
+            self.on_result(value)
+        elif self.on_error:
+            self.on_error(value)
+        else:
+            messagebox.showerror("Error", f"An error occurred: {str(value)}")
+
+def run_in_background(widget, func, on_result, on_error=None, message="Loading...", cancellable=True):
+    """在线程池中执行func，完成后在主线程中调用on_result(func的返回值)
+
+    Args:
+        widget: 显示进度提示并负责轮询的窗口，窗口关闭后结果被丢弃
+        func (callable): 无参数的服务调用
+        on_result (callable): 成功时的回调
+        on_error (callable, optional): func抛出异常时的回调，默认弹出错误框
+        message (str): 进度提示文字，为None时不显示进度提示
+        cancellable (bool): 是否显示取消按钮
+
+    Returns:
+        BackgroundTask: 可用于取消
+    """
+    task = BackgroundTask(widget, on_result, on_error)
+    if message is not None:
+        task.show_progress(message, cancellable)
+    task.future = _worker_pool.submit(task._run, func)
+    widget.after(POLL_INTERVAL_MS, task._poll)
+    return task
+
+# --- Virtual Table ---
+def format_cell(value):
+    return str(value) if value is not None else "-"
+
+class ListSource:
+    """已全部加载到内存中的表格数据"""
+    def __init__(self, rows, key_index=0):
+        self._rows = list(rows)
+        self.key_index = key_index
+        self.on_change = None
+
+    def attach(self, widget, on_change):
+        self.on_change = on_change
+
+    def count(self):
+        return len(self._rows)
+
+    def rows(self, start, count):
+        return self._rows[start:start + count]
+
+    def index_of(self, key):
+        for i, row in enumerate(self._rows):
+            if str(row[self.key_index]) == str(key):  # Treeview会把数字字符串转换为int
+                return i
+        return None
+
+    def replace(self, key, row):
+        i = self.index_of(key)
+        if i is not None:
+            self._rows[i] = row
+
+    def remove(self, key):
+        i = self.index_of(key)
+        if i is not None:
+            del self._rows[i]
+
+    def insert(self, index, row):
+        self._rows.insert(index, row)
+
+    def upsert(self, row):
+        """替换相同key的行，否则插入到最前面"""
+        key = row[self.key_index]
+        if self.index_of(key) is not None:
+            self.replace(key, row)
+        else:
+            self.insert(0, row)
+
+class PagedSource:
+    """按页从服务加载的表格数据，滚动到未加载的位置时在后台取页
+
+    本地插入或删除行会使后面的行号移动，移动之前发出的取页请求按旧的偏移返回，结果被丢弃后重新取页。
+
+    Args:
+        fetch_page (callable): fetch_page(offset, limit) -> ((rows, total), error)
+        page_size (int): 每页行数
+        sort_key (callable, optional): 服务端排序对应的行排序键，用于确定推送的新行的位置
+        descending (bool): 服务端按sort_key降序排列
+    """
+    def __init__(self, fetch_page, page_size=100, key_index=0, sort_key=None, descending=False):
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.key_index = key_index
+        self.sort_key = sort_key
+        self.descending = descending
+        self.total = None
+        self._rows = {}  # 行号 -> 行
+        self._pending = {}  # 页号 -> 发出请求时的版本
+        self._version = 0  # 每次本地移动行号时加一
+        self.widget = None
+        self.on_change = None
+
+    def attach(self, widget, on_change):
+        self.widget = widget
+        self.on_change = on_change
+        self._request(0)
+
+    def count(self):
+        return self.total or 0
+
+    def rows(self, start, count):
+        """返回[start, start + count)的行，未加载的行为None"""
+        result = []
+        for i in range(start, min(start + count, self.count())):
+            row = self._rows.get(i)
+            if row is None:
+                self._request(i // self.page_size)
+            result.append(row)
+        return result
+
+    def _request(self, page):
+        if self._pending.get(page) == self._version:
+            return
+        self._pending[page] = version = self._version
+        offset = page * self.page_size
+        run_in_background(
+            self.widget,
+            lambda: self.fetch_page(offset, self.page_size),
+            lambda result: self._loaded(page, version, result),
+            message="Loading..." if self.total is None else None
+        )
+
+    def _loaded(self, page, version, result):
+        if self._pending.get(page) == version:
+            del self._pending[page]
+        if version != self._version:
+            # 请求之后本地插入或删除过行，按旧偏移取到的行会错位；刷新后按新的偏移重新取页
+            if self.on_change:
+                self.on_change()
+            return
+        data, error = result
+        if error:
+            if self.total is None:
+                self.total = 0
+                messagebox.showinfo("Information", error)
+        else:
+            rows, self.total = data
+            offset = page * self.page_size
+            positions = {str(r[self.key_index]): i for i, r in self._rows.items()}
+            for k, row in enumerate(rows):
+                # 同一订单已在其他位置（之前推送的行）时以本页为准
+                key = str(row[self.key_index])
+                previous = positions.get(key)
+                if (previous is not None and previous != offset + k and previous in self._rows
+                        and str(self._rows[previous][self.key_index]) == key):
+                    del self._rows[previous]
+                self._rows[offset + k] = row
+        if self.on_change:
+            self.on_change()
+
+    def index_of(self, key):
+        for i, row in self._rows.items():
+            if str(row[self.key_index]) == str(key):  # Treeview会把数字字符串转换为int
+                return i
+        return None
+
+    def replace(self, key, row):
+        i = self.index_of(key)
+        if i is not None:
+            self._rows[i] = row
+
+    def remove(self, key):
+        # 后面的行前移一位；服务端的分页偏移同样前移，缺失的行重新取页即可
+        i = self.index_of(key)
+        if i is None:
+            return
+        self._rows = {
+            (j - 1 if j > i else j): row for j, row in self._rows.items() if j != i
+        }
+        self.total -= 1
+        self._version += 1
+
+    def insert(self, index, row):
+        # 后面的行后移一位
+        self._rows = {(j + 1 if j >= index else j): r for j, r in self._rows.items()}
+        self._rows[index] = row
+        self.total = (self.total or 0) + 1
+        self._version += 1
+
+    def _sorts_before(self, row, other):
+        """按服务端的排序row是否排在other之前"""
+        if self.descending:
+            return self.sort_key(row) > self.sort_key(other)
+        return self.sort_key(row) < self.sort_key(other)
+
+    def upsert(self, row):
+        """替换已加载的同key行；新行按sort_key放到已加载的连续区间中
+
+        新行落在两个已加载行之间、且中间没有未加载的行时直接插入；落在未加载的位置时无法确定行号
+        （推送的也可能是已计入total但尚未加载的订单），丢弃该位置之后已加载的行并重新取页，
+        total由取到的页更新。
+        """
+        key = row[self.key_index]
+        if self.index_of(key) is not None:
+            self.replace(key, row)
+            return
+        if self.total is None:
+            return  # 第一页还没有返回，取到的页会包含这一行
+        if self.sort_key is None:
+            self._invalidate_from(0)
+            return
+
+        # 第一个排在新行之后的已加载行
+        after = next(
+            (i for i in sorted(self._rows) if self._sorts_before(row, self._rows[i])),
+            self.total
+        )
+        gap = after  # 新行可以放在[gap, after]中的任意位置
+        while gap > 0 and gap - 1 not in self._rows:
+            gap -= 1
+        if gap == after:
+            self.insert(after, row)
+        else:
+            self._invalidate_from(gap)
+
+    def _invalidate_from(self, index):
+        """丢弃index及之后已加载的行，并重新取index所在的页（同时刷新total）"""
+        self._rows = {i: row for i, row in self._rows.items() if i < index}
+        self._version += 1
+        self._request(index // self.page_size)
+
+class VirtualTable(tk.Frame):
+    """只创建可见行的表格
+
+    Treeview中只保留一屏的行，滚动时把数据源中对应位置的行写入这些行，
+    因此无论数据有多少行，创建和刷新的代价都只与窗口高度有关。
+    通过tree属性访问Treeview以读取选中行，选中的行在滚动时保持不变。
+    """
+    HEADER_HEIGHT = 24
+
+    def __init__(self, parent, columns, key_index=0, column_width=100):
+        super().__init__(parent)
+        self.key_index = key_index
+        self.source = ListSource([], key_index)
+        self.first = 0
+        self.visible = 1
+        self._selected_key = None
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="browse")
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=column_width)
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=hsb.set)
+
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.vsb.grid(row=0, column=1, sticky="ns")
+        hsb.grid(row=1, column=0, sticky="ew")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<Up>', lambda e: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-self.visible))
+        self.tree.bind('<Next>', lambda e: self.scroll(self.visible))
+
+    def set_source(self, source):
+        self.source = source
+        self.first = 0
+        self._selected_key = None
+        source.attach(self, self.render)
+        self._render()
+
+    def set_rows(self, rows):
+        self.set_source(ListSource(rows, self.key_index))
+
+    def _remember_selection(self):
+        selection = self.tree.selection()
+        if selection:
+            rows = self.source.rows(self.first + self.tree.index(selection[0]), 1)
+            if rows and rows[0] is not None:
+                self._selected_key = rows[0][self.key_index]
+
+    def render(self):
+        """数据变化后刷新可见行"""
+        self._remember_selection()
+        self._render()
+
+    def _render(self):
+        """把当前可见范围内的行写入Treeview"""
+        total = self.source.count()
+        self.first = max(0, min(self.first, total - self.visible))
+        rows = self.source.rows(self.first, self.visible)
+
+        items = self.tree.get_children()
+        for item in items[len(rows):]:
+            self.tree.delete(item)
+        items = items[:len(rows)]
+        for _ in range(len(rows) - len(items)):
+            items += (self.tree.insert("", "end"),)
+
+        selected = None
+        for item, row in zip(items, rows):
+            if row is None:
+                self.tree.item(item, values=["..."])
+                continue
+            self.tree.item(item, values=[format_cell(value) for value in row])
+            if self._selected_key is not None and str(row[self.key_index]) == str(self._selected_key):
+                selected = item
+        if selected is not None:
+            if self.tree.selection() != (selected,):
+                self.tree.selection_set(selected)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        if total:
+            self.vsb.set(self.first / total, (self.first + len(rows)) / total)
+        else:
+            self.vsb.set(0, 1)
+
+    def scroll(self, rows):
+        self._remember_selection()
+        self.first += rows
+        self._render()
+        return "break"
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._remember_selection()
+            self.first = int(float(amount) * self.source.count())
+            self._render()
+        elif action == "scroll":
+            step = self.visible if unit == "pages" else 1
+            self.scroll(int(amount) * step)
+
+    def _on_resize(self, event):
+        visible = max(1, (event.height - self.HEADER_HEIGHT) // self.row_height)
+        if visible != self.visible:
+            self._remember_selection()
+            self.visible = visible
+            self._render()
+
+    def _move_selection(self, step):
+        selection = self.tree.selection()
+        items = self.tree.get_children()
+        if not selection or not items:
+            return None
+        position = self.tree.index(selection[0]) + step
+        if 0 <= position < len(items):
+            return None  # 可见范围内交给Treeview默认处理
+        self._selected_key = None
+        self.first += step
+        self._render()
+        edge = items[0] if step < 0 else self.tree.get_children()[-1]
+        self.tree.selection_set(edge)
+        self.tree.see(edge)
+        return "break"
+
+    def update_row(self, key, row):
+        """用新的行替换指定key的行，只刷新可见部分"""
+        self.source.replace(key, row)
+        self.render()
+        # 通知选择回调按新的行内容更新按钮状态
+        self.tree.event_generate('<<TreeviewSelect>>')
+
+    def upsert_row(self, row):
+        """存在相同key的行时替换，否则由数据源决定新行的位置"""
+        self._remember_selection()
+        self.source.upsert(row)
+        self._render()
+
+    def remove_row(self, key):
+        """删除指定key的行，后面的行上移"""
+        self._remember_selection()
+        self.source.remove(key)
+        if key == self._selected_key:
+            self._selected_key = None
+        self._render()
+
+def follow_feed(widget, table, feed, interval_ms=500):
+    """把变更源推送的增量应用到表格
+
+    feed在自己的线程中回调，增量先放入队列，再由after()在主线程中取出应用；
+    窗口关闭后自动取消订阅。
+
+    Args:
+        feed: 提供subscribe(callback(upserts, removed))的变更源
+    """
+    deltas = queue.Queue()
+    unsubscribe = feed.subscribe(lambda upserts, removed: deltas.put((upserts, removed)))
+
+    def apply_deltas():
+        if not widget.winfo_exists():
+            unsubscribe()
+            return
+        while True:
+            try:
+                upserts, removed = deltas.get_nowait()
+            except queue.Empty:
+                break
+            for row in upserts:
+                table.upsert_row(row)
+            for key in removed:
+                table.remove_row(key)
+        widget.after(interval_ms, apply_deltas)
+
+    widget.bind('<Destroy>', lambda event: unsubscribe() if event.widget is widget else None, add='+')
+    widget.after(interval_ms, apply_deltas)
+    return unsubscribe
@@ -0,0 +1,82 @@
+# idempotency.py
+
+import random
+
+from database import db
+import db_steps
+
+# 幂等键的保留小时数，过期后同一个键可以重新使用
+TTL_HOURS = 24
+# 每次登记新键时以该概率顺带清理一批过期键
+PURGE_PROBABILITY = 0.01
+PURGE_BATCH_SIZE = 500
+
+CLAIM_SQL = """
+INSERT INTO IdempotencyKeys (idempotency_key, operation, expires_at)
+VALUES (%s, %s, NOW() + INTERVAL %s HOUR)
+ON DUPLICATE KEY UPDATE
+    operation = IF(expires_at < NOW(), VALUES(operation), operation),
+    success = IF(expires_at < NOW(), NULL, success),
+    message = IF(expires_at < NOW(), NULL, message),
+    expires_at = IF(expires_at < NOW(), VALUES(expires_at), expires_at)
+"""
+
+PURGE_EXPIRED_SQL = "DELETE FROM IdempotencyKeys WHERE expires_at < NOW() ORDER BY expires_at LIMIT %s"
+
+def claim_steps(key, operation, ttl_hours=TTL_HOURS):
+    """在调用方的事务中登记幂等键，必须是事务中的第一个写操作（db_steps步骤）
+
+    只执行一条插入语句：新键直接插入，已过期的键在同一条语句中重新登记（expires_at最后赋值，
+    前面的列按旧的expires_at判断）。不先删除过期键，避免并发事务在不存在的键上持有间隙锁后
+    互相等待插入而死锁。同一个键的并发请求在插入时等待先到的事务结束：先到的事务提交后，
+    后到的请求读到它保存的结果；先到的事务回滚后，后到的请求取得该键。
+
+    已提交的键总是带有结果（complete与claim在同一事务中），success为NULL说明该键由本事务登记，
+    因此不依赖驱动对影响行数的统计方式（mysql.connector与aiomysql不同）。
+
+    Args:
+        key (str): 客户端生成的幂等键
+        operation (str): 操作名称，同一个键不能用于不同的操作
+
+    Returns:
+        tuple: 该键已有结果时返回 (success, message)，新登记的键返回None
+    """
+    yield CLAIM_SQL, (key, operation, ttl_hours), 'count'
+    rows = yield (
+        "SELECT operation, success, message FROM IdempotencyKeys WHERE idempotency_key = %s FOR UPDATE",
+        (key,), 'all'
+    )
+    row = rows[0]
+    if row['success'] is None:
+        return None
+    if row['operation'] != operation:
+        return False, "Idempotency key was already used for a different request"
+    return bool(row['success']), row['message']
+
+def claim(cursor, key, operation, ttl_hours=TTL_HOURS):
+    return db_steps.run(cursor, claim_steps(key, operation, ttl_hours))
+
+def complete_steps(key, success, message):
+    """在调用方的事务中保存幂等键对应的结果，与业务写入一起提交（db_steps步骤）"""
+    yield (
+        "UPDATE IdempotencyKeys SET success = %s, message = %s WHERE idempotency_key = %s",
+        (success, message, key), 'count'
+    )
+
+def complete(cursor, key, success, message):
+    db_steps.run(cursor, complete_steps(key, success, message))
+
+def maybe_purge_expired():
+    """按PURGE_PROBABILITY的概率删除一批过期的幂等键，在业务事务提交后调用"""
+    if random.random() < PURGE_PROBABILITY:
+        purge_expired()
+
+def purge_expired(batch_size=PURGE_BATCH_SIZE):
+    """删除一批过期的幂等键（按expires_at索引范围删除）"""
+    db.execute_query(PURGE_EXPIRED_SQL, (batch_size,))
+
+async def maybe_purge_expired_async():
+    """maybe_purge_expired的异步版本"""
+    if random.random() < PURGE_PROBABILITY:
+        from async_database import async_db
+        await async_db.execute_query(PURGE_EXPIRED_SQL, (PURGE_BATCH_SIZE,))
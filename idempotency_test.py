@@ -0,0 +1,128 @@
+# idempotency_test.py
+
+"""幂等键的并发测试，每个线程使用独立的数据库连接
+
+需要可以连接的数据库（db_config.DB_CONFIG，已执行迁移），连接失败时跳过。
+运行：python -m unittest idempotency_test
+"""
+
+import threading
+import unittest
+import uuid
+
+import mysql.connector
+
+from db_config import DB_CONFIG
+import idempotency
+
+WORKERS = 8
+
+def _connect():
+    return mysql.connector.connect(**DB_CONFIG)
+
+class ClaimTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            _connect().close()
+        except mysql.connector.Error as e:
+            raise unittest.SkipTest(f"Database is not reachable: {e}")
+
+    def setUp(self):
+        self.keys = []
+
+    def tearDown(self):
+        if not self.keys:
+            return
+        conn = _connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"DELETE FROM IdempotencyKeys WHERE idempotency_key IN ({', '.join(['%s'] * len(self.keys))})",
+                tuple(self.keys)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def new_key(self):
+        key = uuid.uuid4().hex
+        self.keys.append(key)
+        return key
+
+    def claim_and_complete(self, key, operation, message):
+        """在独立的连接上登记并保存结果，返回claim的返回值"""
+        conn = _connect()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            previous = idempotency.claim(cursor, key, operation)
+            if previous is None:
+                idempotency.complete(cursor, key, True, message)
+            conn.commit()
+            return previous
+        finally:
+            conn.close()
+
+    def run_concurrently(self, func):
+        barrier = threading.Barrier(WORKERS)
+        results = [None] * WORKERS
+        errors = []
+
+        def worker(index):
+            barrier.wait()
+            try:
+                results[index] = func(index)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_concurrent_claims_of_new_key(self):
+        key = self.new_key()
+        results = self.run_concurrently(lambda index: self.claim_and_complete(key, 'test', f"worker {index}"))
+
+        self.assertEqual(results.count(None), 1)
+        winner = results.index(None)
+        for result in results:
+            if result is not None:
+                self.assertEqual(result, (True, f"worker {winner}"))
+
+    def test_concurrent_claims_of_expired_key(self):
+        key = self.new_key()
+        self.claim_and_complete(key, 'test', "first")
+        conn = _connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE IdempotencyKeys SET expires_at = NOW() - INTERVAL 1 HOUR WHERE idempotency_key = %s",
+                (key,)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        results = self.run_concurrently(lambda index: self.claim_and_complete(key, 'test', f"worker {index}"))
+
+        self.assertEqual(results.count(None), 1)
+        winner = results.index(None)
+        self.assertNotIn((True, "first"), results)
+        for result in results:
+            if result is not None:
+                self.assertEqual(result, (True, f"worker {winner}"))
+
+    def test_key_reused_for_other_operation(self):
+        key = self.new_key()
+        self.assertIsNone(self.claim_and_complete(key, 'test', "done"))
+
+        success, _ = self.claim_and_complete(key, 'other', "done")
+
+        self.assertFalse(success)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# inventory.py
+
+from database import db
+import db_steps
+
+# 一个区间内每一站的座位数加上delta（-1售出，+1退票归还）
+SEGMENT_SEATS_SQL = """
+UPDATE RunInventory
+SET seats = seats + %s
+WHERE train_number = %s AND start_date = %s
+AND stop_order >= %s AND stop_order < %s
+"""
+
+def seat_change_steps(changes):
+    """在调用方的事务中调整座位库存（db_steps步骤）
+
+    订单状态由应用层按order_states的转换表更新，座位变化在同一事务中写入；
+    相同区间的变化先合并，每个区间只执行一次范围更新。seats的CHECK约束保证不会超卖。
+
+    Args:
+        changes (iterable): [(train_number, start_date, dep_order, arr_order, delta)]
+
+    Returns:
+        int: 执行的区间更新数
+    """
+    totals = {}
+    for train_number, start_date, dep_order, arr_order, delta in changes:
+        if delta and dep_order is not None and arr_order is not None:
+            segment = (train_number, start_date, dep_order, arr_order)
+            totals[segment] = totals.get(segment, 0) + delta
+    updates = [(delta, *segment) for segment, delta in totals.items() if delta]
+    yield SEGMENT_SEATS_SQL, updates, 'many'
+    return len(updates)
+
+def apply_seat_changes(cursor, changes):
+    return db_steps.run(cursor, seat_change_steps(changes))
+
+SEAT_COUNTS_QUERY = """
+SELECT start_date, stop_order, seats - held AS seats
+FROM RunInventory
+WHERE train_number = %s
+"""
+
+def _seat_counts_query(train_number, start_date):
+    query = SEAT_COUNTS_QUERY
+    params = [train_number]
+    if start_date:
+        query += " AND start_date = %s"
+        params.append(start_date)
+    return query, tuple(params)
+
+def _seat_counts(rows):
+    if rows is None:
+        return None
+    return {(row['start_date'], row['stop_order']): row['seats'] for row in rows}
+
+def get_seat_counts(train_number, start_date=None):
+    """读取列车各站的可售座位数（已扣除下单时保留的座位）
+
+    Args:
+        train_number (str): 列车号
+        start_date (str|date, optional): 发车日期，为空时返回所有发车日期
+
+    Returns:
+        dict: {(start_date, stop_order): seats}，查询失败时返回None
+    """
+    query, params = _seat_counts_query(train_number, start_date)
+    return _seat_counts(db.execute_query(query, params, fetch_all=True))
+
+async def get_seat_counts_async(train_number, start_date=None):
+    """get_seat_counts的异步版本"""
+    from async_database import async_db
+
+    query, params = _seat_counts_query(train_number, start_date)
+    return _seat_counts(await async_db.execute_query(query, params, fetch_all=True))
+
+def get_seat_counts_between(date_from, date_to, train_numbers=None):
+    """读取一段发车日期内各列车运行的可售座位数
+
+    Returns:
+        dict: {(train_number, start_date, stop_order): seats}，查询失败时返回None
+    """
+    query = """
+    SELECT train_number, start_date, stop_order, seats - held AS seats
+    FROM RunInventory
+    WHERE start_date BETWEEN %s AND %s
+    """
+    params = [date_from, date_to]
+    if train_numbers:
+        query += " AND train_number IN (" + ", ".join(["%s"] * len(train_numbers)) + ")"
+        params.extend(train_numbers)
+
+    rows = db.execute_query(query, tuple(params), fetch_all=True)
+    if rows is None:
+        return None
+    return {(row['train_number'], row['start_date'], row['stop_order']): row['seats'] for row in rows}
@@ -0,0 +1,224 @@
+# journey_planner.py
+
+import datetime
+from collections import defaultdict
+
+from database import db
+from cache import LRUCache
+import fares
+
+# 时刻表快照缓存，时刻表或票价修改时失效
+timetable_cache = LRUCache("timetable", maxsize=1, ttl=3600,
+                           tables=("TimetableStops", "RunInventory", "Trains", "Stations", "Prices"))
+
+OBJECTIVES = ('earliest', 'cheapest')
+
+class Trip:
+    """一趟列车运行（train_number + start_date）的停站序列"""
+    __slots__ = ('train_number', 'start_date', 'train_type', 'fare_table',
+                 'station_ids', 'arrivals', 'departures', 'stop_orders')
+
+    def __init__(self, train_number, start_date, train_type, fare_table):
+        self.train_number = train_number
+        self.start_date = start_date
+        self.train_type = train_type
+        self.fare_table = fare_table
+        self.station_ids = []
+        self.arrivals = []
+        self.departures = []
+        self.stop_orders = []
+
+    def fare(self, board, alight):
+        """从第board站到第alight站的票价（来自票价矩阵）"""
+        return self.fare_table.fare(self.station_ids[board], self.station_ids[alight])
+
+class Timetable:
+    """内存中的时刻表：所有列车运行以及 车站 -> [(trip_index, stop_index)] 索引"""
+    def __init__(self, trips, station_names):
+        self.trips = trips
+        self.station_names = station_names
+        self.station_ids = {name: sid for sid, name in station_names.items()}
+        self.stops_at = defaultdict(list)
+        # 每趟运行内 车站 -> 停站索引
+        self.stop_index = [{sid: i for i, sid in enumerate(trip.station_ids)} for trip in trips]
+        for t, trip in enumerate(trips):
+            for i, station_id in enumerate(trip.station_ids):
+                self.stops_at[station_id].append((t, i))
+        self.first_departure = min(
+            (d for trip in trips for d in trip.departures if d is not None), default=None
+        )
+
+def load_timetable():
+    """从运行图模板和开行日期构建时刻表快照（结果缓存）
+
+    同一列车的所有运行共用模板中的车站和站序列表，只有到发时刻按发车日期展开。
+    """
+    hit, timetable = timetable_cache.get('timetable')
+    if hit:
+        return timetable
+
+    template_rows = db.execute_query("""
+        SELECT ts.train_number, ts.station_id, ts.stop_order,
+               ts.arrival_offset, ts.departure_offset, t.train_type
+        FROM TimetableStops ts
+        JOIN Trains t ON t.train_number = ts.train_number
+        ORDER BY ts.train_number, ts.stop_order
+    """, fetch_all=True)
+    run_rows = db.execute_query("""
+        SELECT DISTINCT train_number, start_date
+        FROM RunInventory
+        ORDER BY train_number, start_date
+    """, fetch_all=True)
+    stations = db.execute_query("SELECT station_id, station_name FROM Stations", fetch_all=True)
+    fare_tables = fares.load_all_fare_tables()
+    if template_rows is None or run_rows is None or stations is None or fare_tables is None:
+        return None
+
+    templates = {}
+    for row in template_rows:
+        templates.setdefault(row['train_number'], []).append(row)
+
+    def at(start, offset):
+        return start + datetime.timedelta(minutes=offset) if offset is not None else None
+
+    trips = []
+    for run in run_rows:
+        train_number = run['train_number']
+        stops = templates.get(train_number)
+        fare_table = fare_tables.get(train_number)
+        if not stops or fare_table is None:
+            continue  # 没有运行图或价格信息的列车不参与规划
+        start = datetime.datetime.combine(run['start_date'], datetime.time())
+        trip = Trip(train_number, run['start_date'], stops[0]['train_type'], fare_table)
+        trip.station_ids = [stop['station_id'] for stop in stops]
+        trip.stop_orders = [stop['stop_order'] for stop in stops]
+        trip.arrivals = [at(start, stop['arrival_offset']) for stop in stops]
+        trip.departures = [at(start, stop['departure_offset']) for stop in stops]
+        trips.append(trip)
+
+    timetable = Timetable(trips, {s['station_id']: s['station_name'] for s in stations})
+    timetable_cache.set('timetable', timetable)
+    return timetable
+
+def direct_runs(timetable, origin_id, destination_id, date_from, date_to):
+    """一次遍历起点站索引，找出出发日期在[date_from, date_to]内直达终点的运行
+
+    Yields:
+        (trip, board_index, alight_index)
+    """
+    for t, i in timetable.stops_at.get(origin_id, ()):
+        trip = timetable.trips[t]
+        departure = trip.departures[i]
+        if departure is None or not (date_from <= departure.date() <= date_to):
+            continue
+        j = timetable.stop_index[t].get(destination_id)
+        if j is not None and j > i:
+            yield trip, i, j
+
+class Label:
+    """到达某站的一个非支配方案：到达时间、累计票价和已乘坐的区段"""
+    __slots__ = ('arrival', 'cost', 'legs')
+
+    def __init__(self, arrival, cost, legs):
+        self.arrival = arrival
+        self.cost = cost
+        self.legs = legs  # ((trip_index, board_index, alight_index), ...)
+
+    def dominates(self, other):
+        return self.arrival <= other.arrival and self.cost <= other.cost
+
+def _merge(bag, label):
+    """把label加入Pareto集合，被支配时返回False"""
+    for existing in bag:
+        if existing.dominates(label):
+            return False
+    bag[:] = [existing for existing in bag if not label.dominates(existing)]
+    bag.append(label)
+    return True
+
+def _dominated(bags, up_to_round, station_id, label):
+    """label是否被前up_to_round轮中该站的某个方案支配"""
+    for k in range(up_to_round + 1):
+        for existing in bags[k].get(station_id, ()):
+            if existing.dominates(label):
+                return True
+    return False
+
+def plan(timetable, origin_id, destination_id, depart_after,
+         max_transfers=2, min_connection=datetime.timedelta(minutes=15)):
+    """按轮次(RAPTOR风格)在时刻表上搜索多程方案
+
+    第k轮得到最多乘坐k趟车的 (到达时间, 票价) Pareto最优方案，
+    每轮只扫描经过上一轮被改进车站的列车运行。
+
+    Returns:
+        list: 每个换乘次数下到达终点的Pareto方案 [(transfers, Label)]
+    """
+    bags = [defaultdict(list) for _ in range(max_transfers + 2)]
+    bags[0][origin_id].append(Label(depart_after, 0.0, ()))
+    marked = {origin_id}
+
+    for k in range(1, max_transfers + 2):
+        # 找出本轮需要扫描的列车运行及最早上车站
+        board_from = {}
+        for station_id in marked:
+            for t, i in timetable.stops_at[station_id]:
+                if i < board_from.get(t, len(timetable.trips[t].station_ids)):
+                    board_from[t] = i
+
+        new_marked = set()
+        for t, first in board_from.items():
+            trip = timetable.trips[t]
+            boarded = []  # [(上车前的Label, 上车站索引)]
+            for i in range(first, len(trip.station_ids)):
+                station_id = trip.station_ids[i]
+
+                # 已上车的方案在本站下车
+                arrival = trip.arrivals[i]
+                if boarded and arrival is not None:
+                    for prev, board in boarded:
+                        fare = trip.fare(board, i)
+                        if fare is None:
+                            continue
+                        label = Label(arrival, prev.cost + fare,
+                                      prev.legs + ((t, board, i),))
+                        # 终点或本站已有更少换乘的更优方案时剪枝
+                        if _dominated(bags, k, destination_id, label) or _dominated(bags, k - 1, station_id, label):
+                            continue
+                        if _merge(bags[k][station_id], label):
+                            new_marked.add(station_id)
+
+                # 在本站上车
+                departure = trip.departures[i]
+                if departure is None:
+                    continue
+                for prev in bags[k - 1].get(station_id, ()):
+                    ready = prev.arrival + (min_connection if prev.legs else datetime.timedelta(0))
+                    if ready <= departure:
+                        boarded.append((prev, i))
+
+        marked = new_marked - {destination_id}
+        if not marked:
+            break
+
+    results = []
+    for k in range(1, max_transfers + 2):
+        for label in bags[k].get(destination_id, ()):
+            results.append((k - 1, label))
+    return results
+
+def rank(results, objective='earliest'):
+    """按目标排序并去掉重复方案"""
+    if objective == 'cheapest':
+        key = lambda item: (item[1].cost, item[1].arrival, item[0])
+    else:
+        key = lambda item: (item[1].arrival, item[1].cost, item[0])
+
+    seen = set()
+    ranked = []
+    for transfers, label in sorted(results, key=key):
+        if label.legs in seen:
+            continue
+        seen.add(label.legs)
+        ranked.append((transfers, label))
+    return ranked
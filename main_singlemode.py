@@ -1,13 +1,24 @@
-import tkinter as tk
-from tkinter import messagebox, simpledialog, Toplevel, Label, Entry, Button
-from tkinter import ttk
+import startup  # 最先导入，作为启动计时起点
+
+with startup.phase("import tkinter"):
+    import tkinter as tk
+    from tkinter import messagebox, simpledialog, Toplevel, Label, Entry, Button
+    from tkinter import ttk
 import datetime
+import threading
+import uuid
 from queue import Queue
 
-from services import TrainService, StationService, TicketService, OrderService, SalespersonService
-from database import db 
-from db_setup import setup_database
-from db_maintenance import DatabaseMaintenanceUI, restore_database
+from gui_utils import run_in_background, VirtualTable, PagedSource, follow_feed
+
+# 服务层（models、cache、mysql.connector等）在后台初始化线程中导入，主菜单不等待
+TrainService = startup.LazyImport('services', 'TrainService')
+StationService = startup.LazyImport('services', 'StationService')
+TicketService = startup.LazyImport('services', 'TicketService')
+OrderService = startup.LazyImport('services', 'OrderService')
+SalespersonService = startup.LazyImport('services', 'SalespersonService')
+db = startup.LazyImport('database', 'db')
+pending_feed = startup.LazyImport('order_feed', 'pending_feed')
 
 main_window = None  # To hold the reference to the main Tkinter window
 
@@ -117,33 +128,21 @@ def validate_date(date_str):
         return False
 
 
-def display_table(get_data_func, columns, enable_booking=False, is_order_view=False, is_staff_view=False, staff_info=None):
-    """显示数据表格窗口"""
+def display_table(get_data_func, columns, enable_booking=False, is_order_view=False, is_staff_view=False, staff_info=None, paged=False):
+    """显示数据表格窗口
+
+    paged为True时get_data_func为分页函数 get_data_func(offset, limit)，滚动时按页加载。
+    """
     data_window = create_modal_window(
         main_window,
         "Data View",
         "800x400"
     )
     
-    # 创建Treeview
-    tree = ttk.Treeview(data_window)
-    tree["columns"] = columns
-    tree["show"] = "headings"
-
-    # 配置列
-    for col in columns:
-        tree.heading(col, text=col)
-        tree.column(col, width=100)
-
-    # 添加滚动条
-    vsb = ttk.Scrollbar(data_window, orient="vertical", command=tree.yview)
-    hsb = ttk.Scrollbar(data_window, orient="horizontal", command=tree.xview)
-    tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-
-    # 放置组件
-    tree.grid(row=0, column=0, sticky="nsew")
-    vsb.grid(row=0, column=1, sticky="ns")
-    hsb.grid(row=1, column=0, sticky="ew")
+    # 虚拟表格只创建可见的行，通过tree读取选中行
+    table = VirtualTable(data_window, columns)
+    table.grid(row=0, column=0, sticky="nsew")
+    tree = table.tree
 
     # 配置网格权重
     data_window.grid_rowconfigure(0, weight=1)
@@ -191,18 +190,41 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
 
     tree.bind('<Double-1>', on_double_click)
 
-    try:
-        data, error = get_data_func()
-        
-        if error:
-            messagebox.showinfo("Information", error)
-        
-        if data:
-            for row in data:
-                tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-                
-    except Exception as e:
-        messagebox.showerror("Error", f"An error occurred: {str(e)}")
+    def load_data():
+        """在后台加载数据，加载期间窗口保持响应"""
+        if paged:
+            if is_staff_view:
+                # 待处理订单表接收推送的增量，新行按服务端的排序定位
+                table.set_source(PagedSource(
+                    get_data_func, sort_key=OrderService.pending_order_sort_key, descending=True
+                ))
+            else:
+                table.set_source(PagedSource(get_data_func))
+            return
+
+        def show_data(result):
+            data, error = result
+            if error:
+                messagebox.showinfo("Information", error)
+            table.set_rows(data or [])
+
+        run_in_background(data_window, get_data_func, show_data)
+
+    def refresh_order(order_id):
+        """操作成功后只更新表格中被操作的订单，不重新加载整个列表"""
+        if is_staff_view:
+            # 已处理的订单不再属于待处理列表
+            table.remove_row(order_id)
+            return
+
+        def show_order(result):
+            row, _ = result
+            if row:
+                table.update_row(order_id, row)
+
+        run_in_background(data_window, lambda: OrderService.get_order(order_id), show_order, message=None)
+
+    load_data()
 
     Button(data_window, text="Close", command=data_window.destroy).grid(row=3, column=0, pady=5)
 
@@ -259,17 +281,16 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
             order_id = tree.item(item)['values'][0]
             
             if show_confirmation("Confirm Cancel", "Are you sure you want to cancel this order?"):
-                success, message = OrderService.cancel_order(order_id)
-                if success:
-                    show_message("Success", message)
-                    # 刷新订单列表
-                    tree.delete(*tree.get_children())
-                    data, _ = get_data_func()
-                    if data:
-                        for row in data:
-                            tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-                else:
-                    show_error("Error", message)
+                def on_done(result):
+                    success, message = result
+                    if success:
+                        show_message("Success", message)
+                        refresh_order(order_id)
+                    else:
+                        show_error("Error", message)
+
+                run_in_background(data_window, lambda: OrderService.cancel_order(order_id), on_done,
+                                  message="Cancelling order...", cancellable=False)
 
         def request_refund():
             selected_items = tree.selection()
@@ -280,17 +301,16 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
             order_id = tree.item(item)['values'][0]
             
             if show_confirmation("Confirm Refund", "Are you sure you want to request a refund for this order?"):
-                success, message = OrderService.request_refund(order_id)
-                if success:
-                    show_message("Success", message)
-                    # 刷新订单列表
-                    tree.delete(*tree.get_children())
-                    data, _ = get_data_func()
-                    if data:
-                        for row in data:
-                            tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-                else:
-                    show_error("Error", message)
+                def on_done(result):
+                    success, message = result
+                    if success:
+                        show_message("Success", message)
+                        refresh_order(order_id)
+                    else:
+                        show_error("Error", message)
+
+                run_in_background(data_window, lambda: OrderService.request_refund(order_id), on_done,
+                                  message="Submitting refund request...", cancellable=False)
 
         tree.bind('<<TreeviewSelect>>', on_select)
         
@@ -306,6 +326,9 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
 
     # 添加乘务员操作按钮
     if is_staff_view:
+        # 实时接收待处理订单的增量变更，不再整表刷新
+        follow_feed(data_window, table, pending_feed)
+
         def on_select(event):
             selected_items = tree.selection()
             if not selected_items:
@@ -328,17 +351,16 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
             action = "approve" if approve else "reject"
             if show_confirmation("Confirm Action", 
                                f"Are you sure you want to {action} this order?"):
-                success, message = OrderService.process_order(order_id, approve, staff_info['salesperson_id'])
-                if success:
-                    show_message("Success", message)
-                    # 刷新订单列表
-                    tree.delete(*tree.get_children())
-                    data, _ = get_data_func()
-                    if data:
-                        for row in data:
-                            tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-                else:
-                    show_error("Error", message)
+                def on_done(result):
+                    success, message = result
+                    if success:
+                        show_message("Success", message)
+                        refresh_order(order_id)
+                    else:
+                        show_error("Error", message)
+
+                run_in_background(data_window, lambda: OrderService.process_order(order_id, approve, staff_info['salesperson_id']), on_done,
+                                  message="Processing order...", cancellable=False)
 
         tree.bind('<<TreeviewSelect>>', on_select)
         
@@ -364,6 +386,8 @@ def create_booking_window(train_info):
         "Book Ticket",
         "400x300"
     )
+    # 同一个订票窗口内重复提交使用同一个幂等键，不会重复下单
+    idempotency_key = uuid.uuid4().hex
     
     # 显示选中的车次信息
     Label(booking_window, text=f"Train: {train_info[0]}", font=("Arial", 12)).pack(pady=5)
@@ -397,7 +421,8 @@ def create_booking_window(train_info):
             train_info[4],  # arrival_station
             train_info[6],  # price
             name,
-            id_card
+            id_card,
+            idempotency_key=idempotency_key
         )
         
         if success:
@@ -457,6 +482,46 @@ def show_search_trains_frame():
     Button(main_window, text="Search", 
            command=search_trains).pack(pady=10)
 
+    def plan_journey():
+        dep_station = dep_station_entry.get()
+        arr_station = arr_station_entry.get()
+        departure_date = date_entry.get()
+
+        if not validate_date(departure_date):
+            show_error("Error", "Invalid date format. Please use YYYY-MM-DD format")
+            return
+
+        display_table(
+            lambda: TicketService.plan_journey(
+                dep_station, arr_station, departure_date or None
+            ),
+            ["Train No", "Start Date", "From", "Departure Time", "To", "Arrival Time", 
+             "Price", "Seats", "Type", "Option", "Transfers", "Total Price"],
+            enable_booking=True  # 每个区段可单独订票
+        )
+
+    Button(main_window, text="Plan Journey (with transfers)", 
+           command=plan_journey).pack(pady=5)
+
+    def search_flexible_dates():
+        dep_station = dep_station_entry.get()
+        arr_station = arr_station_entry.get()
+        departure_date = date_entry.get()
+
+        if not validate_date(departure_date):
+            show_error("Error", "Invalid date format. Please use YYYY-MM-DD format")
+            return
+
+        display_table(
+            lambda: TicketService.search_availability_calendar(
+                dep_station, arr_station, departure_date or None
+            ),
+            ["Date", "Trains", "Lowest Fare", "Cheapest Train", "Max Seats"]
+        )
+
+    Button(main_window, text="Flexible Dates (±3 days)", 
+           command=search_flexible_dates).pack(pady=5)
+
     Button(main_window, text="Back to Main Menu", 
            command=show_main_menu_frame).pack(pady=20)
 
@@ -611,11 +676,12 @@ def show_order_query_frame():
             return
             
         display_table(
-            lambda: OrderService.get_orders_by_passenger(name, id_card),
+            lambda offset, limit: OrderService.get_orders_by_passenger_page(name, id_card, offset, limit),
             ["order_id", "train_number", "train_type", "From", "To", 
              "Price", "customer_name", "customer_phone", "operation_type", 
              "operation_time", "status"],
-            is_order_view=True  # 标记为订单视图
+            is_order_view=True,  # 标记为订单视图
+            paged=True
         )
 
     Button(main_window, text="Query", 
@@ -688,12 +754,13 @@ def show_staff_dashboard(staff_info):
     
     def refresh_orders():
         display_table(
-            OrderService.get_pending_orders,
+            OrderService.get_pending_orders_page,
             ["Order ID", "Train No", "Type", "From", "To", 
              "Price", "Customer", "Phone", "Operation", 
              "Time", "Status"],
             is_staff_view=True,
-            staff_info=staff_info  # 传入乘务员信息
+            staff_info=staff_info,  # 传入乘务员信息
+            paged=True
         )
     
     Button(main_window, text="View Pending Orders", 
@@ -746,29 +813,64 @@ def show_staff_performance_report():
            command=report_window.destroy).pack(pady=5)
 
 # --- Main Application Logic ---
+def start_background_init():
+    """在后台检查表结构并建立数据库连接，主菜单同时显示
+
+    完成后在主线程中报告各启动阶段耗时；初始化失败时提示错误并退出。
+    """
+    result = {}
+
+    def worker():
+        with startup.phase("import services"):
+            for lazy in (TrainService, StationService, TicketService, OrderService,
+                         SalespersonService, db, pending_feed):
+                lazy.resolve()
+        from migrations import migrate  # 迁移模块只在启动检查时需要
+        with startup.phase("schema check"):
+            result['ok'] = migrate()
+        if result['ok']:
+            with startup.phase("db connect"):
+                db.connect()
+            from seat_holds import hold_sweeper
+            from outbox import outbox_processor
+            hold_sweeper.start()
+            outbox_processor.start()
+
+    thread = threading.Thread(target=worker, name="startup-init", daemon=True)
+    thread.start()
+
+    def poll():
+        if thread.is_alive():
+            main_window.after(50, poll)
+            return
+        startup.report()
+        if not result.get('ok'):
+            show_error("Database Setup Failed", "Could not set up the database. Check your MySQL connection and permissions.")
+            main_window.after(3000, main_window.destroy)
+
+    main_window.after(50, poll)
+
 def run_gui_app():
     global main_window
-    main_window = tk.Tk()
-    main_window.withdraw() # Hide initially
-    
-    main_window.title("Train Station Management System")
-    main_window.geometry("500x500")
-    
-    # Attempt to set up the database before anything else
-    print("Initializing database setup...")
-    if setup_database():
-        print("Database initialized successfully!")
-    else:
-        show_error("Database Setup Failed", "Could not set up the database. Check your MySQL connection and permissions.")
-        main_window.destroy()
-        return
-
-    # Start with the main menu
-    show_main_menu_frame()
-    
-    # Center and then show
-    center_window(main_window)
-    main_window.deiconify()
+    with startup.phase("create main window"):
+        main_window = tk.Tk()
+        main_window.withdraw() # Hide initially
+        
+        main_window.title("Train Station Management System")
+        main_window.geometry("500x500")
+
+    # Schema check and DB connect run while the menu renders
+    start_background_init()
+
+    with startup.phase("render main menu"):
+        # Start with the main menu
+        show_main_menu_frame()
+        
+        # Center and then show
+        center_window(main_window)
+        main_window.deiconify()
+        main_window.update_idletasks()
+    print(f"Main menu ready after {startup.elapsed() * 1000:.0f} ms")
     
     main_window.protocol("WM_DELETE_WINDOW", on_closing)
     main_window.mainloop()
@@ -0,0 +1,980 @@
+# migrations.py
+
+import mysql.connector
+from mysql.connector import Error
+from db_config import DB_CONFIG
+
+# [(version, name, up)]，按版本号升序应用
+MIGRATIONS = []
+
+def migration(version, name):
+    """注册一个迁移步骤
+
+    新的表结构修改都应作为新的迁移追加在文件末尾，已发布的迁移不再修改。
+    """
+    def decorator(up):
+        if any(existing[0] == version for existing in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version: {version}")
+        MIGRATIONS.append((version, name, up))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return up
+    return decorator
+
+# --- Baseline schema ---
+# 迁移1的语句按发布时的内容冻结，新建和升级的数据库因此得到相同的表结构；
+# 之后的修改只能作为新的迁移追加。SalesOrders/OrderOperations的月度分区边界
+# 在安装时按当天日期生成（db_partitions.partition_clause），不影响表结构。
+
+BASELINE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS `Stations` (
+        `station_id` INT PRIMARY KEY AUTO_INCREMENT,
+        `station_name` VARCHAR(50) UNIQUE NOT NULL,
+        `station_code` VARCHAR(10) UNIQUE NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `Trains` (
+        `train_number` VARCHAR(10) PRIMARY KEY,
+        `train_type` VARCHAR(20) NOT NULL,
+        `total_seats` INT NOT NULL CHECK (`total_seats` >= 0),
+        `departure_station_id` INT NOT NULL,
+        `arrival_station_id` INT NOT NULL,
+        FOREIGN KEY (`departure_station_id`) REFERENCES `Stations`(`station_id`),
+        FOREIGN KEY (`arrival_station_id`) REFERENCES `Stations`(`station_id`)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `TimetableStops` (
+        `train_number` VARCHAR(10) NOT NULL,
+        `stop_order` INT NOT NULL CHECK (`stop_order` > 0),
+        `station_id` INT NOT NULL,
+        `arrival_offset` INT NULL,
+        `departure_offset` INT NULL,
+        `distance` INT NULL,
+        PRIMARY KEY (`train_number`, `stop_order`),
+        FOREIGN KEY (`train_number`) REFERENCES `Trains`(`train_number`) ON DELETE CASCADE,
+        FOREIGN KEY (`station_id`) REFERENCES `Stations`(`station_id`),
+        UNIQUE (`train_number`, `station_id`)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `ServiceCalendars` (
+        `train_number` VARCHAR(10) PRIMARY KEY,
+        `valid_from` DATE NOT NULL,
+        `valid_to` DATE NOT NULL,
+        `days_of_week` TINYINT UNSIGNED NOT NULL DEFAULT 127,
+        FOREIGN KEY (`train_number`) REFERENCES `Trains`(`train_number`) ON DELETE CASCADE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `ServiceExceptions` (
+        `train_number` VARCHAR(10) NOT NULL,
+        `service_date` DATE NOT NULL,
+        `exception_type` ENUM('Added', 'Removed') NOT NULL,
+        PRIMARY KEY (`train_number`, `service_date`),
+        FOREIGN KEY (`train_number`) REFERENCES `Trains`(`train_number`) ON DELETE CASCADE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `RunInventory` (
+        `train_number` VARCHAR(10) NOT NULL,
+        `start_date` DATE NOT NULL,
+        `stop_order` INT NOT NULL,
+        `seats` INT NOT NULL CHECK (`seats` >= 0),
+        PRIMARY KEY (`train_number`, `start_date`, `stop_order`),
+        FOREIGN KEY (`train_number`, `stop_order`)
+            REFERENCES `TimetableStops`(`train_number`, `stop_order`) ON DELETE CASCADE
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `Prices` (
+        `price_id` INT PRIMARY KEY AUTO_INCREMENT,
+        `train_number` VARCHAR(10) NOT NULL,
+        `departure_station_id` INT NOT NULL,
+        `arrival_station_id` INT NOT NULL,
+        `price_per_ten_miles` DECIMAL(10, 2) NOT NULL CHECK (`price_per_ten_miles` >= 0),
+        FOREIGN KEY (`train_number`) REFERENCES `Trains`(`train_number`) ON DELETE CASCADE,
+        FOREIGN KEY (`departure_station_id`) REFERENCES `Stations`(`station_id`),
+        FOREIGN KEY (`arrival_station_id`) REFERENCES `Stations`(`station_id`),
+        UNIQUE (`train_number`, `departure_station_id`, `arrival_station_id`)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `Customers` (
+        `name` VARCHAR(50) NOT NULL,
+        `phone` VARCHAR(20) NOT NULL,
+        `id_card` VARCHAR(50) PRIMARY KEY
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `Salespersons` (
+        `salesperson_id` VARCHAR(10) PRIMARY KEY,
+        `salesperson_name` VARCHAR(50) NOT NULL,
+        `contact_number` VARCHAR(20) NOT NULL,
+        `email` VARCHAR(100) NOT NULL UNIQUE,
+        `password` VARCHAR(255) NOT NULL,
+        `role` ENUM('Manager', 'Salesperson') NOT NULL
+    );
+    """,
+    # SalesOrders和OrderOperations按operation_time分区。MySQL要求分区表的每个唯一键都包含分区列，
+    # 且分区表不支持外键，因此：
+    #   - 主键为(order_id, operation_time)，数据库不再保证order_id唯一，
+    #     由OrderIds表（迁移11）在下单时分配并保证唯一；
+    #   - 只按order_id查找时每个分区各做一次主键前缀查找，分区数受保留期限制（约28个）；
+    #   - OrderOperations不再有指向SalesOrders/Salespersons的外键，
+    #     写入操作记录时由outbox.record_operations检查订单和乘务员存在。
+    """
+    CREATE TABLE IF NOT EXISTS `SalesOrders` (
+        `order_id` VARCHAR(20) NOT NULL,
+        `train_number` VARCHAR(10) NOT NULL,
+        `train_type` VARCHAR(20) NOT NULL,
+        `start_date` DATE NOT NULL,
+        `departure_station` VARCHAR(20) NOT NULL,
+        `arrival_station` VARCHAR(20) NOT NULL,
+        `price` DECIMAL(10, 2) NOT NULL,
+        `customer_name` VARCHAR(20) NOT NULL,
+        `customer_phone` VARCHAR(20) NOT NULL,
+        `operation_type` ENUM('Booking', 'Refund') NOT NULL,
+        `operation_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        `status` ENUM('Ready', 'Success', 'Cancelled', 'RefundPending', 'Refunded') NOT NULL DEFAULT 'Ready',
+        PRIMARY KEY (`order_id`, `operation_time`)
+    )
+    {partitions};
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `OrderOperations` (
+        `operation_id` INT NOT NULL AUTO_INCREMENT,
+        `order_id` VARCHAR(20) NOT NULL,
+        `salesperson_id` VARCHAR(10) NOT NULL,
+        `operation_type` ENUM('Approve', 'Reject') NOT NULL,
+        `original_status` ENUM('Ready', 'RefundPending') NOT NULL,
+        `new_status` ENUM('Success', 'Cancelled', 'Refunded') NOT NULL,
+        `price` INT NOT NULL,
+        `operation_time` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        `remarks` VARCHAR(255),
+        PRIMARY KEY (`operation_id`, `operation_time`)
+    )
+    {partitions};
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `SalesOrdersArchive` (
+        `order_id` VARCHAR(20) PRIMARY KEY,
+        `train_number` VARCHAR(10) NOT NULL,
+        `train_type` VARCHAR(20) NOT NULL,
+        `start_date` DATE NOT NULL,
+        `departure_station` VARCHAR(20) NOT NULL,
+        `arrival_station` VARCHAR(20) NOT NULL,
+        `price` DECIMAL(10, 2) NOT NULL,
+        `customer_name` VARCHAR(20) NOT NULL,
+        `customer_phone` VARCHAR(20) NOT NULL,
+        `operation_type` ENUM('Booking', 'Refund') NOT NULL,
+        `operation_time` DATETIME NOT NULL,
+        `status` ENUM('Ready', 'Success', 'Cancelled', 'RefundPending', 'Refunded') NOT NULL,
+        `archived_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) ROW_FORMAT=COMPRESSED;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS `OrderOperationsArchive` (
+        `operation_id` INT PRIMARY KEY,
+        `order_id` VARCHAR(20) NOT NULL,
+        `salesperson_id` VARCHAR(10) NOT NULL,
+        `operation_type` ENUM('Approve', 'Reject') NOT NULL,
+        `original_status` ENUM('Ready', 'RefundPending') NOT NULL,
+        `new_status` ENUM('Success', 'Cancelled', 'Refunded') NOT NULL,
+        `price` INT NOT NULL,
+        `operation_time` DATETIME NOT NULL,
+        `remarks` VARCHAR(255)
+    ) ROW_FORMAT=COMPRESSED;
+    """
+]
+
+BASELINE_VIEWS = [
+    """
+    DROP VIEW IF EXISTS `Stopovers`
+    """,
+    """
+    CREATE VIEW `Stopovers` AS
+    SELECT
+        R.train_number,
+        TS.station_id,
+        R.start_date,
+        TIMESTAMPADD(MINUTE, TS.arrival_offset, R.start_date) AS arrival_time,
+        TIMESTAMPADD(MINUTE, TS.departure_offset, R.start_date) AS departure_time,
+        R.stop_order,
+        R.seats,
+        TS.distance
+    FROM
+        `RunInventory` R
+    JOIN
+        `TimetableStops` TS ON TS.train_number = R.train_number AND TS.stop_order = R.stop_order
+    """,
+    """
+    DROP VIEW IF EXISTS `TrainSchedulesView`
+    """,
+    """
+    CREATE VIEW `TrainSchedulesView` AS
+    SELECT
+        T.train_number,
+        DS.station_name AS departure_station,
+        AS_st.station_name AS arrival_station,
+        T.train_type,
+        SS.station_name AS stopover_station,
+        S.stop_order,
+        S.seats,
+        S.arrival_time,
+        S.departure_time
+    FROM
+        `Trains` T
+    JOIN
+        `Stations` DS ON T.departure_station_id = DS.station_id
+    JOIN
+        `Stations` AS_st ON T.arrival_station_id = AS_st.station_id
+    LEFT JOIN
+        `Stopovers` S ON T.train_number = S.train_number
+    LEFT JOIN
+        `Stations` SS ON S.station_id = SS.station_id
+    ORDER BY
+        T.train_number, S.Start_date, S.stop_order
+    """,
+    """
+    DROP VIEW IF EXISTS `PendingOrdersView`
+    """,
+    """
+    CREATE VIEW `PendingOrdersView` AS
+    SELECT 
+        order_id,
+        train_number,
+        train_type,
+        departure_station,
+        arrival_station,
+        price,
+        customer_name,
+        customer_phone,
+        operation_type,
+        operation_time,
+        status
+    FROM 
+        `SalesOrders`
+    WHERE 
+        status IN ('Ready', 'RefundPending')
+    ORDER BY 
+        operation_time DESC
+    """,
+    """
+    DROP VIEW IF EXISTS `OrderOperationsView`
+    """,
+    """
+    CREATE VIEW `OrderOperationsView` AS
+    SELECT 
+        op.operation_id,
+        op.order_id,
+        so.train_number,
+        so.customer_name,
+        sp.salesperson_name,
+        op.operation_type,
+        op.original_status,
+        op.new_status,
+        op.price,
+        op.operation_time,
+        op.remarks
+    FROM 
+        `OrderOperations` op
+    JOIN 
+        `SalesOrders` so ON op.order_id = so.order_id
+    JOIN 
+        `Salespersons` sp ON op.salesperson_id = sp.salesperson_id
+    ORDER BY 
+        op.operation_time DESC
+    """
+]
+
+BASELINE_INDEXES = [
+    "CREATE INDEX idx_trains_departure_station_id ON `Trains` (`departure_station_id`)",
+    "CREATE INDEX idx_trains_arrival_station_id ON `Trains` (`arrival_station_id`)",
+    "CREATE INDEX idx_timetable_stops_station_id ON `TimetableStops` (`station_id`)",
+    "CREATE INDEX idx_run_inventory_start_date ON `RunInventory` (`start_date`)",
+    "CREATE INDEX idx_prices_departure_station_id ON `Prices` (`departure_station_id`)",
+    "CREATE INDEX idx_prices_arrival_station_id ON `Prices` (`arrival_station_id`)",
+    "CREATE INDEX idx_customers_id_card ON `Customers` (`id_card`)",
+    "CREATE INDEX idx_salespersons_id ON `Salespersons` (`salesperson_id`)",
+    "CREATE INDEX idx_orders_train_number ON `SalesOrders` (`train_number`)",
+    "CREATE INDEX idx_orders_operation_time ON `SalesOrders` (`operation_time`)",
+    "CREATE INDEX idx_order_operations_time ON `OrderOperations` (`operation_time`)",
+    "CREATE INDEX idx_order_operations_order_id ON `OrderOperations` (`order_id`)",
+    "CREATE INDEX idx_order_operations_salesperson_id ON `OrderOperations` (`salesperson_id`)",
+    "CREATE INDEX idx_orders_customer ON `SalesOrders` (`customer_name`, `customer_phone`)",
+    "CREATE INDEX idx_orders_archive_customer ON `SalesOrdersArchive` (`customer_name`, `customer_phone`)",
+    "CREATE INDEX idx_order_operations_archive_order_id ON `OrderOperationsArchive` (`order_id`)"
+]
+
+BASELINE_TRIGGERS = [
+    """
+    DROP TRIGGER IF EXISTS after_order_success;
+    """,
+    """
+    CREATE TRIGGER after_order_success
+    AFTER UPDATE ON `SalesOrders`
+    FOR EACH ROW
+    BEGIN
+        DECLARE dep_order INT;
+        DECLARE arr_order INT;
+        
+        -- Get departure and arrival stop orders from the timetable template
+        SELECT ts2.stop_order INTO dep_order
+        FROM TimetableStops ts2 
+        JOIN Stations st2 ON st2.station_id = ts2.station_id 
+        WHERE ts2.train_number = NEW.train_number 
+        AND st2.station_name = NEW.departure_station;
+        
+        SELECT ts3.stop_order INTO arr_order
+        FROM TimetableStops ts3 
+        JOIN Stations st3 ON st3.station_id = ts3.station_id 
+        WHERE ts3.train_number = NEW.train_number 
+        AND st3.station_name = NEW.arrival_station;
+        
+        IF NEW.status = 'Success' AND OLD.status = 'Ready' THEN
+            UPDATE RunInventory r
+            SET r.seats = r.seats - 1
+            WHERE r.train_number = NEW.train_number
+            AND r.start_date = NEW.start_date
+            AND r.seats > 0
+            AND r.stop_order >= dep_order
+            AND r.stop_order < arr_order;
+        END IF;
+    END;
+    """,
+    """
+    DROP TRIGGER IF EXISTS after_order_refund;
+    """,
+    """
+    CREATE TRIGGER after_order_refund
+    AFTER UPDATE ON `SalesOrders`
+    FOR EACH ROW
+    BEGIN
+        DECLARE dep_order INT;
+        DECLARE arr_order INT;
+        
+        -- Get departure and arrival stop orders from the timetable template
+        SELECT ts2.stop_order INTO dep_order
+        FROM TimetableStops ts2 
+        JOIN Stations st2 ON st2.station_id = ts2.station_id 
+        WHERE ts2.train_number = NEW.train_number 
+        AND st2.station_name = NEW.departure_station;
+        
+        SELECT ts3.stop_order INTO arr_order
+        FROM TimetableStops ts3 
+        JOIN Stations st3 ON st3.station_id = ts3.station_id 
+        WHERE ts3.train_number = NEW.train_number 
+        AND st3.station_name = NEW.arrival_station;
+        
+        IF NEW.status = 'Refunded' AND OLD.status = 'RefundPending' THEN
+            UPDATE RunInventory r
+            SET r.seats = r.seats + 1
+            WHERE r.train_number = NEW.train_number
+            AND r.start_date = NEW.start_date
+            AND r.stop_order >= dep_order
+            AND r.stop_order < arr_order;
+        END IF;
+    END;
+    """
+]
+
+BASELINE_PROCEDURES = [
+    """
+    DROP PROCEDURE IF EXISTS sp_daily_sales_report;
+    """,
+    """
+    CREATE PROCEDURE sp_daily_sales_report(IN report_date DATE)
+    BEGIN
+        SELECT 
+            s.salesperson_id,
+            s.salesperson_name,
+            COUNT(DISTINCT o.order_id) as total_orders,
+            SUM(CASE 
+                WHEN o.operation_type = 'Booking' AND o.status = 'Success' 
+                THEN op.price 
+                ELSE 0 
+            END) as booking_revenue,
+            SUM(CASE 
+                WHEN o.operation_type = 'Refund' AND o.status = 'Refunded' 
+                THEN op.price 
+                ELSE 0 
+            END) as refund_amount
+        FROM 
+            Salespersons s
+            LEFT JOIN OrderOperations op ON s.salesperson_id = op.salesperson_id
+            LEFT JOIN SalesOrders o ON op.order_id = o.order_id
+        WHERE 
+            op.operation_time >= report_date
+            AND op.operation_time < report_date + INTERVAL 1 DAY
+            AND op.operation_type = 'Approve'
+            AND o.status IN ('Success', 'Refunded')
+        GROUP BY 
+            s.salesperson_id, s.salesperson_name
+        ORDER BY 
+            (booking_revenue + refund_amount) DESC;
+    END;
+    """,
+    """
+    DROP PROCEDURE IF EXISTS sp_daily_staff_report;
+    """,
+    """
+    CREATE PROCEDURE sp_daily_staff_report(
+        IN report_date DATE,
+        IN staff_id VARCHAR(10)
+    )
+    BEGIN
+        SELECT 
+            s.salesperson_id,
+            s.salesperson_name,
+            COUNT(DISTINCT o.order_id) as total_orders,
+            SUM(CASE 
+                WHEN o.operation_type = 'Booking' AND o.status = 'Success' 
+                THEN op.price 
+                ELSE 0 
+            END) as booking_revenue,
+            SUM(CASE 
+                WHEN o.operation_type = 'Refund' AND o.status = 'Refunded' 
+                THEN op.price 
+                ELSE 0 
+            END) as refund_amount
+        FROM 
+            Salespersons s
+            LEFT JOIN OrderOperations op ON s.salesperson_id = op.salesperson_id
+            LEFT JOIN SalesOrders o ON op.order_id = o.order_id
+        WHERE 
+            op.operation_time >= report_date
+            AND op.operation_time < report_date + INTERVAL 1 DAY
+            AND op.operation_type = 'Approve'
+            AND o.status IN ('Success', 'Refunded')
+            AND s.salesperson_id = staff_id
+        GROUP BY 
+            s.salesperson_id, s.salesperson_name;
+    END;
+    """,
+    """
+    DROP PROCEDURE IF EXISTS sp_get_train_route;
+    """,
+    """
+    CREATE PROCEDURE sp_get_train_route(
+        IN p_train_number VARCHAR(10),
+        IN p_departure_date DATE
+    )
+    BEGIN
+        DECLARE v_departure_station_id INT;
+        DECLARE v_arrival_station_id INT;
+        DECLARE v_total_seats INT;
+        
+        -- Get train's departure and arrival stations and total seats
+        SELECT departure_station_id, arrival_station_id, total_seats
+        INTO v_departure_station_id, v_arrival_station_id, v_total_seats
+        FROM Trains 
+        WHERE train_number = p_train_number;
+        
+        IF p_departure_date IS NOT NULL THEN
+            SELECT 
+                s.train_number,
+                s.start_date,
+                st.station_name,
+                st.station_code,
+                s.arrival_time,
+                s.departure_time,
+                CASE 
+                    WHEN st.station_id = v_departure_station_id THEN 'Departure'
+                    WHEN st.station_id = v_arrival_station_id THEN 'Arrival'
+                    ELSE 'Stopover'
+                END as stop_type,
+                s.stop_order,
+                (v_total_seats - s.seats) as sold_tickets
+            FROM 
+                Stopovers s
+            JOIN 
+                Stations st ON s.station_id = st.station_id
+            WHERE 
+                s.train_number = p_train_number
+                AND s.start_date = p_departure_date
+            ORDER BY 
+                s.stop_order;
+        ELSE
+            SELECT 
+                s.train_number,
+                s.start_date,
+                st.station_name,
+                st.station_code,
+                s.arrival_time,
+                s.departure_time,
+                CASE 
+                    WHEN st.station_id = v_departure_station_id THEN 'Departure'
+                    WHEN st.station_id = v_arrival_station_id THEN 'Arrival'
+                    ELSE 'Stopover'
+                END as stop_type,
+                s.stop_order,
+                (v_total_seats - s.seats) as sold_tickets
+            FROM 
+                Stopovers s
+            JOIN 
+                Stations st ON s.station_id = st.station_id
+            WHERE 
+                s.train_number = p_train_number
+            ORDER BY 
+                s.start_date, s.stop_order;
+        END IF;
+    END;
+    """
+]
+
+# --- Migrations ---
+
+@migration(1, "baseline schema")
+def baseline(cursor):
+    """初始表结构：表、视图、索引、触发器和存储过程"""
+    from db_partitions import partition_clause
+
+    partitions = partition_clause()
+    for statement in BASELINE_TABLES:
+        cursor.execute(statement.format(partitions=partitions))
+    for statement in BASELINE_VIEWS + BASELINE_INDEXES + BASELINE_TRIGGERS + BASELINE_PROCEDURES:
+        cursor.execute(statement)
+
+@migration(2, "order change feed")
+def order_change_feed(cursor):
+    """OrderChanges记录订单进入或离开待处理状态(Ready/RefundPending)的变化，供order_feed增量读取"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `OrderChanges` (
+            `change_id` BIGINT PRIMARY KEY AUTO_INCREMENT,
+            `order_id` VARCHAR(20) NOT NULL,
+            `old_status` ENUM('Ready', 'Success', 'Cancelled', 'RefundPending', 'Refunded') NULL,
+            `new_status` ENUM('Ready', 'Success', 'Cancelled', 'RefundPending', 'Refunded') NOT NULL,
+            `changed_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX `idx_order_changes_changed_at` (`changed_at`)
+        )
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS after_order_insert_change")
+    cursor.execute("""
+        CREATE TRIGGER after_order_insert_change
+        AFTER INSERT ON `SalesOrders`
+        FOR EACH ROW
+        BEGIN
+            IF NEW.status IN ('Ready', 'RefundPending') THEN
+                INSERT INTO OrderChanges (order_id, old_status, new_status)
+                VALUES (NEW.order_id, NULL, NEW.status);
+            END IF;
+        END
+    """)
+    cursor.execute("DROP TRIGGER IF EXISTS after_order_status_change")
+    cursor.execute("""
+        CREATE TRIGGER after_order_status_change
+        AFTER UPDATE ON `SalesOrders`
+        FOR EACH ROW
+        BEGIN
+            IF NEW.status <> OLD.status
+               AND (NEW.status IN ('Ready', 'RefundPending') OR OLD.status IN ('Ready', 'RefundPending')) THEN
+                INSERT INTO OrderChanges (order_id, old_status, new_status)
+                VALUES (NEW.order_id, OLD.status, NEW.status);
+            END IF;
+        END
+    """)
+
+@migration(3, "system salesperson for auto approval")
+def system_salesperson(cursor):
+    """auto_approval以该账号记录自动审批的操作；随机密码使其无法登录"""
+    import secrets
+
+    cursor.execute("""
+        INSERT IGNORE INTO `Salespersons`
+            (`salesperson_id`, `salesperson_name`, `contact_number`, `email`, `password`, `role`)
+        VALUES ('SYSTEM', 'Auto Approval', '-', 'system@localhost', %s, 'Salesperson')
+    """, (secrets.token_hex(32),))
+
+@migration(4, "seat holds")
+def seat_hold_tables(cursor):
+    """下单时保留区间座位：RunInventory.held记录各站被保留的座位，SeatHolds记录每个订单的保留及过期时间
+
+    Stopovers视图的seats改为可售座位(seats - held)，查询余票时已扣除保留。
+    """
+    cursor.execute("ALTER TABLE `RunInventory` ADD COLUMN `held` INT NOT NULL DEFAULT 0 CHECK (`held` >= 0)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `SeatHolds` (
+            `order_id` VARCHAR(20) PRIMARY KEY,
+            `train_number` VARCHAR(10) NOT NULL,
+            `start_date` DATE NOT NULL,
+            `dep_order` INT NOT NULL,
+            `arr_order` INT NOT NULL,
+            `expires_at` DATETIME NOT NULL,
+            INDEX `idx_seat_holds_expires_at` (`expires_at`)
+        )
+    """)
+    cursor.execute("""
+        CREATE OR REPLACE VIEW `Stopovers` AS
+        SELECT
+            R.train_number,
+            TS.station_id,
+            R.start_date,
+            TIMESTAMPADD(MINUTE, TS.arrival_offset, R.start_date) AS arrival_time,
+            TIMESTAMPADD(MINUTE, TS.departure_offset, R.start_date) AS departure_time,
+            R.stop_order,
+            R.seats - R.held AS seats,
+            TS.distance
+        FROM
+            `RunInventory` R
+        JOIN
+            `TimetableStops` TS ON TS.train_number = R.train_number AND TS.stop_order = R.stop_order
+    """)
+
+@migration(5, "idempotency keys")
+def idempotency_keys(cursor):
+    """客户端重试下单和退款时按幂等键返回首次请求的结果；过期的键按expires_at索引清理"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `IdempotencyKeys` (
+            `idempotency_key` VARCHAR(64) PRIMARY KEY,
+            `operation` VARCHAR(30) NOT NULL,
+            `success` BOOLEAN NULL,
+            `message` VARCHAR(255) NULL,
+            `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `expires_at` DATETIME NOT NULL,
+            INDEX `idx_idempotency_keys_expires_at` (`expires_at`)
+        )
+    """)
+
+# 迁移6时由order_states转换表生成的触发器，按当时的结果固定下来（迁移7删除）
+ORDER_STATE_INVENTORY_TRIGGER = """
+        CREATE TRIGGER after_order_status_inventory
+        AFTER UPDATE ON `SalesOrders`
+        FOR EACH ROW
+        BEGIN
+            DECLARE seat_delta INT DEFAULT 0;
+            DECLARE dep_order INT;
+            DECLARE arr_order INT;
+
+            IF NEW.status <> OLD.status THEN
+                SET seat_delta = CASE
+                    WHEN OLD.status = 'Ready' AND NEW.status = 'Success' THEN -1
+                    WHEN OLD.status = 'RefundPending' AND NEW.status = 'Refunded' THEN 1
+                    ELSE 0
+                END;
+            END IF;
+
+            IF seat_delta <> 0 THEN
+                SELECT ts.stop_order INTO dep_order
+                FROM TimetableStops ts
+                JOIN Stations st ON st.station_id = ts.station_id
+                WHERE ts.train_number = NEW.train_number
+                AND st.station_name = NEW.departure_station;
+
+                SELECT ts.stop_order INTO arr_order
+                FROM TimetableStops ts
+                JOIN Stations st ON st.station_id = ts.station_id
+                WHERE ts.train_number = NEW.train_number
+                AND st.station_name = NEW.arrival_station;
+
+                UPDATE RunInventory r
+                SET r.seats = r.seats + seat_delta
+                WHERE r.train_number = NEW.train_number
+                AND r.start_date = NEW.start_date
+                AND r.seats + seat_delta >= 0
+                AND r.stop_order >= dep_order
+                AND r.stop_order < arr_order;
+            END IF;
+        END
+"""
+
+@migration(6, "order state machine inventory trigger")
+def order_state_trigger(cursor):
+    """用order_states的转换表生成的单个触发器替换after_order_success/after_order_refund
+
+    原来的两个触发器在每次更新订单时都查找区间，新触发器只在状态变化需要调整座位时查找。
+    """
+    cursor.execute("DROP TRIGGER IF EXISTS after_order_success")
+    cursor.execute("DROP TRIGGER IF EXISTS after_order_refund")
+    cursor.execute("DROP TRIGGER IF EXISTS after_order_status_inventory")
+    cursor.execute(ORDER_STATE_INVENTORY_TRIGGER)
+
+@migration(7, "application-managed seat inventory")
+def drop_inventory_trigger(cursor):
+    """座位库存改由应用层(inventory.apply_seat_changes)在更新订单状态的同一事务中调整，删除库存触发器"""
+    cursor.execute("DROP TRIGGER IF EXISTS after_order_status_inventory")
+    cursor.execute("DROP TRIGGER IF EXISTS after_order_success")
+    cursor.execute("DROP TRIGGER IF EXISTS after_order_refund")
+
+ORDER_KEYS_BACKFILL = [
+    """
+    UPDATE `{table}` o
+    JOIN `Stations` sd ON sd.station_name = o.departure_station
+    JOIN `Stations` sa ON sa.station_name = o.arrival_station
+    SET o.departure_station_id = sd.station_id, o.arrival_station_id = sa.station_id
+    WHERE o.departure_station_id IS NULL
+    """,
+    """
+    UPDATE `{table}` o
+    JOIN `Customers` c ON c.name = o.customer_name AND c.phone = o.customer_phone
+    SET o.customer_id_card = c.id_card
+    WHERE o.customer_id_card IS NULL
+    """,
+]
+
+@migration(8, "order station and customer keys")
+def order_keys(cursor):
+    """订单增加车站ID和乘客证件号列并回填，查询和审批按整数/主键查找，原名称列保留用于显示"""
+    for table, old_index, new_index in (
+        ("SalesOrders", "idx_orders_customer", "idx_orders_customer_id"),
+        ("SalesOrdersArchive", "idx_orders_archive_customer", "idx_orders_archive_customer_id"),
+    ):
+        cursor.execute(f"""
+            ALTER TABLE `{table}`
+                ADD COLUMN `departure_station_id` INT NULL AFTER `arrival_station`,
+                ADD COLUMN `arrival_station_id` INT NULL AFTER `departure_station_id`,
+                ADD COLUMN `customer_id_card` VARCHAR(50) NULL AFTER `customer_phone`,
+                ADD INDEX `{new_index}` (`customer_id_card`),
+                DROP INDEX `{old_index}`
+        """)
+        for statement in ORDER_KEYS_BACKFILL:
+            cursor.execute(statement.format(table=table))
+            print(f"Backfilled {cursor.rowcount} rows in {table}")
+    # 乘客按姓名和电话查询订单时先解析为证件号
+    cursor.execute("CREATE INDEX idx_customers_name_phone ON `Customers` (`name`, `phone`)")
+
+@migration(9, "order outbox")
+def order_outbox(cursor):
+    """与订单状态修改在同一事务中写入的事件，由outbox.OutboxProcessor异步处理（操作记录等副作用）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `OrderOutbox` (
+            `outbox_id` BIGINT PRIMARY KEY AUTO_INCREMENT,
+            `order_id` VARCHAR(20) NOT NULL,
+            `event_type` VARCHAR(30) NOT NULL,
+            `payload` JSON NOT NULL,
+            `status` ENUM('Pending', 'Done', 'Failed') NOT NULL DEFAULT 'Pending',
+            `attempts` INT NOT NULL DEFAULT 0,
+            `last_error` VARCHAR(255) NULL,
+            `created_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `available_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            `processed_at` DATETIME NULL,
+            INDEX `idx_order_outbox_status` (`status`, `outbox_id`),
+            INDEX `idx_order_outbox_processed_at` (`processed_at`)
+        )
+    """)
+
+ORDER_EVENTS_IMPORT = """
+INSERT IGNORE INTO `OrderEvents` (order_id, sequence, event_type, from_status, to_status, data, occurred_at)
+SELECT order_id, 1, 'import', NULL, status,
+       JSON_OBJECT(
+           'order_id', order_id, 'train_number', train_number, 'train_type', train_type,
+           'start_date', start_date, 'departure_station', departure_station,
+           'arrival_station', arrival_station, 'departure_station_id', departure_station_id,
+           'arrival_station_id', arrival_station_id, 'price', price, 'customer_name', customer_name,
+           'customer_phone', customer_phone, 'customer_id_card', customer_id_card,
+           'operation_type', operation_type
+       ),
+       operation_time
+FROM `{table}`
+"""
+
+@migration(10, "order event log")
+def order_event_log(cursor):
+    """只追加的订单事件日志和按订单的状态快照，由order_events读写
+
+    已有订单（包括已归档的订单）各写入一个import事件，记录迁移时的状态；
+    之后所有状态转换与订单修改在同一事务中追加事件。日志的修改和删除由触发器拒绝。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `OrderEvents` (
+            `event_id` BIGINT PRIMARY KEY AUTO_INCREMENT,
+            `order_id` VARCHAR(20) NOT NULL,
+            `sequence` INT NOT NULL,
+            `event_type` VARCHAR(30) NOT NULL,
+            `from_status` VARCHAR(20) NULL,
+            `to_status` VARCHAR(20) NOT NULL,
+            `actor` VARCHAR(20) NULL,
+            `data` JSON NOT NULL,
+            `occurred_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY `uk_order_events_sequence` (`order_id`, `sequence`),
+            INDEX `idx_order_events_order_time` (`order_id`, `occurred_at`),
+            INDEX `idx_order_events_occurred_at` (`occurred_at`)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `OrderSnapshots` (
+            `order_id` VARCHAR(20) NOT NULL,
+            `sequence` INT NOT NULL,
+            `state` JSON NOT NULL,
+            `occurred_at` DATETIME NOT NULL,
+            PRIMARY KEY (`order_id`, `sequence`)
+        )
+    """)
+
+    for name, action in (("order_events_no_update", "UPDATE"), ("order_events_no_delete", "DELETE")):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"""
+            CREATE TRIGGER {name}
+            BEFORE {action} ON `OrderEvents`
+            FOR EACH ROW
+            SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'OrderEvents is append-only'
+        """)
+
+    for table in ("SalesOrders", "SalesOrdersArchive"):
+        cursor.execute(ORDER_EVENTS_IMPORT.format(table=table))
+        print(f"Imported {cursor.rowcount} orders from {table} into OrderEvents")
+
+@migration(11, "order id allocation")
+def order_id_allocation(cursor):
+    """分区后的SalesOrders主键包含operation_time，订单号的唯一性改由OrderIds保证
+
+    下单时先在OrderIds中登记订单号（主键冲突时重新生成），再插入订单。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `OrderIds` (
+            `order_id` VARCHAR(20) PRIMARY KEY,
+            `allocated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for table in ("SalesOrders", "SalesOrdersArchive"):
+        cursor.execute(f"""
+            INSERT IGNORE INTO `OrderIds` (order_id, allocated_at)
+            SELECT order_id, MIN(operation_time) FROM `{table}` GROUP BY order_id
+        """)
+        print(f"Registered {cursor.rowcount} order ids from {table}")
+
+@migration(12, "outbox claims and operation dedupe")
+def outbox_claims(cursor):
+    """outbox工作线程先提交认领（Processing）再执行处理函数，操作记录按outbox_id去重
+
+    bucket = CRC32(order_id) % 64，工作线程按bucket认领事件（FOR UPDATE SKIP LOCKED），
+    (status, bucket, outbox_id)索引使不同工作线程的认领互不扫描对方的行。
+    OrderOperations的唯一键必须包含分区列operation_time，操作时间取自事件写入时间，
+    同一事件的重试总是得到相同的(outbox_id, operation_time)。
+    """
+    cursor.execute("""
+        ALTER TABLE `OrderOutbox`
+            MODIFY `status` ENUM('Pending', 'Processing', 'Done', 'Failed') NOT NULL DEFAULT 'Pending',
+            ADD COLUMN `bucket` TINYINT UNSIGNED AS (CRC32(`order_id`) % 64) STORED AFTER `order_id`,
+            ADD COLUMN `claimed_at` DATETIME NULL AFTER `available_at`,
+            ADD INDEX `idx_order_outbox_claim` (`status`, `bucket`, `outbox_id`),
+            ADD INDEX `idx_order_outbox_order` (`order_id`, `outbox_id`),
+            DROP INDEX `idx_order_outbox_status`
+    """)
+    cursor.execute("""
+        ALTER TABLE `OrderOperations`
+            ADD COLUMN `outbox_id` BIGINT NULL,
+            ADD UNIQUE KEY `uk_order_operations_outbox` (`outbox_id`, `operation_time`)
+    """)
+    cursor.execute("""
+        ALTER TABLE `OrderOperationsArchive`
+            ADD COLUMN `outbox_id` BIGINT NULL,
+            ADD UNIQUE KEY `uk_order_operations_archive_outbox` (`outbox_id`)
+    """)
+    # 迁移时尚未标记Done的事件可能已经写入了操作记录，按原来的(order_id, operation_time)规则关联，
+    # 同一秒内有多条记录无法区分时跳过
+    cursor.execute("""
+        UPDATE IGNORE `OrderOperations` o
+        JOIN `OrderOutbox` b
+            ON b.order_id = o.order_id AND b.created_at = o.operation_time
+            AND b.event_type = 'OrderProcessed' AND b.status <> 'Done'
+        SET o.outbox_id = b.outbox_id
+        WHERE o.outbox_id IS NULL
+    """)
+    print(f"Linked {cursor.rowcount} operation records to pending outbox events")
+
+# --- Engine ---
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `SchemaMigrations` (
+            `version` INT PRIMARY KEY,
+            `name` VARCHAR(100) NOT NULL,
+            `applied_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def current_version(cursor):
+    """返回已应用的最高迁移版本，未迁移过的数据库返回0"""
+    ensure_migrations_table(cursor)
+    cursor.execute("SELECT COALESCE(MAX(`version`), 0) FROM `SchemaMigrations`")
+    return cursor.fetchone()[0]
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def pending_migrations(version):
+    return [item for item in MIGRATIONS if item[0] > version]
+
+def apply_migrations(cursor, conn, seed=None):
+    """应用所有未执行的迁移
+
+    MySQL的DDL会隐式提交，因此每个迁移成功后立即记录版本，
+    失败的迁移不记录，修复后重新运行即可从该版本继续。
+
+    Args:
+        seed (callable, optional): 全新数据库应用基线迁移后调用，用于导入示例数据；
+            示例数据按基线结构导入，后续迁移（数据回填、系统账号等）照常作用于这些数据
+
+    Returns:
+        tuple: (迁移前版本, 应用的迁移版本列表)
+    """
+    version = current_version(cursor)
+    applied = []
+    for number, name, up in pending_migrations(version):
+        print(f"Applying migration {number}: {name}")
+        up(cursor)
+        cursor.execute(
+            "INSERT INTO `SchemaMigrations` (`version`, `name`) VALUES (%s, %s)",
+            (number, name)
+        )
+        conn.commit()
+        applied.append(number)
+        if number == 1 and seed:
+            seed()
+    return version, applied
+
+def migrate(seed_sample_data=True):
+    """创建数据库（如不存在）并应用待执行的迁移
+
+    已是最新版本时只执行一次版本查询。
+
+    Args:
+        seed_sample_data (bool): 全新数据库是否导入示例数据
+
+    Returns:
+        bool: 成功返回True
+    """
+    conn = None
+    cursor = None
+    try:
+        try:
+            conn = mysql.connector.connect(**DB_CONFIG)
+        except Error as e:
+            if e.errno != 1049:  # 1049: Unknown database
+                raise
+            server_config = {k: v for k, v in DB_CONFIG.items() if k != 'database'}
+            server = mysql.connector.connect(**server_config)
+            server.cursor().execute(
+                f"CREATE DATABASE IF NOT EXISTS `{DB_CONFIG['database']}` DEFAULT CHARACTER SET 'utf8mb4'"
+            )
+            server.close()
+            conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor(buffered=True)
+
+        seed = None
+        if seed_sample_data:
+            def seed():
+                from db_sample_data import insert_sample_data
+                insert_sample_data()
+
+        version, applied = apply_migrations(cursor, conn, seed)
+        if applied:
+            print(f"Schema migrated from version {version} to {applied[-1]}")
+        return True
+
+    except Error as e:
+        if conn:
+            conn.rollback()
+        print(f"Error migrating database: {e}")
+        return False
+
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+if __name__ == "__main__":
+    migrate()
@@ -1,18 +1,64 @@
 # models.py
 
 from database import db
+from cache import LRUCache, invalidate_table
+
+def _copy_rows(value):
+    """缓存的结果行返回副本，调用方修改行时不影响缓存中的数据（行的值都是不可变的标量）"""
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [dict(row) for row in value]
+    return value
 
 class BaseModel:
-    """Base class for common CRUD operations."""
+    """Base class for common CRUD operations.
+
+    Subclasses holding reference data set ``_cache`` to an LRUCache; find_one/find_all
+    results are then served from it until save/delete touches the table or the TTL expires.
+    """
     _table_name = None
     _primary_key = None
+    _cache = None
 
     def __init__(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, k, v)
 
     @classmethod
-    def find_all(cls, conditions=None):
+    def _cache_key(cls, kind, conditions):
+        return (cls._table_name, kind, tuple(sorted((conditions or {}).items())))
+
+    @classmethod
+    def _cached_query(cls, kind, conditions, run):
+        if cls._cache is None:
+            return run()
+        key = cls._cache_key(kind, conditions)
+        hit, value = cls._cache.get(key)
+        if hit:
+            return _copy_rows(value)
+        value = run()
+        if value is not None:
+            cls._cache.set(key, value)
+        return _copy_rows(value)
+
+    @classmethod
+    async def _cached_query_async(cls, kind, conditions, run):
+        """_cached_query的异步版本，与同步查询共用缓存和key"""
+        if cls._cache is None:
+            return await run()
+        key = cls._cache_key(kind, conditions)
+        hit, value = cls._cache.get(key)
+        if hit:
+            return _copy_rows(value)
+        value = await run()
+        if value is not None:
+            cls._cache.set(key, value)
+        return _copy_rows(value)
+
+    @classmethod
+    def _select_query(cls, conditions):
+        """返回 (SELECT语句, 参数)，值为None的条件被忽略"""
         query = f"SELECT * FROM `{cls._table_name}`"
         params = []
         if conditions:
@@ -23,29 +69,53 @@ class BaseModel:
                     params.append(v)
             if where_clauses:
                 query += " WHERE " + " AND ".join(where_clauses)
-        return db.execute_query(query, tuple(params) if params else None, fetch_all=True)
+        return query, tuple(params) if params else None
+
+    @classmethod
+    def find_all(cls, conditions=None):
+        return cls._cached_query('all', conditions, lambda: cls._find_all(conditions))
+
+    @classmethod
+    def _find_all(cls, conditions=None):
+        query, params = cls._select_query(conditions)
+        return db.execute_query(query, params, fetch_all=True)
+
+    @classmethod
+    async def find_all_async(cls, conditions=None):
+        from async_database import async_db
+
+        query, params = cls._select_query(conditions)
+        return await cls._cached_query_async(
+            'all', conditions, lambda: async_db.execute_query(query, params, fetch_all=True)
+        )
 
     @classmethod
     def find_one(cls, conditions):
         if not conditions:
             return None
-            
-        where_clauses = []
-        params = []
-        for k, v in conditions.items():
-            if v is not None:
-                where_clauses.append(f"`{k}` = %s")
-                params.append(v)
-        
-        if not where_clauses:
+        return cls._cached_query('one', conditions, lambda: cls._find_one(conditions))
+
+    @classmethod
+    def _find_one(cls, conditions):
+        query, params = cls._select_query(conditions)
+        if not params:
             return None
-            
-        query = f"SELECT * FROM `{cls._table_name}` WHERE " + " AND ".join(where_clauses)
-        return db.execute_query(query, tuple(params), fetch_one=True)
+        return db.execute_query(query, params, fetch_one=True)
+
+    @classmethod
+    async def find_one_async(cls, conditions):
+        from async_database import async_db
+
+        query, params = cls._select_query(conditions)
+        if not params:
+            return None
+        return await cls._cached_query_async(
+            'one', conditions, lambda: async_db.execute_query(query, params, fetch_one=True)
+        )
 
     def save(self):
         # Determine if it's an insert or update
-        if hasattr(self, self._primary_key) and getattr(self, self._primary_key) is not None:
+        if self._primary_key and getattr(self, self._primary_key, None) is not None:
             # Update existing record
             updates = []
             params = []
@@ -55,7 +125,9 @@ class BaseModel:
                     params.append(v)
             query = f"UPDATE `{self._table_name}` SET {', '.join(updates)} WHERE `{self._primary_key}` = %s"
             params.append(getattr(self, self._primary_key))
-            return db.execute_query(query, tuple(params))
+            result = db.execute_query(query, tuple(params))
+            invalidate_table(self._table_name)
+            return result
         else:
             # Insert new record
             columns = []
@@ -66,7 +138,9 @@ class BaseModel:
                     values.append(v)
             placeholders = ", ".join(["%s"] * len(columns))
             query = f"INSERT INTO `{self._table_name}` ({', '.join(columns)}) VALUES ({placeholders})"
-            return db.execute_query(query, tuple(values))
+            result = db.execute_query(query, tuple(values))
+            invalidate_table(self._table_name)
+            return result
 
     @classmethod
     def delete(cls, conditions):
@@ -84,11 +158,14 @@ class BaseModel:
             return False
             
         query = f"DELETE FROM `{cls._table_name}` WHERE " + " AND ".join(where_clauses)
-        return db.execute_query(query, tuple(params))
+        result = db.execute_query(query, tuple(params))
+        invalidate_table(cls._table_name)
+        return result
 
 
 class Station(BaseModel):
     _table_name = "Stations"
+    _cache = LRUCache("Stations", maxsize=512, ttl=600, tables=("Stations",))
     _primary_key = "station_id"
 
     def __init__(self, station_id=None, station_name=None, station_code=None):
@@ -97,6 +174,7 @@ class Station(BaseModel):
 
 class Train(BaseModel):
     _table_name = "Trains"
+    _cache = LRUCache("Trains", maxsize=512, ttl=600, tables=("Trains",))
     _primary_key = "train_number"
 
     def __init__(self, train_number=None, train_type=None, total_seats=None,
@@ -107,20 +185,57 @@ class Train(BaseModel):
         )
 
 
+class TimetableStop(BaseModel):
+    _table_name = "TimetableStops"
+    _primary_key = None  # (train_number, stop_order)
+
+    def __init__(self, train_number=None, stop_order=None, station_id=None,
+                 arrival_offset=None, departure_offset=None, distance=None):
+        super().__init__(
+            train_number=train_number, stop_order=stop_order, station_id=station_id,
+            arrival_offset=arrival_offset, departure_offset=departure_offset, distance=distance
+        )
+
+
+class ServiceCalendar(BaseModel):
+    _table_name = "ServiceCalendars"
+    _primary_key = "train_number"
+
+    def __init__(self, train_number=None, valid_from=None, valid_to=None, days_of_week=None):
+        super().__init__(
+            train_number=train_number, valid_from=valid_from, valid_to=valid_to,
+            days_of_week=days_of_week
+        )
+
+
+class ServiceException(BaseModel):
+    _table_name = "ServiceExceptions"
+    _primary_key = None  # (train_number, service_date)
+
+    def __init__(self, train_number=None, service_date=None, exception_type=None):
+        super().__init__(
+            train_number=train_number, service_date=service_date, exception_type=exception_type
+        )
+
+
 class Stopover(BaseModel):
+    """Read-only view joining RunInventory with TimetableStops (one row per run and stop)."""
     _table_name = "Stopovers"
-    _primary_key = "stopover_id"
+    _primary_key = None
 
-    def __init__(self, stopover_id=None, train_number=None, station_id=None,
-                 arrival_time=None, departure_time=None, stop_order=None):
+    def __init__(self, train_number=None, station_id=None, start_date=None,
+                 arrival_time=None, departure_time=None, stop_order=None,
+                 seats=None, distance=None):
         super().__init__(
-            stopover_id=stopover_id, train_number=train_number, station_id=station_id,
-            arrival_time=arrival_time, departure_time=departure_time, stop_order=stop_order
+            train_number=train_number, station_id=station_id, start_date=start_date,
+            arrival_time=arrival_time, departure_time=departure_time, stop_order=stop_order,
+            seats=seats, distance=distance
         )
 
 
 class Price(BaseModel):
     _table_name = "Prices"
+    _cache = LRUCache("Prices", maxsize=512, ttl=600, tables=("Prices",))
     _primary_key = "price_id"
 
     def __init__(self, price_id=None, train_number=None, departure_station_id=None,
@@ -0,0 +1,105 @@
+# order_archiver.py
+
+import time
+
+import mysql.connector
+from mysql.connector import Error
+from db_config import DB_CONFIG
+
+# 完成超过该天数的订单移入归档表
+ARCHIVE_AFTER_DAYS = 90
+# 每批移动的订单数和批间暂停秒数，避免长事务和持续占用I/O
+BATCH_SIZE = 500
+PAUSE_SECONDS = 0.5
+
+ORDER_COLUMNS = (
+    "order_id, train_number, train_type, start_date, departure_station, arrival_station, "
+    "departure_station_id, arrival_station_id, "
+    "price, customer_name, customer_phone, customer_id_card, operation_type, operation_time, status"
+)
+OPERATION_COLUMNS = (
+    "operation_id, order_id, salesperson_id, operation_type, original_status, "
+    "new_status, price, operation_time, remarks, outbox_id"
+)
+
+# 已完成的订单：已取消、已退款，或已成功且列车已发车
+FINAL_ORDER_CONDITION = (
+    "status IN ('Cancelled', 'Refunded') OR (status = 'Success' AND start_date < CURDATE())"
+)
+
+COLD_ORDERS_QUERY = f"""
+SELECT order_id
+FROM SalesOrders
+WHERE operation_time < NOW() - INTERVAL %s DAY
+AND ({FINAL_ORDER_CONDITION})
+ORDER BY operation_time
+LIMIT %s
+"""
+
+def _archive_batch(cursor, order_ids):
+    """把一批订单及其操作记录复制到归档表后从热表删除（调用方负责提交）"""
+    placeholders = ", ".join(["%s"] * len(order_ids))
+    params = tuple(order_ids)
+    cursor.execute(f"""
+        INSERT IGNORE INTO SalesOrdersArchive ({ORDER_COLUMNS})
+        SELECT {ORDER_COLUMNS} FROM SalesOrders WHERE order_id IN ({placeholders})
+    """, params)
+    cursor.execute(f"""
+        INSERT IGNORE INTO OrderOperationsArchive ({OPERATION_COLUMNS})
+        SELECT {OPERATION_COLUMNS} FROM OrderOperations WHERE order_id IN ({placeholders})
+    """, params)
+    cursor.execute(f"DELETE FROM OrderOperations WHERE order_id IN ({placeholders})", params)
+    cursor.execute(f"DELETE FROM SalesOrders WHERE order_id IN ({placeholders})", params)
+
+def archive_orders(after_days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE,
+                   pause_seconds=PAUSE_SECONDS, max_batches=None):
+    """分批把已完成的旧订单移入SalesOrdersArchive/OrderOperationsArchive
+
+    每批在独立事务中完成，批之间暂停pause_seconds秒，中途失败时已提交的批次保持有效。
+
+    Args:
+        after_days (int): 订单完成多少天后归档
+        batch_size (int): 每批订单数
+        pause_seconds (float): 批间暂停秒数
+        max_batches (int, optional): 本次最多处理的批数
+
+    Returns:
+        int: 归档的订单数，连接失败时返回None
+    """
+    conn = None
+    cursor = None
+    archived = 0
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor(buffered=True)
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            cursor.execute(COLD_ORDERS_QUERY, (after_days, batch_size))
+            order_ids = [row[0] for row in cursor.fetchall()]
+            if not order_ids:
+                break
+            try:
+                _archive_batch(cursor, order_ids)
+                conn.commit()
+            except Error as e:
+                conn.rollback()
+                print(f"Error archiving order batch: {e}")
+                break
+            archived += len(order_ids)
+            batches += 1
+            if len(order_ids) < batch_size:
+                break
+            time.sleep(pause_seconds)
+        print(f"Archived {archived} orders")
+        return archived
+    except Error as e:
+        print(f"Error archiving orders: {e}")
+        return archived if conn else None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+if __name__ == "__main__":
+    archive_orders()
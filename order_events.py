@@ -0,0 +1,204 @@
+# order_events.py
+
+import datetime
+import json
+
+from database import db, read_from_replica
+import db_steps
+import outbox
+from order_states import PENDING_STATUSES
+
+# 订单进入不再等待处理的状态（Success/Cancelled/Refunded）时由outbox处理器保存快照，
+# 一直在待处理状态之间变化的订单另外每SNAPSHOT_EVERY个事件保存一次
+SNAPSHOT_EVERY = 4
+
+# 事件中保存的订单字段，create/import事件的data包含全部字段
+ORDER_FIELDS = (
+    'order_id', 'train_number', 'train_type', 'start_date',
+    'departure_station', 'arrival_station', 'departure_station_id', 'arrival_station_id',
+    'price', 'customer_name', 'customer_phone', 'customer_id_card', 'operation_type',
+)
+
+NEXT_SEQUENCE_SQL = """
+SELECT order_id, MAX(sequence) AS sequence
+FROM OrderEvents
+WHERE order_id IN ({placeholders})
+GROUP BY order_id
+"""
+
+APPEND_SQL = """
+INSERT INTO OrderEvents (order_id, sequence, event_type, from_status, to_status, actor, data)
+VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+EVENT_COLUMNS = "order_id, sequence, event_type, from_status, to_status, actor, data, occurred_at"
+
+# --- Writing ---
+
+def created_event(order, actor=None):
+    """新订单的create事件，order为包含ORDER_FIELDS的字典"""
+    data = {field: order.get(field) for field in ORDER_FIELDS}
+    return (order['order_id'], 'create', None, 'Ready', actor, data)
+
+def transition_event(order_id, transition, actor=None, remarks=None):
+    """order_states转换对应的事件，data记录除状态外一同更新的列"""
+    data = {column: value for column, value in transition.assignments.items() if column != 'status'}
+    if remarks:
+        data['remarks'] = remarks
+    return (order_id, transition.event, transition.source, transition.target, actor, data)
+
+def event_rows(events, sequences):
+    """为事件分配订单内的序号
+
+    Args:
+        events (list): [(order_id, event_type, from_status, to_status, actor, data)]
+        sequences (dict): order_id -> 已有的最大序号，分配后原地更新
+
+    Returns:
+        tuple: (APPEND_SQL的参数列表, 需要保存快照的outbox事件列表)
+    """
+    rows = []
+    snapshots = []
+    for order_id, event_type, from_status, to_status, actor, data in events:
+        sequence = (sequences.get(order_id) or 0) + 1
+        sequences[order_id] = sequence
+        rows.append((order_id, sequence, event_type, from_status, to_status, actor, outbox.encode(data or {})))
+        # 第一个事件之后才有需要跳过的重放
+        if sequence > 1 and (to_status not in PENDING_STATUSES or sequence % SNAPSHOT_EVERY == 0):
+            snapshots.append((order_id, 'SnapshotOrder', {'sequence': sequence}))
+    return rows, snapshots
+
+def append_steps(events):
+    """在调用方的事务中追加订单事件，与订单状态修改一起提交（db_steps步骤）
+
+    (order_id, sequence)唯一，同一订单的并发写入由订单行的比较并交换保证先后。
+    """
+    if not events:
+        return
+    order_ids = list(dict.fromkeys(event[0] for event in events))
+    latest = yield (
+        NEXT_SEQUENCE_SQL.format(placeholders=", ".join(["%s"] * len(order_ids))), tuple(order_ids), 'all'
+    )
+    sequences = {row['order_id']: row['sequence'] for row in latest}
+    rows, snapshots = event_rows(events, sequences)
+    yield APPEND_SQL, rows, 'many'
+    yield from outbox.enqueue_steps(snapshots)
+
+def append(cursor, events):
+    db_steps.run(cursor, append_steps(events))
+
+# --- Replay ---
+
+def _decode(event):
+    if isinstance(event['data'], (str, bytes, bytearray)):
+        event['data'] = json.loads(event['data'])
+    return event
+
+def apply(state, event):
+    """把一个事件应用到订单状态上，返回新的状态字典（不修改原状态）"""
+    data = event['data'] or {}
+    if event['event_type'] in ('create', 'import'):
+        state = {field: data.get(field) for field in ORDER_FIELDS}
+        state['created_at'] = event['occurred_at']
+    else:
+        state = dict(state or {})
+        state.update((column, value) for column, value in data.items() if column in ORDER_FIELDS)
+    state['status'] = event['to_status']
+    state['version'] = event['sequence']
+    state['updated_at'] = event['occurred_at']
+    return state
+
+def replay(events, state=None):
+    for event in events:
+        state = apply(state, event)
+    return state
+
+def _load(query, order_id, as_of=None):
+    """从最近的快照开始重放之后的事件；as_of不为空时只使用该时间之前的快照和事件"""
+    time_filter = " AND occurred_at <= %s" if as_of else ""
+    time_params = (as_of,) if as_of else ()
+
+    snapshot = query(f"""
+        SELECT sequence, state FROM OrderSnapshots
+        WHERE order_id = %s{time_filter}
+        ORDER BY sequence DESC LIMIT 1
+    """, (order_id, *time_params), True)
+    state = None
+    sequence = 0
+    if snapshot:
+        state = json.loads(snapshot['state'])
+        for key in ('created_at', 'updated_at'):
+            if state.get(key):
+                state[key] = datetime.datetime.fromisoformat(state[key])
+        sequence = snapshot['sequence']
+
+    events = query(f"""
+        SELECT {EVENT_COLUMNS} FROM OrderEvents
+        WHERE order_id = %s AND sequence > %s{time_filter}
+        ORDER BY sequence
+    """, (order_id, sequence, *time_params), False)
+    return replay([_decode(event) for event in events or []], state)
+
+def _db_query(sql, params, one):
+    return db.execute_query(sql, params, fetch_one=one, fetch_all=not one)
+
+@read_from_replica
+def load_order(order_id, as_of=None):
+    """由事件日志重建订单状态，不读取SalesOrders
+
+    Args:
+        order_id (str): 订单ID
+        as_of (datetime, optional): 返回该时刻的订单状态，为空时返回最新状态
+
+    Returns:
+        dict: 订单字段加status/version/created_at/updated_at，该时刻订单尚不存在时返回None
+    """
+    return _load(_db_query, order_id, as_of)
+
+@read_from_replica
+def history(order_id):
+    """订单的全部事件，按发生顺序排列"""
+    events = db.execute_query(
+        f"SELECT {EVENT_COLUMNS} FROM OrderEvents WHERE order_id = %s ORDER BY sequence",
+        (order_id,), fetch_all=True
+    )
+    return [_decode(event) for event in events or []]
+
+@read_from_replica
+def status_counts_as_of(as_of):
+    """某一时刻各状态的订单数，按(order_id, occurred_at)索引取每个订单在该时刻前的最后一个事件
+
+    Returns:
+        dict: {status: count}，查询失败时返回None
+    """
+    rows = db.execute_query("""
+        SELECT e.to_status AS status, COUNT(*) AS total
+        FROM OrderEvents e
+        JOIN (
+            SELECT order_id, MAX(sequence) AS sequence
+            FROM OrderEvents
+            WHERE occurred_at <= %s
+            GROUP BY order_id
+        ) latest ON latest.order_id = e.order_id AND latest.sequence = e.sequence
+        GROUP BY e.to_status
+    """, (as_of,), fetch_all=True)
+    if rows is None:
+        return None
+    return {row['status']: row['total'] for row in rows}
+
+# --- Snapshots ---
+
+def write_snapshots(cursor, order_ids):
+    """在outbox处理器的事务中为订单保存当前状态的快照"""
+    def query(sql, params, one):
+        cursor.execute(sql, params)
+        return cursor.fetchone() if one else cursor.fetchall()
+
+    for order_id in dict.fromkeys(order_ids):
+        state = _load(query, order_id)
+        if state is None:
+            continue
+        cursor.execute("""
+            INSERT IGNORE INTO OrderSnapshots (order_id, sequence, state, occurred_at)
+            VALUES (%s, %s, %s, %s)
+        """, (order_id, state['version'], outbox.encode(state), state['updated_at']))
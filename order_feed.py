@@ -0,0 +1,188 @@
+# order_feed.py
+
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import Error
+from db_config import DB_CONFIG
+from services import format_order_row
+from order_states import PENDING_STATUSES
+
+# 轮询OrderChanges的间隔（秒）和每次读取的最大变更数
+POLL_INTERVAL = 2
+BATCH_LIMIT = 500
+# 变更记录保留小时数，轮询线程定期清理
+RETAIN_HOURS = 24
+PURGE_EVERY_POLLS = 900
+# 开始订阅时重放的秒数
+REPLAY_SECONDS = 60
+# change_id在插入时分配、提交有先后，高水位以下尚未读到的id在该秒数内继续重读，
+# 超时仍未出现的视为已回滚的事务
+GAP_TIMEOUT = 30
+MAX_GAPS = 1000
+
+class PendingOrderFeed:
+    """待处理订单的增量变更源
+
+    一个后台线程按change_id高水位轮询OrderChanges，并重读高水位以下尚未提交的id（见GAP_TIMEOUT）；
+    变更只用来确定哪些订单需要刷新，推送的是这些订单在SalesOrders中的当前状态：
+    处于待处理状态的订单行(upserts)和不再待处理的订单号(removed)，因此变更晚到或重复都不影响结果。
+    同一进程内的所有看板共用这一个轮询线程。
+    """
+    def __init__(self, config=DB_CONFIG, poll_interval=POLL_INTERVAL):
+        self.config = config
+        self.poll_interval = poll_interval
+        self.high_water_mark = None
+        self._gaps = {}  # 高水位以下尚未读到的change_id -> 发现时间
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._conn = None
+        self._polls = 0
+
+    def _connection(self):
+        # 独立连接并开启autocommit，每次轮询都能读到其他会话最新提交的变更
+        if self._conn is None or not self._conn.is_connected():
+            self._conn = mysql.connector.connect(**dict(self.config, autocommit=True))
+        return self._conn
+
+    def _query(self, query, params=()):
+        cursor = self._connection().cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def subscribe(self, callback):
+        """订阅增量变更，callback(upserts, removed)在轮询线程中调用
+
+        Returns:
+            callable: 取消订阅函数，最后一个订阅者取消后轮询线程停止
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+            if self._thread is None:
+                self._start()
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+                if not self._subscribers:
+                    self._wake.set()
+        return unsubscribe
+
+    def _start(self):
+        """启动轮询线程，调用方持有self._lock"""
+        self._thread = threading.Thread(target=self._run, name="pending-order-feed", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    # 没有订阅者时退出，由下一次subscribe重新启动
+                    if not self._subscribers:
+                        break
+                try:
+                    if self.high_water_mark is None:
+                        # 从订阅前REPLAY_SECONDS秒开始，覆盖看板首次加载期间的变更；重复的增量是幂等的
+                        rows = self._query(
+                            "SELECT COALESCE(MAX(change_id), 0) AS change_id FROM OrderChanges "
+                            "WHERE changed_at < NOW() - INTERVAL %s SECOND",
+                            (REPLAY_SECONDS,)
+                        )
+                        self.high_water_mark = rows[0]['change_id']
+                    else:
+                        self.poll()
+                    self._polls += 1
+                    if self._polls % PURGE_EVERY_POLLS == 0:
+                        self.purge()
+                except Error as e:
+                    print(f"Error polling order changes: {e}")
+                    self._conn = None
+                except Exception as e:
+                    # 格式化等非数据库错误也不能让轮询线程退出，否则所有看板都停止更新
+                    print(f"Error in pending order feed: {e}")
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+        finally:
+            with self._lock:
+                if self._conn is not None and self._conn.is_connected():
+                    self._conn.close()
+                self._conn = None
+                self.high_water_mark = None
+                self._gaps = {}
+                self._thread = None
+                # 退出的同时有新的订阅，或线程意外退出时，为仍在等待的订阅者重新启动
+                if self._subscribers:
+                    self._start()
+
+    def poll(self):
+        """读取高水位之后的变更并推送给订阅者
+
+        Returns:
+            tuple: (upserts, removed)
+        """
+        now = time.monotonic()
+        self._gaps = {change_id: seen for change_id, seen in self._gaps.items() if now - seen < GAP_TIMEOUT}
+        gap_filter = ""
+        if self._gaps:
+            gap_filter = f" OR change_id IN ({', '.join(['%s'] * len(self._gaps))})"
+        changes = self._query(f"""
+            SELECT change_id, order_id
+            FROM OrderChanges
+            WHERE change_id > %s{gap_filter}
+            ORDER BY change_id
+            LIMIT %s
+        """, (self.high_water_mark, *self._gaps, BATCH_LIMIT))
+        if not changes:
+            return [], []
+
+        # 按订单的当前状态推送，变更的先后顺序不影响结果
+        order_ids = list(dict.fromkeys(change['order_id'] for change in changes))
+        placeholders = ", ".join(["%s"] * len(order_ids))
+        orders = self._query(f"""
+            SELECT * FROM SalesOrders
+            WHERE order_id IN ({placeholders}) AND status IN ({', '.join(['%s'] * len(PENDING_STATUSES))})
+            ORDER BY operation_time
+        """, (*order_ids, *PENDING_STATUSES))
+        upserts = [format_order_row(order) for order in orders]
+        pending_ids = {order['order_id'] for order in orders}
+        removed = [order_id for order_id in order_ids if order_id not in pending_ids]
+
+        # 读取和格式化都成功后才前移高水位，出错时下一次轮询重新读取这些变更
+        seen_ids = {change['change_id'] for change in changes}
+        for change_id in seen_ids:
+            self._gaps.pop(change_id, None)
+        new_mark = max(self.high_water_mark, max(seen_ids))
+        for change_id in range(max(self.high_water_mark + 1, new_mark - MAX_GAPS), new_mark):
+            if change_id not in seen_ids:
+                self._gaps[change_id] = now
+        self.high_water_mark = new_mark
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(upserts, removed)
+            except Exception as e:
+                print(f"Error delivering pending order changes: {e}")
+        return upserts, removed
+
+    def purge(self, retain_hours=RETAIN_HOURS):
+        """删除过期的变更记录"""
+        cursor = self._connection().cursor()
+        try:
+            cursor.execute(
+                "DELETE FROM OrderChanges WHERE changed_at < NOW() - INTERVAL %s HOUR",
+                (retain_hours,)
+            )
+        finally:
+            cursor.close()
+
+# 进程内共享的待处理订单变更源
+pending_feed = PendingOrderFeed()
@@ -0,0 +1,79 @@
+# order_states.py
+
+STATUSES = ('Ready', 'Success', 'Cancelled', 'RefundPending', 'Refunded')
+# 等待乘务员处理的状态
+PENDING_STATUSES = ('Ready', 'RefundPending')
+
+# 订单事件: cancel/request_refund由乘客发起，approve/reject由乘务员（或自动审批）发起
+EVENTS = ('cancel', 'request_refund', 'approve', 'reject')
+
+# 唯一的状态转换定义：(事件, 原状态, 新状态, 区间座位变化, 额外更新的列)
+# 座位变化: -1占用一个座位，+1归还一个座位；离开Ready的转换同时释放下单时的座位保留
+TRANSITION_TABLE = [
+    ('cancel',         'Ready',         'Cancelled',     0,  {}),
+    ('request_refund', 'Success',       'RefundPending', 0,  {'operation_type': 'Refund'}),
+    ('approve',        'Ready',         'Success',       -1, {}),
+    ('reject',         'Ready',         'Cancelled',     0,  {}),
+    ('approve',        'RefundPending', 'Refunded',      1,  {}),
+    ('reject',         'RefundPending', 'Success',       0,  {}),
+]
+
+# 事件在当前状态下不允许时的提示
+REJECTION_MESSAGES = {
+    'cancel': "Only orders in Ready status can be cancelled",
+    'request_refund': "Only successful orders can request refund",
+    'approve': "Order cannot be processed in current status",
+    'reject': "Order cannot be processed in current status",
+}
+
+class Transition:
+    """一条状态转换及其副作用"""
+    __slots__ = ('event', 'source', 'target', 'seat_delta', 'assignments', 'releases_hold')
+
+    def __init__(self, event, source, target, seat_delta, assignments):
+        self.event = event
+        self.source = source
+        self.target = target
+        self.seat_delta = seat_delta
+        self.assignments = dict(assignments, status=target)
+        self.releases_hold = source == 'Ready'
+
+    @property
+    def takes_seat(self):
+        return self.seat_delta < 0
+
+    def guarded_update(self, order_ids):
+        """生成比较并交换的UPDATE：只更新仍处于原状态的订单
+
+        Returns:
+            tuple: (sql, params)
+        """
+        columns = sorted(self.assignments)
+        assignments = ", ".join(f"{column} = %s" for column in columns)
+        placeholders = ", ".join(["%s"] * len(order_ids))
+        sql = f"UPDATE SalesOrders SET {assignments} WHERE status = %s AND order_id IN ({placeholders})"
+        params = (*(self.assignments[column] for column in columns), self.source, *order_ids)
+        return sql, params
+
+    def __repr__(self):
+        return f"Transition({self.event}: {self.source} -> {self.target})"
+
+def compile_transitions(table=TRANSITION_TABLE):
+    """把转换定义编译为 (事件, 原状态) -> Transition 的查找表，并检查定义的一致性"""
+    compiled = {}
+    for event, source, target, seat_delta, assignments in table:
+        if event not in EVENTS or source not in STATUSES or target not in STATUSES:
+            raise ValueError(f"Unknown event or status in transition {event}: {source} -> {target}")
+        if (event, source) in compiled:
+            raise ValueError(f"Duplicate transition for {event} from {source}")
+        compiled[(event, source)] = Transition(event, source, target, seat_delta, assignments)
+    return compiled
+
+TRANSITIONS = compile_transitions()
+
+def transition(event, status):
+    """返回事件在当前状态下的转换，不允许时返回None"""
+    return TRANSITIONS.get((event, status))
+
+def rejection_message(event):
+    return REJECTION_MESSAGES[event]
@@ -0,0 +1,403 @@
+# outbox.py
+
+import datetime
+import json
+import threading
+
+import mysql.connector
+from mysql.connector import Error
+from db_config import DB_CONFIG
+import db_steps
+
+# 后台处理的并发数、每批读取的事件数和空闲时的轮询间隔（秒）
+WORKERS = 4
+BATCH_SIZE = 100
+POLL_INTERVAL = 1
+# 处理失败的事件按次数退避重试，超过次数后标记为Failed留待人工处理
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 5
+# 已处理事件的保留天数，第一个工作线程每PURGE_EVERY_POLLS次轮询清理一次
+RETAIN_DAYS = 7
+PURGE_EVERY_POLLS = 3600
+# OrderOutbox.bucket = CRC32(order_id) % OUTBOX_BUCKETS（迁移12的生成列），工作线程数不能超过它
+OUTBOX_BUCKETS = 64
+# 认领后超过该秒数仍未完成的事件（进程退出等）由第一个工作线程放回Pending
+CLAIM_TIMEOUT_SECONDS = 300
+RECOVER_EVERY_POLLS = 60
+
+ENQUEUE_SQL = """
+INSERT INTO OrderOutbox (order_id, event_type, payload)
+VALUES (%s, %s, %s)
+"""
+
+# event_type -> handler(cursor, events)，events为同一类型的事件列表，按写入顺序排列
+HANDLERS = {}
+
+def handler(event_type):
+    """注册一个事件处理函数
+
+    处理函数在工作线程的事务中执行，与标记事件已处理一起提交；抛出异常时整组事件回滚并稍后重试，
+    因此处理函数应当是幂等的。
+    """
+    def decorator(func):
+        if event_type in HANDLERS:
+            raise ValueError(f"Duplicate outbox handler: {event_type}")
+        HANDLERS[event_type] = func
+        return func
+    return decorator
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+def encode(payload):
+    return json.dumps(payload, default=_json_default)
+
+def enqueue_steps(events):
+    """在调用方的事务中写入事件，与订单状态修改一起提交（db_steps步骤）
+
+    Args:
+        events (iterable): [(order_id, event_type, payload_dict)]
+    """
+    rows = [(order_id, event_type, encode(payload)) for order_id, event_type, payload in events]
+    yield ENQUEUE_SQL, rows, 'many'
+
+def enqueue(cursor, events):
+    db_steps.run(cursor, enqueue_steps(events))
+
+# --- Handlers ---
+
+@handler('OrderProcessed')
+def record_operations(cursor, events):
+    """乘务员审批或拒绝的操作记录写入OrderOperations，操作时间取事件写入时间
+
+    分区表不支持外键，写入前检查订单和乘务员存在，缺失时整组失败并按outbox规则重试。
+    每条记录保存outbox_id，重试时由唯一键(outbox_id, operation_time)跳过已经写入的记录。
+    """
+    _check_references(cursor, events)
+    rows = []
+    for event in events:
+        payload = event['payload']
+        rows.append((
+            event['order_id'], payload['salesperson_id'], payload['operation_type'],
+            payload['original_status'], payload['new_status'], payload['price'],
+            event['created_at'], payload['remarks'], event['outbox_id']
+        ))
+    cursor.executemany("""
+        INSERT INTO OrderOperations (
+            order_id, salesperson_id, operation_type, original_status,
+            new_status, price, operation_time, remarks, outbox_id
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE outbox_id = outbox_id
+    """, rows)
+
+@handler('SnapshotOrder')
+def snapshot_orders(cursor, events):
+    """订单进入非待处理状态或每SNAPSHOT_EVERY个事件时由order_events写入，保存订单快照，重放时从快照开始"""
+    import order_events
+    order_events.write_snapshots(cursor, [event['order_id'] for event in events])
+
+def _check_references(cursor, events):
+    order_ids = sorted({event['order_id'] for event in events})
+    salesperson_ids = sorted({event['payload']['salesperson_id'] for event in events})
+    order_placeholders = ", ".join(["%s"] * len(order_ids))
+    cursor.execute(f"""
+        SELECT order_id FROM SalesOrders WHERE order_id IN ({order_placeholders})
+        UNION
+        SELECT order_id FROM SalesOrdersArchive WHERE order_id IN ({order_placeholders})
+    """, (*order_ids, *order_ids))
+    missing = set(order_ids) - {row['order_id'] for row in cursor.fetchall()}
+    if missing:
+        raise LookupError(f"Unknown orders: {', '.join(sorted(missing))}")
+    cursor.execute(
+        f"SELECT salesperson_id FROM Salespersons WHERE salesperson_id IN ({', '.join(['%s'] * len(salesperson_ids))})",
+        tuple(salesperson_ids)
+    )
+    missing = set(salesperson_ids) - {row['salesperson_id'] for row in cursor.fetchall()}
+    if missing:
+        raise LookupError(f"Unknown salespersons: {', '.join(sorted(map(str, missing)))}")
+
+# --- Processor ---
+
+class OutboxProcessor:
+    """按订单分区的后台工作线程池
+
+    事件按bucket（CRC32(order_id)）分配给固定的工作线程，同一订单的事件总是由同一线程按写入顺序处理。
+    每批先在READ COMMITTED的短事务中认领事件（FOR UPDATE SKIP LOCKED，标记为Processing）并提交，
+    再在另一个事务中执行处理函数，因此处理函数运行期间不持有OrderOutbox上的锁，不阻塞新事件的写入。
+    只认领每个订单最早的未完成事件及其后连续的事件：某个订单的事件失败（等待重试或已标记Failed）后，
+    该订单后续的事件一直等待，直到失败的事件重试成功或被人工处理（改回Pending或标记为Done）。
+    多个进程同时运行时，同一分区中已被其他进程认领的事件会被跳过。
+    """
+    def __init__(self, workers=WORKERS, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL,
+                 config=DB_CONFIG):
+        if not 0 < workers <= OUTBOX_BUCKETS:
+            raise ValueError(f"Outbox workers must be between 1 and {OUTBOX_BUCKETS}")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.config = config
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, args=(index,), name=f"outbox-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self, partition):
+        conn = None
+        polls = 0
+        while not self._stop.is_set():
+            try:
+                if conn is None or not conn.is_connected():
+                    conn = mysql.connector.connect(**self.config)
+                if partition == 0 and polls % RECOVER_EVERY_POLLS == 0:
+                    self.recover(conn)
+                processed = self.process_batch(conn, partition)
+                polls += 1
+                if partition == 0 and polls % PURGE_EVERY_POLLS == 0:
+                    self.purge()
+            except Error as e:
+                print(f"Error processing order outbox: {e}")
+                conn = None
+                processed = 0
+            # 一批处理满时立即读取下一批
+            if processed < self.batch_size:
+                self._stop.wait(self.poll_interval)
+        if conn is not None and conn.is_connected():
+            conn.close()
+
+    def process_batch(self, conn, partition):
+        """认领并处理一个分区的一批待处理事件
+
+        Returns:
+            int: 读取的事件数
+        """
+        scanned, events = self._claim(conn, partition)
+        if events:
+            self._process_claimed(conn, events)
+        return scanned
+
+    def _buckets(self, partition):
+        return [bucket for bucket in range(OUTBOX_BUCKETS) if bucket % self.workers == partition]
+
+    def _claim(self, conn, partition):
+        """在短事务中认领一批事件并提交
+
+        Returns:
+            tuple: (读取的事件数, 认领的事件列表)
+        """
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        try:
+            conn.commit()  # 结束之前的快照
+            # READ COMMITTED下没有间隙锁，认领期间新事件的写入不需要等待
+            conn.start_transaction(isolation_level='READ COMMITTED')
+            buckets = self._buckets(partition)
+            cursor.execute(f"""
+                SELECT outbox_id, order_id, event_type, payload, created_at, attempts,
+                       available_at <= NOW() AS available
+                FROM OrderOutbox
+                WHERE status = 'Pending' AND bucket IN ({", ".join(["%s"] * len(buckets))})
+                ORDER BY outbox_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (*buckets, self.batch_size))
+            events = cursor.fetchall()
+            claimed = self._in_order(cursor, events) if events else []
+            if claimed:
+                cursor.execute(f"""
+                    UPDATE OrderOutbox SET status = 'Processing', claimed_at = NOW()
+                    WHERE outbox_id IN ({", ".join(["%s"] * len(claimed))})
+                """, tuple(event['outbox_id'] for event in claimed))
+            conn.commit()
+            return len(events), claimed
+        except Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _in_order(self, cursor, events):
+        """只保留每个订单从最早的未完成事件开始、连续且已到重试时间的事件
+
+        订单更早的事件失败、在退避中，或被其他进程认领（SKIP LOCKED跳过）时，
+        该订单本批的事件都不认领，保持Pending。
+        """
+        order_ids = sorted({event['order_id'] for event in events})
+        cursor.execute(f"""
+            SELECT order_id, outbox_id FROM OrderOutbox
+            WHERE order_id IN ({", ".join(["%s"] * len(order_ids))})
+            AND status <> 'Done' AND outbox_id <= %s
+            ORDER BY outbox_id
+        """, (*order_ids, max(event['outbox_id'] for event in events)))
+        unfinished = {}
+        for row in cursor.fetchall():
+            unfinished.setdefault(row['order_id'], []).append(row['outbox_id'])
+
+        claimed = []
+        position = {order_id: 0 for order_id in order_ids}
+        stopped = set()
+        for event in events:
+            order_id = event['order_id']
+            if order_id in stopped:
+                continue
+            expected = unfinished.get(order_id, [])
+            index = position[order_id]
+            if index >= len(expected) or expected[index] != event['outbox_id'] or not event['available']:
+                stopped.add(order_id)
+                continue
+            position[order_id] = index + 1
+            claimed.append(event)
+        return claimed
+
+    def _process_claimed(self, conn, events):
+        """执行处理函数并记录结果；认领后因同一订单之前的事件失败而未处理的事件放回Pending"""
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        try:
+            for event in events:
+                event['payload'] = json.loads(event['payload'])
+            done, failed = self._dispatch(cursor, events)
+            finished = set(done) | {outbox_id for outbox_id, _, _ in failed}
+            released = [event['outbox_id'] for event in events if event['outbox_id'] not in finished]
+            if done:
+                cursor.execute(f"""
+                    UPDATE OrderOutbox SET status = 'Done', processed_at = NOW()
+                    WHERE status = 'Processing' AND outbox_id IN ({", ".join(["%s"] * len(done))})
+                """, tuple(done))
+            for outbox_id, attempts, error in failed:
+                cursor.execute("""
+                    UPDATE OrderOutbox
+                    SET attempts = %s, last_error = %s, claimed_at = NULL,
+                        status = IF(%s >= %s, 'Failed', 'Pending'),
+                        available_at = NOW() + INTERVAL %s SECOND
+                    WHERE status = 'Processing' AND outbox_id = %s
+                """, (attempts, error[:255], attempts, MAX_ATTEMPTS,
+                      RETRY_BACKOFF_SECONDS * attempts, outbox_id))
+            if released:
+                cursor.execute(f"""
+                    UPDATE OrderOutbox SET status = 'Pending', claimed_at = NULL
+                    WHERE status = 'Processing' AND outbox_id IN ({", ".join(["%s"] * len(released))})
+                """, tuple(released))
+            conn.commit()
+        except Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def recover(self, conn, timeout=CLAIM_TIMEOUT_SECONDS):
+        """把认领超时的事件放回Pending（认领它们的进程已退出或连接中断）"""
+        cursor = conn.cursor()
+        try:
+            conn.commit()
+            cursor.execute("""
+                UPDATE OrderOutbox SET status = 'Pending', claimed_at = NULL
+                WHERE status = 'Processing' AND claimed_at < NOW() - INTERVAL %s SECOND
+            """, (timeout,))
+            conn.commit()
+            return cursor.rowcount
+        except Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _dispatch(self, cursor, events):
+        """把连续的同类型事件合并为一次处理函数调用，每组使用一个保存点
+
+        一组失败时按订单逐个重试，只有出错的订单记为失败；失败订单在本批中之后的事件不再处理。
+
+        Returns:
+            tuple: (处理成功的outbox_id列表, [(outbox_id, attempts, error)])
+        """
+        done = []
+        failed = []
+        failed_orders = set()
+        group = []
+
+        def run(batch):
+            event_type = batch[0]['event_type']
+            cursor.execute("SAVEPOINT outbox_group")
+            try:
+                func = HANDLERS.get(event_type)
+                if func is None:
+                    raise LookupError(f"No outbox handler for {event_type}")
+                func(cursor, batch)
+                cursor.execute("RELEASE SAVEPOINT outbox_group")
+                done.extend(event['outbox_id'] for event in batch)
+                return None
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT outbox_group")
+                print(f"Outbox handler {event_type} failed: {e}")
+                return e
+
+        def fail(batch, error):
+            for event in batch:
+                failed.append((event['outbox_id'], event['attempts'] + 1, str(error)))
+                failed_orders.add(event['order_id'])
+
+        def flush():
+            pending = [event for event in group if event['order_id'] not in failed_orders]
+            group.clear()
+            if not pending:
+                return
+            error = run(pending)
+            if error is None:
+                return
+            order_ids = list(dict.fromkeys(event['order_id'] for event in pending))
+            if len(order_ids) == 1:
+                fail(pending, error)
+                return
+            for order_id in order_ids:
+                batch = [event for event in pending if event['order_id'] == order_id]
+                error = run(batch)
+                if error is not None:
+                    fail(batch, error)
+
+        for event in events:
+            if group and group[0]['event_type'] != event['event_type']:
+                flush()
+            group.append(event)
+        flush()
+        # 失败订单中排在失败事件之后的事件既不在done也不在failed中，由调用方放回Pending
+        return done, failed
+
+    def purge(self, retain_days=RETAIN_DAYS):
+        """删除已处理的旧事件"""
+        conn = mysql.connector.connect(**self.config)
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                "DELETE FROM OrderOutbox WHERE status = 'Done' AND processed_at < NOW() - INTERVAL %s DAY",
+                (retain_days,)
+            )
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+            conn.close()
+
+# 进程内共享的事件处理器
+outbox_processor = OutboxProcessor()
+
+if __name__ == "__main__":
+    outbox_processor.start()
+    try:
+        while True:
+            threading.Event().wait(3600)
+    except KeyboardInterrupt:
+        outbox_processor.stop()
@@ -6,37 +6,26 @@ from queue import Queue
 
 from services import TrainService, StationService, TicketService, OrderService, SalespersonService
 from database import db 
-from db_setup import setup_database
-from db_maintenance import DatabaseMaintenanceUI, restore_database
-from gui_utils import clear_frame, create_modal_window, show_message, show_error, show_confirmation, center_window, validate_date
+from gui_utils import clear_frame, create_modal_window, show_message, show_error, show_confirmation, center_window, validate_date, run_in_background, VirtualTable, PagedSource, follow_feed
+from order_feed import pending_feed
+from outbox import outbox_processor
+from seat_holds import hold_sweeper
 
-def display_table(get_data_func, columns, enable_booking=False, is_order_view=False, is_staff_view=False, staff_info=None):
-    """显示数据表格窗口"""
+def display_table(get_data_func, columns, enable_booking=False, is_order_view=False, is_staff_view=False, staff_info=None, paged=False):
+    """显示数据表格窗口
+
+    paged为True时get_data_func为分页函数 get_data_func(offset, limit)，滚动时按页加载。
+    """
     data_window = create_modal_window(
         main_window,
         "Data View",
         "800x400"
     )
     
-    # 创建Treeview
-    tree = ttk.Treeview(data_window)
-    tree["columns"] = columns
-    tree["show"] = "headings"
-
-    # 配置列
-    for col in columns:
-        tree.heading(col, text=col)
-        tree.column(col, width=100)
-
-    # 添加滚动条
-    vsb = ttk.Scrollbar(data_window, orient="vertical", command=tree.yview)
-    hsb = ttk.Scrollbar(data_window, orient="horizontal", command=tree.xview)
-    tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-
-    # 放置组件
-    tree.grid(row=0, column=0, sticky="nsew")
-    vsb.grid(row=0, column=1, sticky="ns")
-    hsb.grid(row=1, column=0, sticky="ew")
+    # 虚拟表格只创建可见的行，通过tree读取选中行
+    table = VirtualTable(data_window, columns)
+    table.grid(row=0, column=0, sticky="nsew")
+    tree = table.tree
 
     # 配置网格权重
     data_window.grid_rowconfigure(0, weight=1)
@@ -84,23 +73,49 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
 
     tree.bind('<Double-1>', on_double_click)
 
-    try:
-        data, error = get_data_func()
-        
-        if error:
-            messagebox.showinfo("Information", error)
-        
-        if data:
-            for row in data:
-                tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-                
-    except Exception as e:
-        messagebox.showerror("Error", f"An error occurred: {str(e)}")
+    def load_data():
+        """在后台加载数据，加载期间窗口保持响应"""
+        if paged:
+            if is_staff_view:
+                # 待处理订单表接收推送的增量，新行按服务端的排序定位
+                table.set_source(PagedSource(
+                    get_data_func, sort_key=OrderService.pending_order_sort_key, descending=True
+                ))
+            else:
+                table.set_source(PagedSource(get_data_func))
+            return
+
+        def show_data(result):
+            data, error = result
+            if error:
+                messagebox.showinfo("Information", error)
+            table.set_rows(data or [])
+
+        run_in_background(data_window, get_data_func, show_data)
+
+    def refresh_order(order_id):
+        """操作成功后只更新表格中被操作的订单，不重新加载整个列表"""
+        if is_staff_view:
+            # 已处理的订单不再属于待处理列表
+            table.remove_row(order_id)
+            return
+
+        def show_order(result):
+            row, _ = result
+            if row:
+                table.update_row(order_id, row)
+
+        run_in_background(data_window, lambda: OrderService.get_order(order_id), show_order, message=None)
+
+    load_data()
 
     Button(data_window, text="Close", command=data_window.destroy).grid(row=3, column=0, pady=5)
 
     # 添加乘务员操作按钮
     if is_staff_view:
+        # 实时接收待处理订单的增量变更，不再整表刷新
+        follow_feed(data_window, table, pending_feed)
+
         def on_select(event):
             selected_items = tree.selection()
             if not selected_items:
@@ -123,17 +138,16 @@ def display_table(get_data_func, columns, enable_booking=False, is_order_view=Fa
             action = "approve" if approve else "reject"
             if show_confirmation("Confirm Action", 
                                f"Are you sure you want to {action} this order?"):
-                success, message = OrderService.process_order(order_id, approve, staff_info['salesperson_id'])
-                if success:
-                    show_message("Success", message)
-                    # 刷新订单列表
-                    tree.delete(*tree.get_children())
-                    data, _ = get_data_func()
-                    if data:
-                        for row in data:
-                            tree.insert("", "end", values=[str(item) if item is not None else "-" for item in row])
-                else:
-                    show_error("Error", message)
+                def on_done(result):
+                    success, message = result
+                    if success:
+                        show_message("Success", message)
+                        refresh_order(order_id)
+                    else:
+                        show_error("Error", message)
+
+                run_in_background(data_window, lambda: OrderService.process_order(order_id, approve, staff_info['salesperson_id']), on_done,
+                                  message="Processing order...", cancellable=False)
 
         tree.bind('<<TreeviewSelect>>', on_select)
         
@@ -335,12 +349,13 @@ def show_staff_dashboard(staff_info):
     
     def refresh_orders():
         display_table(
-            OrderService.get_pending_orders,
+            OrderService.get_pending_orders_page,
             ["Order ID", "Train No", "Type", "From", "To", 
              "Price", "Customer", "Phone", "Operation", 
              "Time", "Status"],
             is_staff_view=True,
-            staff_info=staff_info  # 传入乘务员信息
+            staff_info=staff_info,  # 传入乘务员信息
+            paged=True
         )
     
     Button(main_window, text="View Pending Orders", 
@@ -408,6 +423,11 @@ def run_gui_app():
     center_window(main_window)
     main_window.deiconify()
     
+    # 审批产生的操作记录等副作用由后台处理器写入
+    outbox_processor.start()
+    # 释放过期的座位保留（售票终端client.py不运行清理线程，由乘务员端负责）
+    hold_sweeper.start()
+    
     main_window.protocol("WM_DELETE_WINDOW", on_closing)
     main_window.mainloop()
     db.close()  # Ensure database connection is closed after mainloop exits
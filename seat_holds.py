@@ -0,0 +1,185 @@
+# seat_holds.py
+
+import threading
+
+import mysql.connector
+from mysql.connector import Error
+from db_config import DB_CONFIG
+import db_steps
+
+# 下单后座位保留的分钟数，过期后由清理线程释放
+HOLD_MINUTES = 15
+# 清理线程的间隔（秒）和每批释放的保留数
+SWEEP_INTERVAL = 30
+SWEEP_BATCH_SIZE = 500
+
+# 锁定区间内各站的库存行并读取最少空余座位
+SEGMENT_AVAILABILITY_SQL = """
+SELECT COUNT(*) AS stops, MIN(seats - held) AS available
+FROM RunInventory
+WHERE train_number = %s AND start_date = %s
+AND stop_order >= %s AND stop_order < %s
+FOR UPDATE
+"""
+
+PLACE_HOLD_SQL = """
+UPDATE RunInventory
+SET held = held + 1
+WHERE train_number = %s AND start_date = %s
+AND stop_order >= %s AND stop_order < %s
+"""
+
+INSERT_HOLD_SQL = """
+INSERT INTO SeatHolds (order_id, train_number, start_date, dep_order, arr_order, expires_at)
+VALUES (%s, %s, %s, %s, %s, NOW() + INTERVAL %s MINUTE)
+"""
+
+# 按(列车, 日期, 站序)汇总一批保留，每个库存行只更新一次
+RELEASE_HOLDS_SQL = """
+UPDATE RunInventory r
+JOIN (
+    SELECT h.train_number, h.start_date, ts.stop_order, COUNT(*) AS n
+    FROM SeatHolds h
+    JOIN TimetableStops ts ON ts.train_number = h.train_number
+        AND ts.stop_order >= h.dep_order AND ts.stop_order < h.arr_order
+    WHERE h.order_id IN ({placeholders})
+    GROUP BY h.train_number, h.start_date, ts.stop_order
+) released ON released.train_number = r.train_number
+    AND released.start_date = r.start_date
+    AND released.stop_order = r.stop_order
+SET r.held = r.held - released.n
+"""
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+def place_hold_steps(order_id, train_number, start_date, dep_order, arr_order, minutes=HOLD_MINUTES):
+    """在调用方的事务中为订单保留一个区间座位（db_steps步骤）
+
+    Returns:
+        bool: 区间内每一站都有空余座位并已保留返回True，否则不做任何修改并返回False
+    """
+    if dep_order is None or arr_order is None or dep_order >= arr_order:
+        return False
+    segment = (train_number, start_date, dep_order, arr_order)
+    rows = yield SEGMENT_AVAILABILITY_SQL, segment, 'all'
+    row = rows[0]
+    stops, available = (row['stops'], row['available']) if isinstance(row, dict) else row
+    if stops != arr_order - dep_order or not available or available <= 0:
+        return False
+    yield PLACE_HOLD_SQL, segment, 'count'
+    yield INSERT_HOLD_SQL, (order_id, train_number, start_date, dep_order, arr_order, minutes), 'count'
+    return True
+
+def place_hold(cursor, order_id, train_number, start_date, dep_order, arr_order,
+               minutes=HOLD_MINUTES):
+    return db_steps.run(
+        cursor, place_hold_steps(order_id, train_number, start_date, dep_order, arr_order, minutes)
+    )
+
+def lock_holds_steps(order_ids):
+    """锁定订单的座位保留，返回仍持有保留的订单ID集合（db_steps步骤）"""
+    if not order_ids:
+        return set()
+    rows = yield (
+        f"SELECT order_id FROM SeatHolds WHERE order_id IN ({_placeholders(order_ids)}) FOR UPDATE",
+        tuple(order_ids), 'all'
+    )
+    return {row['order_id'] if isinstance(row, dict) else row[0] for row in rows}
+
+def lock_holds(cursor, order_ids):
+    return db_steps.run(cursor, lock_holds_steps(order_ids))
+
+def release_holds_steps(order_ids):
+    """释放一批订单的座位保留（订单被批准、拒绝、取消或保留过期）（db_steps步骤）"""
+    if not order_ids:
+        return
+    placeholders = _placeholders(order_ids)
+    yield RELEASE_HOLDS_SQL.format(placeholders=placeholders), tuple(order_ids), 'count'
+    yield f"DELETE FROM SeatHolds WHERE order_id IN ({placeholders})", tuple(order_ids), 'count'
+
+def release_holds(cursor, order_ids):
+    """在调用方的事务中释放一批订单的座位保留"""
+    db_steps.run(cursor, release_holds_steps(order_ids))
+
+def sweep_expired_holds(batch_size=SWEEP_BATCH_SIZE):
+    """分批释放所有已过期的座位保留，订单保持Ready，由乘务员按实际余票处理
+
+    Returns:
+        int: 释放的保留数，连接失败时返回None
+    """
+    conn = None
+    cursor = None
+    released = 0
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor(buffered=True)
+        while True:
+            # SKIP LOCKED跳过正在被审批或取消的订单
+            cursor.execute("""
+                SELECT order_id FROM SeatHolds
+                WHERE expires_at < NOW()
+                ORDER BY expires_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,))
+            order_ids = [row[0] for row in cursor.fetchall()]
+            if not order_ids:
+                conn.commit()
+                break
+            try:
+                release_holds(cursor, order_ids)
+                conn.commit()
+            except Error as e:
+                conn.rollback()
+                print(f"Error releasing seat holds: {e}")
+                break
+            released += len(order_ids)
+            if len(order_ids) < batch_size:
+                break
+        return released
+    except Error as e:
+        print(f"Error sweeping seat holds: {e}")
+        return released if conn else None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+class HoldSweeper:
+    """后台线程每隔interval秒释放过期的座位保留"""
+    def __init__(self, interval=SWEEP_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="seat-hold-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            released = sweep_expired_holds()
+            if released:
+                print(f"Released {released} expired seat holds")
+            self._stop.wait(self.interval)
+
+# 进程内共享的清理线程，由单机版、乘务员端(salesman.py)和自动审批进程启动；
+# 多个进程同时清理时由SKIP LOCKED错开
+hold_sweeper = HoldSweeper()
+
+if __name__ == "__main__":
+    hold_sweeper.start()
+    try:
+        while True:
+            threading.Event().wait(3600)
+    except KeyboardInterrupt:
+        hold_sweeper.stop()
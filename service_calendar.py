@@ -0,0 +1,145 @@
+# service_calendar.py
+
+import datetime
+
+import mysql.connector
+from mysql.connector import Error
+from db_config import DB_CONFIG
+from cache import invalidate_table
+
+# days_of_week 位掩码: bit 0 = 周一 ... bit 6 = 周日
+EVERY_DAY = 0b1111111
+
+def days_mask(weekdays):
+    """把weekday序号(0=周一)集合转换为days_of_week位掩码"""
+    mask = 0
+    for weekday in weekdays:
+        mask |= 1 << weekday
+    return mask
+
+def operating_dates(valid_from, valid_to, days_of_week, exceptions, date_from, date_to):
+    """计算一段日期内列车的开行日期
+
+    Args:
+        valid_from / valid_to (date): 运行图有效期
+        days_of_week (int): 开行星期位掩码
+        exceptions (dict): {date: 'Added' | 'Removed'}
+        date_from / date_to (date): 计算范围（含两端）
+
+    Returns:
+        list: 开行日期，升序
+    """
+    dates = []
+    day = date_from
+    while day <= date_to:
+        exception = exceptions.get(day)
+        if exception == 'Added':
+            dates.append(day)
+        elif exception != 'Removed' and valid_from <= day <= valid_to \
+                and days_of_week & (1 << day.weekday()):
+            dates.append(day)
+        day += datetime.timedelta(days=1)
+    return dates
+
+def materialize_runs(cursor, date_from, date_to, train_number=None):
+    """按运行图为开行日期生成每站座位库存(RunInventory)
+
+    已存在的运行保持不变；范围内不再开行且尚未售票的运行会被删除。
+
+    Args:
+        cursor: 数据库游标（调用方负责提交）
+        date_from / date_to (date): 生成范围（含两端）
+        train_number (str, optional): 只处理指定列车
+
+    Returns:
+        int: 新增的运行数
+    """
+    query = """
+        SELECT c.train_number, c.valid_from, c.valid_to, c.days_of_week
+        FROM ServiceCalendars c
+    """
+    params = ()
+    if train_number:
+        query += " WHERE c.train_number = %s"
+        params = (train_number,)
+    cursor.execute(query, params)
+    calendars = cursor.fetchall()
+
+    cursor.execute(
+        "SELECT train_number, service_date, exception_type FROM ServiceExceptions "
+        "WHERE service_date BETWEEN %s AND %s",
+        (date_from, date_to)
+    )
+    exceptions = {}
+    for exc_train, service_date, exception_type in cursor.fetchall():
+        exceptions.setdefault(exc_train, {})[service_date] = exception_type
+
+    cursor.execute(
+        "SELECT DISTINCT train_number, start_date FROM RunInventory WHERE start_date BETWEEN %s AND %s",
+        (date_from, date_to)
+    )
+    existing = set(cursor.fetchall())
+
+    new_runs = []
+    stale_runs = []
+    for cal_train, valid_from, valid_to, days_of_week in calendars:
+        dates = set(operating_dates(valid_from, valid_to, days_of_week,
+                                    exceptions.get(cal_train, {}), date_from, date_to))
+        new_runs.extend((cal_train, day) for day in sorted(dates) if (cal_train, day) not in existing)
+        stale_runs.extend(run for run in existing if run[0] == cal_train and run[1] not in dates)
+
+    if new_runs:
+        cursor.executemany("""
+            INSERT IGNORE INTO RunInventory (train_number, start_date, stop_order, seats)
+            SELECT ts.train_number, %s, ts.stop_order, t.total_seats
+            FROM TimetableStops ts
+            JOIN Trains t ON t.train_number = ts.train_number
+            WHERE ts.train_number = %s
+        """, [(day, run_train) for run_train, day in new_runs])
+
+    for run_train, day in stale_runs:
+        # 只删除没有售出或保留座位的运行
+        cursor.execute("""
+            SELECT COUNT(*) FROM RunInventory r
+            JOIN Trains t ON t.train_number = r.train_number
+            WHERE r.train_number = %s AND r.start_date = %s AND (r.seats < t.total_seats OR r.held > 0)
+        """, (run_train, day))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(
+                "DELETE FROM RunInventory WHERE train_number = %s AND start_date = %s",
+                (run_train, day)
+            )
+
+    if new_runs or stale_runs:
+        invalidate_table("RunInventory")
+    return len(new_runs)
+
+def extend_service(days_ahead=60, train_number=None):
+    """为今天起days_ahead天内的开行日期生成座位库存
+
+    Returns:
+        int: 新增的运行数，失败时返回None
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(**DB_CONFIG)
+        cursor = conn.cursor(buffered=True)
+        today = datetime.date.today()
+        added = materialize_runs(cursor, today, today + datetime.timedelta(days=days_ahead), train_number)
+        conn.commit()
+        print(f"Materialized {added} new train runs")
+        return added
+    except Error as e:
+        if conn:
+            conn.rollback()
+        print(f"Error extending service calendar: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+if __name__ == "__main__":
+    extend_service()
@@ -1,9 +1,265 @@
-from database import db
+from database import db, read_from_replica
 from models import Train, Station, Price
 from mysql.connector import Error
+from cache import LRUCache, cached
+import inventory
+import journey_planner
+import fares
+import seat_holds
+import idempotency
+import order_states
+import outbox
+import order_events
+import db_steps
+import datetime
+import random
+
+# 参考数据缓存，时刻表通过BaseModel.save/delete修改时失效
+reference_cache = LRUCache("reference", maxsize=128, ttl=600, tables=("Stations", "Trains", "Prices"))
+
+def _no_error(result):
+    return result[1] is None
+
+# 订单状态用比较并交换(WHERE status = 预期状态)更新，不锁定订单行；
+# 其他终端先修改了订单时重新读取并重试的最多次数
+MAX_TRANSITION_RETRIES = 2
+ORDER_CONFLICT_MESSAGE = "Order was modified by another terminal, please refresh and try again"
+
+class OrderConflict(Exception):
+    """比较并交换失败：订单状态已被其他事务修改，当前事务回滚后重试"""
+
+# 分区后的SalesOrders不能保证order_id唯一（见migrations.BASELINE_TABLES），订单号先在OrderIds中登记
+ORDER_ID_ATTEMPTS = 5
+
+def allocate_order_id_steps():
+    """在调用方的事务中生成并登记一个订单号 (年月日时分秒+4位随机数)（db_steps步骤）
+
+    Raises:
+        Error: 连续ORDER_ID_ATTEMPTS次生成的订单号都已被使用
+    """
+    for _ in range(ORDER_ID_ATTEMPTS):
+        order_id = datetime.datetime.now().strftime('%Y%m%d%H%M%S') + str(random.randint(1000, 9999))
+        inserted = yield "INSERT IGNORE INTO OrderIds (order_id) VALUES (%s)", (order_id,), 'count'
+        if inserted == 1:
+            return order_id
+    raise Error(msg="Could not allocate a unique order id")
+
+def allocate_order_id(cursor):
+    return db_steps.run(cursor, allocate_order_id_steps())
+
+# 同步与异步服务共用的查询语句
+CUSTOMER_QUERY = """
+SELECT * FROM Customers
+WHERE name = %s AND id_card = %s
+"""
+
+INSERT_ORDER_SQL = """
+INSERT INTO SalesOrders (
+    order_id, train_number, train_type, start_date,
+    departure_station, arrival_station,
+    departure_station_id, arrival_station_id,
+    price, customer_name, customer_phone, customer_id_card,
+    operation_type, status
+) VALUES (
+    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+    'Booking', 'Ready'
+)
+"""
+
+CREDENTIALS_QUERY = """
+SELECT salesperson_id, salesperson_name, role
+FROM Salespersons
+WHERE salesperson_id = %s AND password = %s
+"""
+
+TRAINS_THROUGH_STATION_QUERY = """
+SELECT DISTINCT train_number, start_date
+FROM Stopovers
+WHERE station_id = %s
+"""
+
+# 乘客的姓名和电话解析为证件号，订单按证件号索引查找
+PASSENGER_KEYS_SUBQUERY = "SELECT id_card FROM Customers WHERE name = %s AND phone = %s"
+
+# 迁移8无法回填证件号的订单（customer_id_card为NULL）仍按姓名和电话匹配，
+# 两个条件都在证件号索引上按范围查找（NULL也是索引中的一个范围）
+PASSENGER_ORDER_CONDITION = f"""(
+    customer_id_card IN ({PASSENGER_KEYS_SUBQUERY})
+    OR (customer_id_card IS NULL AND customer_name = %s AND customer_phone = %s)
+)"""
+
+# 热表和归档表中的乘客订单，归档的旧订单对调用方透明
+PASSENGER_ORDERS_QUERY = f"""
+SELECT order_id, train_number, train_type, start_date, departure_station, arrival_station,
+       price, customer_name, customer_phone, operation_type, operation_time, status
+FROM SalesOrders
+WHERE {PASSENGER_ORDER_CONDITION}
+UNION ALL
+SELECT order_id, train_number, train_type, start_date, departure_station, arrival_station,
+       price, customer_name, customer_phone, operation_type, operation_time, status
+FROM SalesOrdersArchive
+WHERE {PASSENGER_ORDER_CONDITION}
+ORDER BY operation_time DESC, order_id DESC
+"""
+
+def passenger_orders_params(name, phone, tables=2):
+    """PASSENGER_ORDER_CONDITION的参数，每张表一组"""
+    return (name, phone, name, phone) * tables
+
+# 待处理订单分页，按下单时间倒序，同一时间按订单号排序
+PENDING_ORDERS_PAGE_QUERY = """
+SELECT *, COUNT(*) OVER () AS total
+FROM PendingOrdersView
+ORDER BY operation_time DESC, order_id DESC
+LIMIT %s OFFSET %s
+"""
+
+ROUTE_INFO_QUERY = """
+SELECT 
+    s1.stop_order as dep_stop_order,
+    s1.distance as dep_distance,
+    s2.stop_order as arr_stop_order,
+    s2.distance as arr_distance,
+    s1.departure_time,
+    s2.arrival_time,
+    MIN(s3.seats) as min_seats,
+    t.train_type
+FROM 
+    Stopovers s1
+    JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
+    JOIN Stopovers s3 ON s1.train_number = s3.train_number AND s1.start_date = s3.start_date
+    JOIN Trains t ON s1.train_number = t.train_number
+WHERE 
+    s1.train_number = %s
+    AND s1.start_date = %s
+    AND s1.station_id = %s
+    AND s2.station_id = %s
+    AND s3.stop_order >= s1.stop_order
+    AND s3.stop_order < s2.stop_order
+GROUP BY
+    s1.stop_order, s2.stop_order, s1.departure_time, s2.arrival_time, t.train_type
+HAVING
+    dep_stop_order < arr_stop_order
+"""
+
+
+# 列车静态路线缓存，key为(train_number, departure_date)，只在时刻表修改时失效
+route_cache = LRUCache("routes", maxsize=256, ttl=3600, tables=("TimetableStops", "RunInventory", "Trains", "Stations"))
+
+def get_static_route(train_number, departure_date=None):
+    """获取列车的静态站点列表（不含售票数）
+
+    Returns:
+        list: [(start_date, stop_order, 表格行)]，未找到时返回None
+    """
+    key = (train_number, departure_date or None)
+    hit, route = route_cache.get(key)
+    if hit:
+        return route
+
+    return _cache_static_route(key, db.call_proc('sp_get_train_route', (train_number, departure_date)))
+
+async def get_static_route_async(train_number, departure_date=None):
+    """get_static_route的异步版本，与同步版本共用缓存"""
+    from async_database import async_db
+
+    key = (train_number, departure_date or None)
+    hit, route = route_cache.get(key)
+    if hit:
+        return route
+
+    return _cache_static_route(key, await async_db.call_proc('sp_get_train_route', (train_number, departure_date)))
+
+def _cache_static_route(key, result):
+    if not result:
+        return None
+    route = [(stop['start_date'], stop['stop_order'], format_route_row(stop)[:-1]) for stop in result]
+    route_cache.set(key, route)
+    return route
+
+def overlay_sold_tickets(route, total_seats, seat_counts):
+    """在缓存的静态站点列表上叠加实时售票数，返回get_train_route的表格行"""
+    route_data = []
+    for start_date, stop_order, row in route:
+        seats = seat_counts.get((start_date, stop_order))
+        sold_tickets = total_seats - seats if seats is not None and total_seats is not None else '-'
+        route_data.append(row + [sold_tickets])
+    return route_data
+
+def format_route_row(stop):
+    """将sp_get_train_route的结果行转换为表格行"""
+    arrival_time = stop['arrival_time'].strftime('%Y-%m-%d %H:%M:%S') if stop['arrival_time'] else '-'
+    departure_time = stop['departure_time'].strftime('%Y-%m-%d %H:%M:%S') if stop['departure_time'] else '-'
+    return [
+        stop['train_number'],
+        stop['start_date'].strftime('%Y-%m-%d'),  # 添加发车日期
+        stop['station_name'],
+        stop['station_code'] or '-',
+        arrival_time,
+        departure_time,
+        stop['stop_type'],
+        stop['stop_order'],
+        stop['sold_tickets']
+    ]
+
+def format_ticket_row(train_number, start_date, dep_station_name, arr_station_name, route_info, price):
+    """根据区间信息和票价矩阵中的票价生成查询结果行"""
+    return [
+        train_number,
+        start_date.strftime('%Y-%m-%d'),
+        dep_station_name,
+        route_info['departure_time'].strftime('%Y-%m-%d %H:%M:%S') if route_info['departure_time'] else '-',
+        arr_station_name,
+        route_info['arrival_time'].strftime('%Y-%m-%d %H:%M:%S') if route_info['arrival_time'] else '-',
+        price,
+        route_info['min_seats'],
+        route_info['train_type']
+    ]
+
+def format_train_row(train, dep_station_name, arr_station_name):
+    return [
+        str(train.get('train_number', '')),
+        str(train.get('train_type', '')),
+        str(train.get('total_seats', '0')),
+        dep_station_name or 'Unknown',
+        arr_station_name or 'Unknown'
+    ]
+
+def format_station_row(station):
+    return [
+        str(station.get('station_id', '')),
+        str(station.get('station_name', '')),
+        str(station.get('station_code', 'N/A'))
+    ]
+
+def format_sales_report_row(row):
+    return [
+        str(row['salesperson_id']),
+        str(row['salesperson_name']),
+        str(row['total_orders']),
+        f"${float(row['booking_revenue'] or 0):.2f}",
+        f"${float(row['refund_amount'] or 0):.2f}"
+    ]
+
+def format_order_row(order):
+    """将SalesOrders结果行转换为表格行"""
+    return [
+        order['order_id'],
+        order['train_number'],
+        order['train_type'],
+        order['departure_station'],
+        order['arrival_station'],
+        f"${float(order['price']):.2f}",
+        order['customer_name'],
+        order['customer_phone'],
+        order['operation_type'],
+        order['operation_time'].strftime('%Y-%m-%d %H:%M:%S'),
+        order['status']
+    ]
 
 class TrainService:
     @staticmethod
+    @read_from_replica
     def get_train_route(train_number, departure_date=None):
         """获取列车路线信息
     
@@ -25,37 +281,25 @@ class TrainService:
                     - sold_tickets: 已售票数
         """
         try:
-            result = db.call_proc('sp_get_train_route', (train_number, departure_date))
+            route = get_static_route(train_number, departure_date)
             
-            if not result:
+            if not route:
                 error_msg = "No route information found"
                 if departure_date:
                     error_msg += f" for date {departure_date}"
                 return [], error_msg
 
-            route_data = []
-            for stop in result:
-                arrival_time = stop['arrival_time'].strftime('%Y-%m-%d %H:%M:%S') if stop['arrival_time'] else '-'
-                departure_time = stop['departure_time'].strftime('%Y-%m-%d %H:%M:%S') if stop['departure_time'] else '-'
-                
-                route_data.append([
-                    stop['train_number'],
-                    stop['start_date'].strftime('%Y-%m-%d'),  # 添加发车日期
-                    stop['station_name'],
-                    stop['station_code'] or '-',
-                    arrival_time,
-                    departure_time,
-                    stop['stop_type'],
-                    stop['stop_order'],
-                    stop['sold_tickets']
-                ])
-
-            return route_data, None
+            train = Train.find_one({'train_number': train_number})
+            seat_counts = inventory.get_seat_counts(train_number, departure_date) or {}
+            total_seats = train['total_seats'] if train else None
+            return overlay_sold_tickets(route, total_seats, seat_counts), None
             
         except Exception as e:
             return [], f"Error getting train route: {str(e)}"
 
     @staticmethod
+    @cached(reference_cache, condition=_no_error)
+    @read_from_replica
     def list_all_trains():
         trains = Train.find_all()
         train_data = []
@@ -66,17 +310,17 @@ class TrainService:
         for t in trains:
             dep_station = Station.find_one({'station_id': t.get('departure_station_id')})
             arr_station = Station.find_one({'station_id': t.get('arrival_station_id')})
-            train_data.append([
-                str(t.get('train_number', '')),
-                str(t.get('train_type', '')),
-                str(t.get('total_seats', '0')),
-                dep_station.get('station_name', 'Unknown') if dep_station else 'Unknown',
-                arr_station.get('station_name', 'Unknown') if arr_station else 'Unknown'
-            ])
+            train_data.append(format_train_row(
+                t,
+                dep_station.get('station_name') if dep_station else None,
+                arr_station.get('station_name') if arr_station else None
+            ))
         return train_data, None
 
 class StationService:
     @staticmethod
+    @cached(reference_cache, condition=_no_error)
+    @read_from_replica
     def list_all_stations():
         stations = Station.find_all()
         station_data = []
@@ -85,15 +329,12 @@ class StationService:
             return station_data, "No stations found."
 
         for s in stations:
-            station_data.append([
-                str(s.get('station_id', '')),
-                str(s.get('station_name', '')),
-                str(s.get('station_code', 'N/A'))
-            ])
+            station_data.append(format_station_row(s))
         return station_data, None
 
 class TicketService:
     @staticmethod
+    @read_from_replica
     def search_available_tickets(dep_station_name, arr_station_name, departure_date=None):
         """
         查询所有经过指定起点和终点站点的列车信息，按列车和发车日期分组
@@ -120,11 +361,7 @@ class TicketService:
             params.append(departure_date)
         
         # Step 3: 查询所有经过起点站的列车和发车日期
-        trains_through_dep_query = """
-        SELECT DISTINCT train_number, start_date
-        FROM Stopovers
-        WHERE station_id = %s
-        """ + date_filter
+        trains_through_dep_query = TRAINS_THROUGH_STATION_QUERY + date_filter
         
         params.insert(0, dep_station.get('station_id'))
         trains_through_dep = db.execute_query(trains_through_dep_query, tuple(params), fetch_all=True)
@@ -140,36 +377,8 @@ class TicketService:
             start_date = train_info['start_date']
             
             # Step 4.1: 获取两个站点的停靠信息
-            route_query = """
-            SELECT 
-                s1.stop_order as dep_stop_order,
-                s1.distance as dep_distance,
-                s2.stop_order as arr_stop_order,
-                s2.distance as arr_distance,
-                s1.departure_time,
-                s2.arrival_time,
-                MIN(s3.seats) as min_seats,
-                t.train_type
-            FROM 
-                Stopovers s1
-                JOIN Stopovers s2 ON s1.train_number = s2.train_number AND s1.start_date = s2.start_date
-                JOIN Stopovers s3 ON s1.train_number = s3.train_number AND s1.start_date = s3.start_date
-                JOIN Trains t ON s1.train_number = t.train_number
-            WHERE 
-                s1.train_number = %s
-                AND s1.start_date = %s
-                AND s1.station_id = %s
-                AND s2.station_id = %s
-                AND s3.stop_order >= s1.stop_order
-                AND s3.stop_order < s2.stop_order
-            GROUP BY
-                s1.stop_order, s2.stop_order, s1.departure_time, s2.arrival_time, t.train_type
-            HAVING
-                dep_stop_order < arr_stop_order
-            """
-            
             route_info = db.execute_query(
-                route_query,
+                ROUTE_INFO_QUERY,
                 (train_number, start_date, dep_station.get('station_id'), arr_station.get('station_id')),
                 fetch_one=True
             )
@@ -178,38 +387,16 @@ class TicketService:
             if not route_info:
                 continue
             
-            base_price_query = """
-            SELECT price_per_ten_miles as price
-            FROM Prices
-            WHERE train_number = %s
-            LIMIT 1
-            """
-            
-            base_price_result = db.execute_query(
-                base_price_query,
-                (train_number,),
-                fetch_one=True
-            )
+            price = fares.get_fare(train_number, dep_station.get('station_id'), arr_station.get('station_id'))
             
-            if not base_price_result:
+            if price is None:
                 continue  # 没有价格信息，跳过
             
-            price = float(base_price_result['price']) * (route_info['arr_distance'] - route_info['dep_distance']) / 10
-            # 四舍五入到一位小数
-            price = round(price, 1)
-            
             # Step 5: 添加到结果列表
-            train_info = [
-                train_number,
-                start_date.strftime('%Y-%m-%d'),
-                dep_station_name,
-                route_info['departure_time'].strftime('%Y-%m-%d %H:%M:%S') if route_info['departure_time'] else '-',
-                arr_station_name,
-                route_info['arrival_time'].strftime('%Y-%m-%d %H:%M:%S') if route_info['arrival_time'] else '-',
-                price,
-                route_info['min_seats'],
-                route_info['train_type']
-            ]
+            train_info = format_ticket_row(
+                train_number, start_date, dep_station_name, arr_station_name,
+                route_info, price
+            )
             
             train_data.append(train_info)
         
@@ -220,92 +407,248 @@ class TicketService:
         train_data.sort(key=lambda x: x[3])
         return train_data, None
 
+    @staticmethod
+    @read_from_replica
+    def search_availability_calendar(dep_station_name, arr_station_name, center_date=None,
+                                     days_before=3, days_after=3):
+        """查询一段日期内每天的直达车次数和最低票价
+    
+        参数:
+            dep_station_name: 起点站名
+            arr_station_name: 终点站名
+            center_date: 中心日期 (格式: YYYY-MM-DD)，为空时使用今天
+            days_before / days_after: 向前/向后查询的天数
+    
+        返回:
+            每天一行: [日期, 有票车次数, 最低票价, 最低价车次, 最多余票]；以及错误信息(如果有)
+        """
+        dep_station = Station.find_one({'station_name': dep_station_name})
+        arr_station = Station.find_one({'station_name': arr_station_name})
+        if not dep_station or not arr_station:
+            return [], "Departure or arrival station not found."
+
+        if center_date:
+            center = datetime.datetime.strptime(center_date, '%Y-%m-%d').date()
+        else:
+            center = datetime.date.today()
+        date_from = center - datetime.timedelta(days=days_before)
+        date_to = center + datetime.timedelta(days=days_after)
+
+        timetable = journey_planner.load_timetable()
+        if not timetable:
+            return [], "No timetable data available."
+
+        runs = list(journey_planner.direct_runs(
+            timetable, dep_station['station_id'], arr_station['station_id'], date_from, date_to
+        ))
+
+        # 一次查询窗口内所有相关运行的余票
+        seat_counts = {}
+        if runs:
+            seat_counts = inventory.get_seat_counts_between(
+                min(trip.start_date for trip, _, _ in runs),
+                max(trip.start_date for trip, _, _ in runs),
+                sorted({trip.train_number for trip, _, _ in runs})
+            ) or {}
+
+        days = {date_from + datetime.timedelta(days=n): [] for n in range((date_to - date_from).days + 1)}
+        for trip, board, alight in runs:
+            seats = [seat_counts.get((trip.train_number, trip.start_date, trip.stop_orders[i]))
+                     for i in range(board, alight)]
+            seats = [n for n in seats if n is not None]
+            available = min(seats) if seats else 0
+            days[trip.departures[board].date()].append((trip.fare(board, alight), trip.train_number, available))
+
+        calendar_data = []
+        for day, options in days.items():
+            bookable = [option for option in options if option[2] > 0]
+            if bookable:
+                fare, train_number, _ = min(bookable)
+                calendar_data.append([
+                    day.strftime('%Y-%m-%d'), len(bookable), fare, train_number,
+                    max(option[2] for option in bookable)
+                ])
+            else:
+                calendar_data.append([day.strftime('%Y-%m-%d'), 0, '-', '-', 0])
+
+        if not runs:
+            return calendar_data, "No direct trains found in this date range."
+        return calendar_data, None
+
+    @staticmethod
+    @read_from_replica
+    def plan_journey(dep_station_name, arr_station_name, departure_date=None,
+                     max_transfers=2, min_connection_minutes=15, objective='earliest', max_options=5):
+        """规划含换乘的多程行程
+    
+        参数:
+            dep_station_name: 起点站名
+            arr_station_name: 终点站名
+            departure_date: 可选，最早出发日期 (格式: YYYY-MM-DD)，为空时从最早的车次开始
+            max_transfers: 最多换乘次数
+            min_connection_minutes: 最短换乘时间（分钟）
+            objective: 'earliest' 最早到达 或 'cheapest' 最低票价
+            max_options: 最多返回的方案数
+    
+        返回:
+            每个区段一行，列与search_available_tickets相同，
+            末尾追加 方案编号、换乘次数、方案总价；以及错误信息(如果有)
+        """
+        if objective not in journey_planner.OBJECTIVES:
+            return [], f"Unknown objective: {objective}"
+
+        dep_station = Station.find_one({'station_name': dep_station_name})
+        arr_station = Station.find_one({'station_name': arr_station_name})
+        if not dep_station or not arr_station:
+            return [], "Departure or arrival station not found."
+
+        timetable = journey_planner.load_timetable()
+        if not timetable or not timetable.trips:
+            return [], "No timetable data available."
+
+        if departure_date:
+            depart_after = datetime.datetime.strptime(departure_date, '%Y-%m-%d')
+        else:
+            depart_after = timetable.first_departure
+
+        results = journey_planner.plan(
+            timetable, dep_station['station_id'], arr_station['station_id'], depart_after,
+            max_transfers=max_transfers,
+            min_connection=datetime.timedelta(minutes=min_connection_minutes)
+        )
+        options = journey_planner.rank(results, objective)[:max_options]
+        if not options:
+            return [], "No journey found within the transfer limit."
+
+        seat_counts = {}
+        journey_data = []
+        for option_no, (transfers, label) in enumerate(options, start=1):
+            for t, board, alight in label.legs:
+                trip = timetable.trips[t]
+                run = (trip.train_number, trip.start_date)
+                if run not in seat_counts:
+                    seat_counts[run] = inventory.get_seat_counts(trip.train_number, trip.start_date) or {}
+                seats = [seat_counts[run].get((trip.start_date, trip.stop_orders[i]))
+                         for i in range(board, alight)]
+                seats = [n for n in seats if n is not None]
+                journey_data.append([
+                    trip.train_number,
+                    trip.start_date.strftime('%Y-%m-%d'),
+                    timetable.station_names[trip.station_ids[board]],
+                    trip.departures[board].strftime('%Y-%m-%d %H:%M:%S'),
+                    timetable.station_names[trip.station_ids[alight]],
+                    trip.arrivals[alight].strftime('%Y-%m-%d %H:%M:%S'),
+                    trip.fare(board, alight),
+                    min(seats) if seats else '-',
+                    trip.train_type,
+                    option_no,
+                    transfers,
+                    round(label.cost, 1)
+                ])
+        return journey_data, None
+
 class OrderService:
     @staticmethod
     def create_order(train_number, train_type, start_date, departure_station, arrival_station, 
-                    price, customer_name, customer_id_card):
-        """创建订单"""
+                    price, customer_name, customer_id_card, idempotency_key=None):
+        """创建订单
+
+        Args:
+            idempotency_key (str, optional): 客户端生成的幂等键，超时重试时传入同一个键，
+                返回首次请求的结果而不会重复下单
+        """
         try:
             # 验证客户信息
-            customer_query = """
-            SELECT * FROM Customers 
-            WHERE name = %s AND id_card = %s
-            """
-            customer = db.execute_query(
-                customer_query, 
-                (customer_name, customer_id_card),
-                fetch_one=True
-            )
+            customer = db.execute_query(CUSTOMER_QUERY, (customer_name, customer_id_card), fetch_one=True)
             
             if not customer:
                 return False, "Customer information not found or incorrect."
             
-            # 生成订单号 (年月日时分秒+4位随机数)
-            import datetime
-            import random
-            order_id = datetime.datetime.now().strftime('%Y%m%d%H%M%S') + \
-                      str(random.randint(1000, 9999))
+            # 票价以票价矩阵为准，与查询结果使用同一份缓存数据
+            dep_station = Station.find_one({'station_name': departure_station})
+            arr_station = Station.find_one({'station_name': arrival_station})
+            if not dep_station or not arr_station:
+                return False, "Station not found"
+            fare = fares.get_fare(train_number, dep_station['station_id'], arr_station['station_id'])
+            if fare is not None:
+                price = fare
             
-            # 插入订单
-            order_query = """
-            INSERT INTO SalesOrders (
-                order_id, train_number, train_type, start_date,
-                departure_station, arrival_station,
-                price, customer_name, customer_phone, 
-                operation_type, status
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, 
-                'Booking', 'Ready'
-            )
-            """
-            
-            # 执行订单插入
-            db.execute_query(
-                order_query,
-                (order_id, train_number, train_type, start_date,
-                 departure_station, arrival_station,
-                 price, customer_name, customer['phone'])
-            )
-            
-            return True, f"Order created successfully! Order ID: {order_id}"
+            # 保留座位和插入订单在同一事务中完成
+            with db.transaction() as cursor:
+                result = db_steps.run(cursor, OrderService._create_order_steps(
+                    train_number, train_type, start_date, dep_station, arr_station,
+                    price, customer, idempotency_key
+                ))
+
+            if idempotency_key:
+                idempotency.maybe_purge_expired()
+            return result
             
         except Exception as e:
             return False, f"Failed to create order: {str(e)}"
+
+    @staticmethod
+    def _create_order_steps(train_number, train_type, start_date, dep_station, arr_station,
+                            price, customer, idempotency_key=None):
+        """下单事务：幂等键、订单号、座位保留、插入订单和create事件（db_steps步骤，同步和异步共用）
+
+        Returns:
+            tuple: (success, message)
+        """
+        if idempotency_key:
+            previous = yield from idempotency.claim_steps(idempotency_key, 'create_order')
+            if previous:
+                return previous
+
+        rows = yield """
+            SELECT station_id, stop_order FROM TimetableStops
+            WHERE train_number = %s AND station_id IN (%s, %s)
+        """, (train_number, dep_station['station_id'], arr_station['station_id']), 'all'
+        stop_orders = {row['station_id']: row['stop_order'] for row in rows}
+        order_id = yield from allocate_order_id_steps()
+        held = yield from seat_holds.place_hold_steps(
+            order_id, train_number, start_date,
+            stop_orders.get(dep_station['station_id']), stop_orders.get(arr_station['station_id'])
+        )
+        if held:
+            # 执行订单插入
+            yield INSERT_ORDER_SQL, (
+                order_id, train_number, train_type, start_date,
+                dep_station['station_name'], arr_station['station_name'],
+                dep_station['station_id'], arr_station['station_id'],
+                price, customer['name'], customer['phone'], customer['id_card']
+            ), 'count'
+            yield from order_events.append_steps([order_events.created_event({
+                'order_id': order_id, 'train_number': train_number, 'train_type': train_type,
+                'start_date': start_date, 'departure_station': dep_station['station_name'],
+                'arrival_station': arr_station['station_name'],
+                'departure_station_id': dep_station['station_id'],
+                'arrival_station_id': arr_station['station_id'],
+                'price': float(price), 'customer_name': customer['name'],
+                'customer_phone': customer['phone'], 'customer_id_card': customer['id_card'],
+                'operation_type': 'Booking',
+            })])
+            result = (True, f"Order created successfully! Order ID: {order_id}. "
+                            f"Seat held for {seat_holds.HOLD_MINUTES} minutes pending approval.")
+        else:
+            yield "DELETE FROM OrderIds WHERE order_id = %s", (order_id,), 'count'
+            result = (False, "No available seats for this route")
+
+        if idempotency_key:
+            yield from idempotency.complete_steps(idempotency_key, *result)
+        return result
     
     @staticmethod
     def get_orders_by_passenger(name, phone):
         """根据乘客信息查询订单"""
         try:
             print(f"Querying orders for passenger {name} {phone}")
-            query = """
-                SELECT *
-                FROM SalesOrders 
-                WHERE customer_name = %s 
-                AND customer_phone = %s
-                ORDER BY operation_time DESC
-            """
-            
-            orders = db.execute_query(query, (name, phone), fetch_all=True)
+            orders = db.execute_query(PASSENGER_ORDERS_QUERY, passenger_orders_params(name, phone), fetch_all=True)
 
             if not orders:
                 return [], "No orders found for this passenger"
 
-            orders_data = []
-            for order in orders:
-                orders_data.append([
-                    order['order_id'],
-                    order['train_number'],
-                    order['train_type'],
-                    order['departure_station'],
-                    order['arrival_station'],
-                    f"${float(order['price']):.2f}",
-                    order['customer_name'],
-                    order['customer_phone'],
-                    order['operation_type'],
-                    order['operation_time'].strftime('%Y-%m-%d %H:%M:%S'),
-                    order['status']
-                ])
-                
+            orders_data = [format_order_row(order) for order in orders]
             return orders_data, None
             
         except Exception as e:
@@ -315,63 +658,102 @@ class OrderService:
     def cancel_order(order_id):
         """取消订单"""
         try:
-            # 检查订单状态
-            check_query = """
-            SELECT status FROM SalesOrders 
-            WHERE order_id = %s
-            """
-            order = db.execute_query(check_query, (order_id,), fetch_one=True)
-            
-            if not order:
-                return False, "Order not found"
-            
-            if order['status'] != 'Ready':
-                return False, "Only orders in Ready status can be cancelled"
-            
-            # 更新订单状态
-            update_query = """
-            UPDATE SalesOrders 
-            SET status = 'Cancelled'
-            WHERE order_id = %s
-            """
-            db.execute_query(update_query, (order_id,))
-            
-            return True, "Order cancelled successfully"
+            for _ in range(MAX_TRANSITION_RETRIES + 1):
+                try:
+                    with db.transaction() as cursor:
+                        return db_steps.run(cursor, OrderService._cancel_order_steps(order_id))
+                except OrderConflict:
+                    continue
+            return False, ORDER_CONFLICT_MESSAGE
             
         except Exception as e:
             return False, f"Failed to cancel order: {str(e)}"
 
     @staticmethod
-    def request_refund(order_id):
-        """申请退款"""
+    def _cancel_order_steps(order_id):
+        """取消订单的事务（db_steps步骤）；订单状态被其他终端修改时抛出OrderConflict"""
+        # 先锁定座位保留，与审批的加锁顺序一致
+        held = yield from seat_holds.lock_holds_steps([order_id])
+
+        # 检查订单状态
+        rows = yield "SELECT status FROM SalesOrders WHERE order_id = %s", (order_id,), 'all'
+        if not rows:
+            return False, "Order not found"
+
+        transition = order_states.transition('cancel', rows[0]['status'])
+        if not transition:
+            return False, order_states.rejection_message('cancel')
+
+        # 仅当订单仍为读取时的状态才更新，并释放座位保留
+        sql, params = transition.guarded_update([order_id])
+        updated = yield sql, params, 'count'
+        if updated != 1:
+            raise OrderConflict(order_id)
+        yield from order_events.append_steps([order_events.transition_event(order_id, transition)])
+        if transition.releases_hold:
+            yield from seat_holds.release_holds_steps(held)
+        return True, "Order cancelled successfully"
+
+    @staticmethod
+    def request_refund(order_id, idempotency_key=None):
+        """申请退款
+
+        Args:
+            idempotency_key (str, optional): 客户端生成的幂等键，重试时返回首次请求的结果
+        """
         try:
-            # 检查订单状态
-            check_query = """
-            SELECT status FROM SalesOrders 
-            WHERE order_id = %s
-            """
-            order = db.execute_query(check_query, (order_id,), fetch_one=True)
-            
-            if not order:
-                return False, "Order not found"
-            
-            if order['status'] != 'Success':
-                return False, "Only successful orders can request refund"
-            
-            # 更新订单状态为待退款
-            update_query = """
-            UPDATE SalesOrders 
-            SET status = 'RefundPending',
-                operation_type = 'Refund'
-            WHERE order_id = %s
-            """
-            db.execute_query(update_query, (order_id,))
-            
-            return True, "Refund request submitted successfully"
+            for _ in range(MAX_TRANSITION_RETRIES + 1):
+                try:
+                    result = OrderService._request_refund_once(order_id, idempotency_key)
+                    break
+                except OrderConflict:
+                    continue
+            else:
+                return False, ORDER_CONFLICT_MESSAGE
+
+            if idempotency_key:
+                idempotency.maybe_purge_expired()
+            return result
             
         except Exception as e:
             return False, f"Failed to request refund: {str(e)}"
 
+    @staticmethod
+    def _request_refund_once(order_id, idempotency_key=None):
+        """在一个事务中申请退款；订单状态被其他终端修改时抛出OrderConflict，事务（包括幂等键）回滚"""
+        with db.transaction() as cursor:
+            return db_steps.run(cursor, OrderService._request_refund_steps(order_id, idempotency_key))
+
+    @staticmethod
+    def _request_refund_steps(order_id, idempotency_key=None):
+        """申请退款的事务（db_steps步骤）"""
+        if idempotency_key:
+            previous = yield from idempotency.claim_steps(idempotency_key, 'request_refund')
+            if previous:
+                return previous
+
+        # 检查订单状态
+        rows = yield "SELECT status FROM SalesOrders WHERE order_id = %s", (order_id,), 'all'
+        order = rows[0] if rows else None
+
+        transition = order and order_states.transition('request_refund', order['status'])
+        if not order:
+            result = (False, "Order not found")
+        elif not transition:
+            result = (False, order_states.rejection_message('request_refund'))
+        else:
+            # 仅当订单仍为读取时的状态才更新为待退款
+            sql, params = transition.guarded_update([order_id])
+            updated = yield sql, params, 'count'
+            if updated != 1:
+                raise OrderConflict(order_id)
+            yield from order_events.append_steps([order_events.transition_event(order_id, transition)])
+            result = (True, "Refund request submitted successfully")
+
+        if idempotency_key:
+            yield from idempotency.complete_steps(idempotency_key, *result)
+        return result
+
     @staticmethod
     def get_pending_orders():
         """获取待处理订单"""
@@ -384,27 +766,106 @@ class OrderService:
             if not orders:
                 return [], "No pending orders found"
 
-            orders_data = []
-            for order in orders:
-                orders_data.append([
-                    order['order_id'],
-                    order['train_number'],
-                    order['train_type'],
-                    order['departure_station'],
-                    order['arrival_station'],
-                    f"${float(order['price']):.2f}",
-                    order['customer_name'],
-                    order['customer_phone'],
-                    order['operation_type'],
-                    order['operation_time'].strftime('%Y-%m-%d %H:%M:%S'),
-                    order['status']
-                ])
-                
+            orders_data = [format_order_row(order) for order in orders]
             return orders_data, None
             
         except Exception as e:
             return [], f"Error querying orders: {str(e)}"
 
+    @staticmethod
+    def get_order_history(order_id, as_of=None):
+        """由订单事件日志重建订单，不读取或锁定SalesOrders
+
+        Args:
+            as_of (datetime, optional): 返回该时刻的订单状态，为空时返回最新状态
+
+        Returns:
+            tuple: ((订单状态字典, 事件列表), error_message)
+        """
+        try:
+            state = order_events.load_order(order_id, as_of)
+            if state is None:
+                return (None, []), "Order not found"
+            events = [
+                event for event in order_events.history(order_id)
+                if as_of is None or event['occurred_at'] <= as_of
+            ]
+            return (state, events), None
+
+        except Exception as e:
+            return (None, []), f"Error querying order history: {str(e)}"
+
+    @staticmethod
+    def pending_order_sort_key(row):
+        """format_order_row表格行在PENDING_ORDERS_PAGE_QUERY中的排序键（按该键降序）"""
+        return row[9], str(row[0])
+
+    @staticmethod
+    def get_pending_orders_page(offset=0, limit=100):
+        """分页获取待处理订单
+
+        Returns:
+            tuple: ((当前页订单行, 待处理订单总数), error_message)
+        """
+        try:
+            # order_id作为排序的决胜列，分页顺序稳定；总数与当前页在同一条语句中从视图计算
+            orders = db.execute_query(PENDING_ORDERS_PAGE_QUERY, (limit, offset), fetch_all=True)
+            if orders:
+                total = orders[0]['total']
+            elif orders is not None:
+                count = db.execute_query("SELECT COUNT(*) AS total FROM PendingOrdersView", fetch_one=True)
+                total = count['total'] if count else None
+            if orders is None or total is None:
+                return ([], 0), "Error querying orders"
+            if not total:
+                return ([], 0), "No pending orders found"
+            return ([format_order_row(order) for order in orders], total), None
+
+        except Exception as e:
+            return ([], 0), f"Error querying orders: {str(e)}"
+
+    @staticmethod
+    def get_orders_by_passenger_page(name, phone, offset=0, limit=100):
+        """分页查询乘客订单（包括已归档的订单）
+
+        Returns:
+            tuple: ((当前页订单行, 订单总数), error_message)
+        """
+        try:
+            orders = db.execute_query(
+                PASSENGER_ORDERS_QUERY + " LIMIT %s OFFSET %s",
+                (*passenger_orders_params(name, phone), limit, offset), fetch_all=True
+            )
+            count = db.execute_query(f"""
+                SELECT
+                    (SELECT COUNT(*) FROM SalesOrders WHERE {PASSENGER_ORDER_CONDITION}) +
+                    (SELECT COUNT(*) FROM SalesOrdersArchive WHERE {PASSENGER_ORDER_CONDITION})
+                    AS total
+            """, passenger_orders_params(name, phone), fetch_one=True)
+            if orders is None or count is None:
+                return ([], 0), "Error querying orders"
+            if not count['total']:
+                return ([], 0), "No orders found for this passenger"
+            return ([format_order_row(order) for order in orders], count['total']), None
+
+        except Exception as e:
+            return ([], 0), f"Error querying orders: {str(e)}"
+
+    @staticmethod
+    def get_order(order_id):
+        """查询单个订单（包括已归档的订单），用于操作后刷新表格中的一行"""
+        try:
+            for table in ("SalesOrders", "SalesOrdersArchive"):
+                order = db.execute_query(
+                    f"SELECT * FROM {table} WHERE order_id = %s", (order_id,), fetch_one=True
+                )
+                if order:
+                    return format_order_row(order), None
+            return None, "Order not found"
+
+        except Exception as e:
+            return None, f"Error querying order: {str(e)}"
+
     @staticmethod
     def process_order(order_id, approve=True, salesperson_id=None):
         """处理订单（确认或拒绝）
@@ -414,159 +875,215 @@ class OrderService:
             approve (bool): True为批准，False为拒绝
             salesperson_id (str): 处理订单的乘务员ID
         """
-        try:
-            # 检查订单状态和信息
-            check_query = """
-            SELECT status, operation_type, price, 
-                   train_number, start_date, departure_station, arrival_station 
-            FROM SalesOrders 
-            WHERE order_id = %s
-            """
-            order = db.execute_query(check_query, (order_id,), fetch_one=True)
-            
-            if not order:
-                return False, "Order not found"
-            
-            if order['status'] not in ('Ready', 'RefundPending'):
-                return False, "Order cannot be processed in current status"
-            
-            # 确定新状态和操作类型
-            original_status = order['status']
-            operation_type = 'Approve' if approve else 'Reject'
-            
-            # 如果是批准新订单，需要检查余票
-            if approve and original_status == 'Ready':
-                # 检查所有经过站点是否有余票
-                check_seats_query = """
-                SELECT MIN(s.seats) as min_seats
-                FROM Stopovers s
-                JOIN Stations st1 ON st1.station_name = %s
-                JOIN Stations st2 ON st2.station_name = %s
-                WHERE s.train_number = %s
-                AND s.start_date = %s
-                AND s.stop_order >= (
-                    SELECT stop_order 
-                    FROM Stopovers s2 
-                    JOIN Stations st3 ON st3.station_id = s2.station_id 
-                    WHERE st3.station_name = %s 
-                    AND s2.train_number = %s
-                    AND s2.start_date = %s
-                )
-                AND s.stop_order < (
-                    SELECT stop_order 
-                    FROM Stopovers s3 
-                    JOIN Stations st4 ON st4.station_id = s3.station_id 
-                    WHERE st4.station_name = %s 
-                    AND s3.train_number = %s
-                    AND s3.start_date = %s
-                )
-                """
-                
-                seats_result = db.execute_query(
-                    check_seats_query, 
-                    (order['departure_station'], order['arrival_station'],
-                     order['train_number'], order['start_date'],
-                     order['departure_station'], order['train_number'], order['start_date'],
-                     order['arrival_station'], order['train_number'], order['start_date']),
-                    fetch_one=True
-                )
-                
-                if not seats_result or seats_result['min_seats'] <= 0:
-                    return False, "No available seats for this route"
-        
-            if original_status == 'Ready':
-                new_status = 'Success' if approve else 'Cancelled'
-            else:
-                new_status = 'Refunded' if approve else 'Success'
-            
-            # 生成操作备注
-            remarks = None
-            if original_status == 'Ready':
-                remarks = f"Order {'approved' if approve else 'rejected'} by salesperson"
-            else:
-                remarks = f"Refund request {'approved' if approve else 'rejected'} by salesperson"
-            
-            # 更新订单状态
-            update_query = """
-            UPDATE SalesOrders 
-            SET status = %s
-            WHERE order_id = %s
-            """
-            db.execute_query(update_query, (new_status, order_id))
-            
-            # 记录操作
-            success = OrderService.record_operation(
-                order_id=order_id,
-                salesperson_id=salesperson_id,
-                operation_type=operation_type,
-                original_status=original_status,
-                new_status=new_status,
-                price=float(order['price']),
-                remarks=remarks
-            )
-            
-            if not success:
-                return False, "Operation recorded but failed to log the operation"
-            
-            return True, f"Order {new_status.lower()} successfully"
-            
-        except Exception as e:
-            return False, f"Failed to process order: {str(e)}"
-    
+        results, error = OrderService.process_orders([order_id], approve, salesperson_id)
+        if error:
+            return False, error
+        _, success, message = results[0]
+        return success, message
+
     @staticmethod
-    def record_operation(order_id, salesperson_id, operation_type, 
-                    original_status, new_status, price, remarks=None):
-        """记录订单操作历史
-        
+    def process_orders(order_ids, approve=True, salesperson_id=None, remarks=None):
+        """批量处理订单（确认或拒绝），整批在一个事务中完成
+
+        按列车运行一次性锁定并检查余票，依次为每个订单分配座位；
+        状态更新和操作记录都用集合语句批量执行。
+        订单行不加锁，状态按预期值比较并交换；被其他终端抢先修改的订单在新事务中重新处理，
+        最多重试MAX_TRANSITION_RETRIES次。
+
         Args:
-            order_id (str): 订单ID
-            salesperson_id (str): 操作人员ID
-            operation_type (str): 操作类型 ('Approve', 'Reject', 'Process_Refund')
-            original_status (str): 原始状态
-            new_status (str): 新状态
-            price (decimal): 操作涉及的金额
-            remarks (str, optional): 备注说明
+            order_ids (list): 订单ID列表，按处理优先顺序排列
+            approve (bool): True为批准，False为拒绝
+            salesperson_id (str): 处理订单的乘务员ID
+            remarks (str, optional): 操作备注，默认按操作类型生成
 
         Returns:
-            bool: 操作是否成功
+            tuple: ([(order_id, success, message)], error_message)
         """
+        order_ids = list(dict.fromkeys(order_ids))  # 去重并保持顺序
+        if not order_ids:
+            return [], None
+
         try:
-            query = """
-                INSERT INTO OrderOperations (
-                    order_id,
-                    salesperson_id,
-                    operation_type,
-                    original_status,
-                    new_status,
-                    price,
-                    operation_time,
-                    remarks
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s
-                )
-            """
-            db.execute_query(
-                query,
-                (order_id, salesperson_id, operation_type, 
-                 original_status, new_status, price, remarks)
-            )
-            return True
+            outcomes = {}
+            pending = order_ids
+            for _ in range(MAX_TRANSITION_RETRIES + 1):
+                with db.transaction() as cursor:
+                    results, _ = db_steps.run(
+                        cursor, OrderService._process_batch_steps(pending, approve, salesperson_id, remarks)
+                    )
+                outcomes.update((order_id, (success, message)) for order_id, success, message in results)
+                pending = [
+                    order_id for order_id, success, message in results
+                    if not success and message == ORDER_CONFLICT_MESSAGE
+                ]
+                if not pending:
+                    break
+            return [(order_id, *outcomes[order_id]) for order_id in order_ids], None
+
         except Exception as e:
-            print(f"Error recording operation: {e}")
-            return False
+            return [], f"Failed to process orders: {str(e)}"
+
+    @staticmethod
+    def _process_batch_steps(order_ids, approve, salesperson_id, remarks=None):
+        """在调用方的事务中处理一批订单，返回 (每个订单的结果, 已应用的状态变化)
+
+        写成db_steps步骤，同步的process_orders和AsyncOrderService.process_order共用。
+        状态已被其他事务修改的订单不做任何修改，结果为ORDER_CONFLICT_MESSAGE。
+        """
+        event = 'approve' if approve else 'reject'
+        placeholders = ", ".join(["%s"] * len(order_ids))
+        rows = yield (f"""
+            SELECT o.order_id, o.status, o.price, o.train_number, o.start_date,
+                   dep.stop_order AS dep_order, arr.stop_order AS arr_order
+            FROM SalesOrders o
+            LEFT JOIN TimetableStops dep
+                ON dep.train_number = o.train_number AND dep.station_id = o.departure_station_id
+            LEFT JOIN TimetableStops arr
+                ON arr.train_number = o.train_number AND arr.station_id = o.arrival_station_id
+            WHERE o.order_id IN ({placeholders})
+        """, tuple(order_ids), 'all')
+        orders = {order['order_id']: order for order in rows}
+        transitions = {
+            order_id: order_states.transition(event, order['status']) for order_id, order in orders.items()
+        }
+        # 下单时已保留座位的订单，批准时直接使用保留的座位
+        held = yield from seat_holds.lock_holds_steps(
+            [order_id for order_id, t in transitions.items() if t and t.releases_hold]
+        )
+
+        # 需要占座的订单所在的列车运行，一次锁定并读取全部库存
+        runs = {
+            (orders[order_id]['train_number'], orders[order_id]['start_date'])
+            for order_id, t in transitions.items()
+            if t and t.takes_seat and order_id not in held
+        }
+        seats = {}
+        if runs:
+            run_placeholders = ", ".join(["(%s, %s)"] * len(runs))
+            rows = yield (f"""
+                SELECT train_number, start_date, stop_order, seats - held AS seats
+                FROM RunInventory
+                WHERE (train_number, start_date) IN ({run_placeholders})
+                FOR UPDATE
+            """, tuple(value for run in runs for value in run), 'all')
+            for row in rows:
+                seats[(row['train_number'], row['start_date'], row['stop_order'])] = row['seats']
+
+        results = []
+        changes = []  # [(order, transition)]
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            if not order:
+                results.append((order_id, False, "Order not found"))
+                continue
+            transition = transitions[order_id]
+            if not transition:
+                results.append((order_id, False, order_states.rejection_message(event)))
+                continue
+
+            if transition.takes_seat and order_id not in held:
+                # 没有保留的订单在本批已分配座位的基础上检查区间可售座位
+                if order['dep_order'] is None or order['arr_order'] is None:
+                    results.append((order_id, False, "No available seats for this route"))
+                    continue
+                segment = [
+                    (order['train_number'], order['start_date'], stop_order)
+                    for stop_order in range(order['dep_order'], order['arr_order'])
+                ]
+                if not segment or min(seats.get(key, 0) for key in segment) <= 0:
+                    results.append((order_id, False, "No available seats for this route"))
+                    continue
+                for key in segment:
+                    seats[key] -= 1
+
+            changes.append((order, transition))
+
+        if not changes:
+            return results, changes
+
+        # 每种状态转换一条比较并交换的UPDATE
+        by_transition = {}
+        for order, transition in changes:
+            by_transition.setdefault(transition, []).append(order['order_id'])
+        conflicts = set()
+        for transition, ids in by_transition.items():
+            updated = yield (*transition.guarded_update(ids), 'count')
+            if updated < len(ids):
+                # 本事务更新过的行读到新状态，未更新的行仍是读取时的状态，即被其他终端抢先修改的订单
+                rows = yield (
+                    f"SELECT order_id FROM SalesOrders WHERE status <> %s AND order_id IN ({', '.join(['%s'] * len(ids))})",
+                    (transition.target, *ids), 'all'
+                )
+                conflicts.update(row['order_id'] for row in rows)
+
+        # 冲突的订单没有被修改，其座位分配只存在于内存中，直接丢弃
+        results.extend(
+            (order['order_id'], False, ORDER_CONFLICT_MESSAGE) if order['order_id'] in conflicts
+            else (order['order_id'], True, f"Order {transition.target.lower()} successfully")
+            for order, transition in changes
+        )
+        changes = [(order, transition) for order, transition in changes if order['order_id'] not in conflicts]
+        if not changes:
+            return results, changes
+
+        # 座位库存随状态在同一事务中调整
+        yield from inventory.seat_change_steps([
+            (order['train_number'], order['start_date'], order['dep_order'], order['arr_order'],
+             transition.seat_delta)
+            for order, transition in changes
+        ])
+        # 离开Ready后订单不再需要保留的座位
+        yield from seat_holds.release_holds_steps([
+            order['order_id'] for order, transition in changes
+            if transition.releases_hold and order['order_id'] in held
+        ])
+
+        # 操作记录等副作用写入事件表，由outbox处理器异步完成
+        yield from outbox.enqueue_steps([
+            (order['order_id'], 'OrderProcessed', OrderService._operation_payload(
+                salesperson_id, approve, transition.source, transition.target, order['price'], remarks
+            ))
+            for order, transition in changes
+        ])
+        yield from order_events.append_steps([
+            order_events.transition_event(order['order_id'], transition, salesperson_id, remarks)
+            for order, transition in changes
+        ])
+        return results, changes
+
+    @staticmethod
+    def _operation_payload(salesperson_id, approve, original_status, new_status, price, remarks=None):
+        """OrderProcessed事件的内容，对应OrderOperations的一行"""
+        return {
+            'salesperson_id': salesperson_id,
+            'operation_type': 'Approve' if approve else 'Reject',
+            'original_status': original_status,
+            'new_status': new_status,
+            'price': float(price),
+            'remarks': remarks or OrderService._operation_remarks(original_status, approve),
+        }
+
+    @staticmethod
+    def _operation_remarks(original_status, approve):
+        """生成操作备注"""
+        if original_status == 'Ready':
+            return f"Order {'approved' if approve else 'rejected'} by salesperson"
+        return f"Refund request {'approved' if approve else 'rejected'} by salesperson"
+
 
 class SalespersonService:
+    @staticmethod
+    def _sales_report_proc(report_date, staff_id=None):
+        """返回销售报表的 (存储过程名, 参数)"""
+        if staff_id:
+            return 'sp_daily_staff_report', (report_date, staff_id)
+        return 'sp_daily_sales_report', (report_date,)
+
     @staticmethod
     def verify_credentials(salesperson_id, password):
         """验证乘务员凭据"""
         try:
-            query = """
-            SELECT salesperson_id, salesperson_name, role
-            FROM Salespersons 
-            WHERE salesperson_id = %s AND password = %s
-            """
-
-            result = db.execute_query(query, (salesperson_id, password), fetch_one=True)
+            result = db.execute_query(CREDENTIALS_QUERY, (salesperson_id, password), fetch_one=True)
 
             if result:
                 return True, result
@@ -576,6 +1093,7 @@ class SalespersonService:
             return False, f"Error verifying credentials: {str(e)}"
     
     @staticmethod
+    @read_from_replica
     def get_daily_sales_report(report_date, staff_id=None):
         """获取指定日期的销售报表
         
@@ -587,23 +1105,10 @@ class SalespersonService:
             tuple: (data, error_message)
         """
         try:
-            if staff_id:
-                result = db.call_proc('sp_daily_staff_report', (report_date, staff_id))
-            else:
-                result = db.call_proc('sp_daily_sales_report', (report_date,))
+            result = db.call_proc(*SalespersonService._sales_report_proc(report_date, staff_id))
 
             if result:
-                data = [
-                    [
-                        str(row['salesperson_id']),
-                        str(row['salesperson_name']),
-                        str(row['total_orders']),
-                        f"${float(row['booking_revenue'] or 0):.2f}",
-                        f"${float(row['refund_amount'] or 0):.2f}"
-                    ]
-                    for row in result
-                ]
-                return data, None
+                return [format_sales_report_row(row) for row in result], None
                 
             return [], "No data found"
             
@@ -0,0 +1,61 @@
+# startup.py
+
+import contextlib
+import importlib
+import threading
+import time
+
+# 以本模块被导入的时间作为启动起点，入口脚本应最先导入本模块
+_started_at = time.perf_counter()
+_phases = []  # [(name, start_offset, duration, thread_name)]
+_lock = threading.Lock()
+
+@contextlib.contextmanager
+def phase(name):
+    """记录一个启动阶段的耗时，可以在后台线程中使用"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        with _lock:
+            _phases.append((name, start - _started_at, end - start, threading.current_thread().name))
+
+class LazyImport:
+    """模块中对象的延迟引用，第一次访问属性时才导入模块
+
+    入口脚本用它引用服务层对象，导入放到后台初始化线程中；
+    主线程在导入完成前访问时，由Python的模块导入锁等待后台线程导入结束。
+    """
+    def __init__(self, module, name):
+        self._module = module
+        self._name = name
+        self._target = None
+
+    def resolve(self):
+        if self._target is None:
+            self._target = getattr(importlib.import_module(self._module), self._name)
+        return self._target
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f"LazyImport({self._module}.{self._name})"
+
+def elapsed():
+    """从启动到现在的秒数"""
+    return time.perf_counter() - _started_at
+
+def report(title="Startup"):
+    """打印各启动阶段的开始时间和耗时
+
+    Returns:
+        list: [(name, start_offset, duration, thread_name)]
+    """
+    with _lock:
+        phases = sorted(_phases, key=lambda item: item[1])
+    print(f"{title} timing (total {elapsed() * 1000:.0f} ms):")
+    for name, start, duration, thread_name in phases:
+        print(f"  {name:<28} start {start * 1000:7.0f} ms  took {duration * 1000:7.0f} ms  [{thread_name}]")
+    return phases